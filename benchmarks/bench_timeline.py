@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the aggregation time axis construction and alignment (DStatAlign.grid and DStatAlign.align) on synthetic
+clusters. Each node samples once per second at its own sub-second offset, for the given duration, with its own start
+offset and a few missing samples. The speedup compares the former set based union alone with the grid and the
+alignment of every node together.
+
+usage: python benchmarks/bench_timeline.py [samples]
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from shee.frames import DStatAlign
+
+
+def set_left_df(dfs):
+    """ Former implementation: every index value of every node is added to a python set """
+    time = set()
+    for df in dfs:
+        for value in np.ndenumerate(df.index.values):
+            time.add(value[1])
+    sorted = list(time)
+    sorted.sort()
+    index = pd.Index(data=sorted, name='epoch')
+    return pd.DataFrame(data=sorted, index=index, columns=['epoch'])
+
+
+def make_nodes(nodes, samples, seed=0):
+    rnd = np.random.RandomState(seed)
+    start = np.datetime64('2016-05-20T10:00:00', 'ns').astype(np.int64)
+    dfs = []
+    for _ in range(nodes):
+        epoch = start + (rnd.randint(0, 60) + np.arange(samples)) * 10**9 + rnd.randint(0, 10**9)
+        epoch = epoch[rnd.rand(samples) > 0.01]
+        index = pd.Index(epoch.view('datetime64[ns]'), name='epoch')
+        dfs.append(pd.DataFrame({'usr': np.ones(len(epoch))}, index=index))
+    return dfs
+
+
+def align_nodes(dfs):
+    """ Current implementation (see DStatAggregate._to_cube): shared regular grid, then each node snapped onto it """
+    align = DStatAlign()
+    epochs = [df.index.values.view('i8') for df in dfs]
+    grid = align.grid(epochs)
+    return grid, [align.align(epoch, df.values, grid) for epoch, df in zip(epochs, dfs)]
+
+
+def timeit(func, *args):
+    start_time = time.time()
+    ret = func(*args)
+    return time.time() - start_time, ret
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 3600
+    print "%6s %12s %12s %12s %8s" % ('nodes', 'set (s)', 'grid (s)', 'aligned (s)', 'speedup')
+    for nodes in [10, 30, 100, 300, 1000]:
+        dfs = make_nodes(nodes, samples)
+        old, _ = timeit(set_left_df, dfs)
+        grid, _ = timeit(DStatAlign().grid, [df.index.values.view('i8') for df in dfs])
+        aligned, (axis, blocks) = timeit(align_nodes, dfs)
+        assert all(block.shape == (len(axis), 1) for block in blocks)
+        print "%6d %12.4f %12.4f %12.4f %7.1fx" % (nodes, old, grid, aligned, old / aligned)
+
+
+if __name__ == "__main__":
+    main()
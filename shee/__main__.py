@@ -7,6 +7,8 @@ import sys
 import warnings
 
 from shee.parse import SheeParser
+from shee.frames import DStatWindow
+from shee.frames import DStatWindowException
 
 from run import shee
 
@@ -47,9 +49,16 @@ def main(args=None):
     disk = args.disk
 
     plot = args.plot
-    time = args.time
     web = args.web
 
+    window = None
+    if args.start is not None or args.end is not None:
+        try:
+            window = DStatWindow(args.start, args.end)
+        except DStatWindowException as e:
+            print " -t [--start] -E [--end] options: " + e.value
+            exit(-1)
+
     aggregate = args.aggregate
     save_agg = args.save_agg
     file_agg = args.file_agg
@@ -66,10 +75,72 @@ def main(args=None):
         print " -C [--cumulative] option allowed with -a option only"
         exit(-1)
 
+    jobs = args.jobs if args.jobs is not None else 1
+    if jobs < 1:
+        print " -j [--jobs] option should be a positive number"
+        exit(-1)
+
+    if jobs > 1 and plot:
+        print " -j [--jobs] option not allowed with -P option"
+        exit(-1)
+
+    render_jobs = args.render_jobs if args.render_jobs is not None else 1
+    if render_jobs < 1:
+        print " -r [--render_jobs] option should be a positive number"
+        exit(-1)
+
+    if render_jobs > 1 and (plot or jobs > 1):
+        print " -r [--render_jobs] option not allowed with -P -j options"
+        exit(-1)
+
+    heatmap_cores = args.heatmap_cores if args.heatmap_cores is not None else 16
+    if heatmap_cores < 0:
+        print " -k [--heatmap_cores] option should be a non negative number"
+        exit(-1)
+
+    overlap = args.overlap if args.overlap is not None else 0.0
+    if args.overlap is not None and not aggregate:
+        print " -o [--overlap] option allowed with -a option only"
+        exit(-1)
+    if not 0.0 <= overlap <= 1.0:
+        print " -o [--overlap] option should be a ratio between 0 and 1"
+        exit(-1)
+
+    bucket = args.bucket if args.bucket is not None else 1.0
+    if args.bucket is not None and not aggregate:
+        print " -b [--bucket] option allowed with -a option only"
+        exit(-1)
+    if bucket <= 0:
+        print " -b [--bucket] option should be a positive number of seconds"
+        exit(-1)
+
+    band = args.band if args.band is not None else 'std'
+    if args.band is not None and not aggregate:
+        print " -B [--band] option allowed with -a option only"
+        exit(-1)
+    summary = args.summary
+    if summary and not aggregate:
+        print " -Z [--summary] option allowed with -a option only"
+        exit(-1)
+    if band == 'percentile' and args.stream and not summary:
+        print " -B percentile option not allowed with -S option: percentiles are not computed in streaming"
+        exit(-1)
+
+    suite = args.suite
+    if suite and not aggregate:
+        print " -R [--suite] option allowed with -a option only"
+        exit(-1)
+    if suite and (file_agg is not None or web):
+        print " -R [--suite] option not allowed with -F -w options"
+        exit(-1)
+
     noparse = args.noparse
+    cache = not args.nocache
+    stream = args.stream
 
     shee(input_dir, filename, processor, eth, sd, comparison, cpu, network, memory,
-         disk, plot, time, web, noparse, aggregate, save_agg, file_agg, cums)
+         disk, plot, window, web, noparse, aggregate, save_agg, file_agg, cums, cache, stream, jobs, overlap,
+         bucket, band, summary, suite, render_jobs, heatmap_cores)
 
 
 if __name__ == "__main__":
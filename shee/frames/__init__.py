@@ -12,4 +12,18 @@ from disk import DStatDisk
 from memory import DStatMemory
 from network import DStatNetwork
 from compare import DStatCompare
-from aggregate import DStatAggregate
\ No newline at end of file
+from aggregate import DStatAggregate
+from align import DStatAlign
+from cube import DStatCube
+from cube import DStatCubeColumnsException
+from stream import DStatStream
+from online import DStatOnlineAggregate
+from summary import DStatSummary
+from suite import DStatSuite
+from store import DStatAggregateStore
+from summary import DStatSummaryTree
+from window import DStatWindow
+from window import DStatWindowException
+from index import DStatIndex
+from schema import DStatSchema
+from render import DStatRenderScheduler
\ No newline at end of file
@@ -3,18 +3,24 @@
 
 import os
 
-import datetime
-
 import numpy as np
 import pandas as pd
 
+import matplotlib as mpl
 import matplotlib.dates as mdates
 import matplotlib.ticker as tick
 import matplotlib.pyplot as plt
 
 from frame import DStatException
 from frame import DStatOpenCsvException
-from frame import DStatReadColumnsException
+from align import DStatAlign
+from cube import DStatCube
+from online import DStatOnlineAggregate
+from stream import DStatStream
+from summary import DStatSummary
+from shee.util import get_result_dir_name
+from shee.util import point_budget
+from shee.util import decimate
 
 
 class DStatAggregateNoValidExperiments(DStatException):
@@ -26,6 +32,38 @@ class DStatAggregateNoValidExperiments(DStatException):
 
 class DStatAggregate(object):
 
+    # column groups needed by the aggregation
+    GLOBAL_GROUPS = ['total cpu usage', 'net/total', 'memory usage', 'dsk/total']
+
+    # device, column group and unit divisor of the aggregated metrics
+    DEVICES = [
+        ('cpu', 'total cpu usage', 1),
+        ('net', 'net/total', 1024 * 1024),
+        ('mem', 'memory usage', 1024 * 1024 * 1024),
+        ('dsk', 'dsk/total', 1024 * 1024),
+    ]
+
+    # cross-node percentiles of each metric and their column prefixes, 0 and 100 being min and max
+    PERCENTILES = [(50, 'p50_'), (95, 'p95_'), (99, 'p99_'), (0, 'min_'), (100, 'max_')]
+
+    # metrics whose cluster-level sum is accumulated at runtime
+    CUMULATIVE = {
+        'net': ['send', 'recv'],
+        'mem': ['used'],
+        'dsk': ['read', 'writ'],
+    }
+
+    # metrics drawn as node x runtime heatmaps and their units
+    HEATMAPS = {
+        'cpu': (['usr', 'sys', 'wai'], '[%]'),
+        'net': (['send', 'recv'], '[MBps]'),
+        'mem': (['used'], '[GB]'),
+        'dsk': (['read', 'writ'], '[MB]'),
+    }
+
+    # size in inches of the paper shaped charts (see plot_clean)
+    CLEAN_FIGSIZE = (25.9, 3.7)
+
     COLORS = [
                 '#FFC107',
                 '#3F51B5'
@@ -33,7 +71,9 @@ class DStatAggregate(object):
                 #'#4CAF50',
             ]
 
-    def __init__(self, input_dir, output_dir, dfs=None, filename="", grain=False, cumulative=False):
+    def __init__(self, input_dir, output_dir, dfs=None, filename="", window=None, cumulative=False, min_overlap=0.0,
+                 freq=10**9, tolerance=None, files=None, band='std', summaries=None, store=None,
+                 tree=None, cache=True):
         """
         The init function here should provide there ordered steps:
             - select overlapped dfs and save those in one aggregating dfs dictionary - keyed by following columns:
@@ -48,44 +88,100 @@ class DStatAggregate(object):
         :param output_dir: output directory for aggregated results
         :param dfs: list o base dfs inside main directory
         :param filename: base abspath input filename
+        :param window: DStat window object (see DStatWindow) selecting the aggregated observation interval, runtime
+                       offsets refer to the first sample of the overlapping nodes (see start); absolute windows are
+                       also pushed down into the streams
+        :param min_overlap: minimum ratio (0-1) of each node duration the common observation window has to cover
+        :param freq: alignment grid step in nanoseconds
+        :param tolerance: maximum distance in nanoseconds between a grid point and the node sample snapped on it,
+                          if None half of the grid step
+        :param files: list of dstat files abspaths aggregated in streaming (see DStatOnlineAggregate) instead of dfs;
+                      only the cluster-level columns are computed
+        :param band: band drawn around the aggregated metrics: 'std' (avg +- 2 std) or 'percentile' (p50 line,
+                     p95 and p99 lines, min-max range)
+        :param summaries: list of DStat summary objects (see DStatSummary), e.g. one for each node or rack, merged
+                          instead of dfs; only the cluster-level columns are computed
+        :param tree: DStat summary tree object (see DStatSummaryTree) holding the previous merge of the summaries:
+                     only the added, removed or replaced ones are merged again
+        :param store: DStat aggregate store object (see DStatAggregateStore) the results are reloaded from, nothing
+                      is computed
+        :param cache: Boolean, if False the time index of the streamed files is not stored (see DStatStream)
         """
         self.cumulative_feat = cumulative
+        self.band = band
+        self.freq = freq
+        self.tolerance = tolerance
 
-        if len(filename):
+        if store is not None:
+            print 'Loading aggregated results. . .'
+            self.df, self.nodes, self.date, self.filename = store.load()
+
+        elif len(filename):
             self.filename = input_dir + filename
             self.df = self._read_csv(self.filename)
 
         elif dfs is not None:
-            dfs = self._filter_dfs(dfs)
+            dfs = self._filter_dfs(dfs, min_overlap)
             if not len(dfs):
                 raise DStatAggregateNoValidExperiments('Experiments provided are not intersected; no aggregation is possible.')
 
             for df in dfs:
                 self._select_global(df)
-                self._add_multindex(df)
 
-            self.filename = self._set_filename(dfs, input_dir)
+            self.filename = self._set_filename([df.name for df in dfs], input_dir)
 
-            dfs = self._time_as_index_topandas(dfs)  # returns dataframes
+            # method returns the aggregated cluster cube
+            cube = self._to_cube(dfs)
 
-            # method returns the aggregated dataframe
-            df = self._join_dfs(dfs)
-            df = self._reshape(df)
-
-            if grain:
+            if window is not None:
                 # filter by selected time range
-                df = self._partition_time(df)
+                lo, hi = window.select(cube.time.astype('datetime64[ns]').view('i8'))
+                if lo == hi:
+                    raise DStatAggregateNoValidExperiments('No sample inside the selected time range.')
+                cube = cube.window(cube.time[lo], cube.time[hi - 1])
 
             # save the main object variable
-            self.df = self._to_dict(df)
+            self.df = self._to_dict(cube)
+
+        elif files is not None:
+            # widened by one bucket, samples are rounded to the nearest bucket
+            pushed = window.widen(freq) if window is not None and window.is_absolute() else None
+            files = self._filter_files(files, min_overlap, pushed, cache)
+            self.filename = self._set_filename([get_result_dir_name(fn) for fn in files], input_dir)
+
+            print 'Aggregating streams. . .'
+            online = DStatOnlineAggregate(freq)
+            self.df = online.aggregate([DStatStream(fn, groups=self.GLOBAL_GROUPS, chunksize=online.CHUNKSIZE,
+                                                    window=pushed, cache=cache) for fn in files])
+
+            if window is not None:
+                self._select_window(window)
 
-        self.nodes = self.filename.split('/')[-1].split('.')[0].split('-')[1::2]
-        self.date = self.df.itervalues().next().index[0]
+            self._online_cumulative()
 
-        # turn the indexes from datetimes to runtimes in seconds
-        self._to_runtime()
+        elif summaries is not None:
+            summaries = self._filter_summaries(summaries, min_overlap)
+            self.filename = self._set_filename([summary.name for summary in summaries], input_dir)
+
+            print 'Merging summaries. . .'
+            merged = tree.update(summaries) if tree is not None else reduce(DStatSummary.merge, summaries)
+            self.df = merged.to_dict(self.DEVICES, self.PERCENTILES)
+
+            if window is not None:
+                self._select_window(window)
+
+            self._online_cumulative()
+
+        if store is None:
+            self.nodes = self.filename.split('/')[-1].split('.')[0].split('-')[1::2]
+            self.date = self.df.itervalues().next().index[0]
+
+            # turn the indexes from datetimes to runtimes in seconds
+            self._to_runtime()
 
         self.outdir = output_dir
+        # chart files written for each device, see save
+        self.charts = {}
 
     def get_dict(self):
         """ getter method """
@@ -99,150 +195,100 @@ class DStatAggregate(object):
         """ get nodes list """
         return self.nodes
 
-    def to_csv(self):
-        """Export dict-like object dataframes in .csv sheets """
+    def render_key(self):
+        """
+        :return: json serializable description of the options the charts are rendered with: results rendered again
+                 with the same key give the same charts
+        """
+        return {
+            'band': self.band,
+            'cumulative': self.cumulative_feat,
+            'heatmaps': dict((mod, [list(metrics), unit]) for mod, (metrics, unit) in self.HEATMAPS.iteritems()),
+            'figsize': [list(mpl.rcParams['figure.figsize']), list(self.CLEAN_FIGSIZE)],
+            'dpi': [mpl.rcParams['figure.dpi'], mpl.rcParams['savefig.dpi']],
+            'points': point_budget(),
+        }
 
-        for k, v in self.df.iteritems():
-            v.to_csv(self.filename + '_' + k + '.csv', tupleize_cols=False,) # date_format='%Y-%m-%d %H:%M:%S.%f')
+    def to_store(self, store, key=None):
+        """
+        Export dict-like object dataframes, nodes and date into a binary store
+        :param store: DStat aggregate store object
+        :param key: source files and options the results are bound to (see DStatAggregateStore.key)
+        """
+        store.save(self.df, self.nodes, self.date, self.filename, key=key)
 
-    def _to_dict(self, df):
+    def _to_dict(self, cube):
         """
         Structure a keyed by metric dictionary with dataframe data
             - cpu: cl1-totcpusage - cl2-totcpusage - - cln-totcpusage
             - network: cl1-net/total - cl2-net/total - - cln-net/total
             - memory: cl1 -net/total - cl2-memoryusage - - cln-memoryusage
             - disk: cl1-dsk/total - cl2-dsk/total - - cln-dsk/usage
-        :param df: joined cleaned dataframe
+        followed by the cross-node average (avg_), standard deviation (std_), percentiles (p50_, p95_, p99_, min_, max_)
+        and, if the cumulative feature is enabled, sum (sum_) and cumulative sum (cumulative_) of each metric. Each
+        statistic is a single reduction along the cube node axis. The per-node columns are copied once, straight from
+        the cube into the dataframe block, where every column is then scaled to the device unit: the cube is left
+        untouched.
+        :param cube: aligned cluster cube
         :return: dataframe as a dict object keyed by metric
         """
         ret = {}
         print 'Saving dataframe. . .'
-        cpu = pd.DataFrame(df.iloc[:, df.columns.get_level_values(1) == 'total cpu usage'], index=df.index)
-        cpu = self._compute_df(cpu, 'cpu')
-        ret['cpu'] = cpu
-
-        net = pd.DataFrame(df.iloc[:, df.columns.get_level_values(1) == 'net/total'], index=df.index)
-        net = self._compute_df(net, 'net')
-        ret['net'] = net
-
-        mem = pd.DataFrame(df.iloc[:, df.columns.get_level_values(1) == 'memory usage'], index=df.index)
-        mem = self._compute_df(mem, 'mem')
-        ret['mem'] = mem
-
-        dsk = pd.DataFrame(df.iloc[:, df.columns.get_level_values(1) == 'dsk/total'], index=df.index)
-        dsk = self._compute_df(dsk, 'dsk')
-        ret['dsk'] = dsk
-
+        for device, group, divisor in self.DEVICES:
+            metrics = cube.metrics[cube.group(group)]
+            names = [metric for _, metric in metrics]
+
+            stats = [cube.mean(group), cube.std(group)]
+            columns = [(node,) + col for node in cube.nodes for col in metrics]
+            columns += [('avg_' + name, '', '') for name in names] + [('std_' + name, '', '') for name in names]
+
+            stats += cube.percentiles(group, [q for q, _ in self.PERCENTILES])
+            for _, prefix in self.PERCENTILES:
+                columns += [(prefix + name, '', '') for name in names]
+
+            cumulative = self.CUMULATIVE.get(device, []) if self.cumulative_feat else []
+            if len(cumulative):
+                sums = cube.sum(group)[:, [names.index(name) for name in cumulative]]
+                stats += [sums, np.cumsum(sums, axis=0)]
+                columns += [('sum_' + name, '', '') for name in cumulative]
+                columns += [('cumulative_' + name, '', '') for name in cumulative]
+
+            values = np.empty((len(cube.time), len(columns)))
+            view, width = cube.view(group), len(metrics)
+            for node in range(len(cube.nodes)):
+                values[:, node * width:(node + 1) * width] = view[:, node, :]
+            pos = len(cube.nodes) * width
+            for block in stats:
+                values[:, pos:pos + block.shape[1]] = block
+                pos += block.shape[1]
+            if divisor != 1:
+                values /= divisor
+
+            ret[device] = pd.DataFrame(values, index=pd.Index(cube.time, name='epoch'),
+                                       columns=pd.MultiIndex.from_tuples(columns))
         return ret
 
-    def _compute_df(self, df, mod=''):
-        """
-        Computes main operations on data. Operation are:
-        - average on data for each inner column
-        - standard deviation on data for each inner column
-        :param df: joined and cleaned dataframe
-        :param mod: current device
-        :return: new dataframe with result columns
-        """
-        if mod == 'cpu':
-            return self._compute_cpu(df)
-        elif mod == 'net':
-            df.ix[:, df.columns] = df.ix[:, df.columns].divide(1024*1024)
-            return self._compute_net(df)
-        elif mod == 'mem':
-            df.ix[:, df.columns] = df.ix[:, df.columns].divide(1024*1024*1024)
-            return self._compute_mem(df)
-        else:  # disk
-            df.ix[:, df.columns] = df.ix[:, df.columns].divide(1024*1024)
-            return self._compute_dsk(df)
-
-    @staticmethod
-    def _compute_cpu(df):
+    def _select_window(self, window):
         """
-        Computes main operations on cpu data
-        :param df: input dataframe
-        :return: new dataframe with result columns
+        Keeps the dataframes rows inside the window, all of them sharing the same index
+        :param window: DStat window object
         """
-        df['avg_sys'] = df.iloc[:, df.columns.get_level_values(2) == 'sys'].mean(axis=1)
-        df['avg_usr'] = df.iloc[:, df.columns.get_level_values(2) == 'usr'].mean(axis=1)
-        df['avg_idl'] = df.iloc[:, df.columns.get_level_values(2) == 'idl'].mean(axis=1)
-        df['avg_wai'] = df.iloc[:, df.columns.get_level_values(2) == 'wai'].mean(axis=1)
-        df['avg_hiq'] = df.iloc[:, df.columns.get_level_values(2) == 'hiq'].mean(axis=1)
-        df['avg_siq'] = df.iloc[:, df.columns.get_level_values(2) == 'siq'].mean(axis=1)
-
-        df['std_sys'] = df.iloc[:, df.columns.get_level_values(2) == 'sys'].std(axis=1)
-        df['std_usr'] = df.iloc[:, df.columns.get_level_values(2) == 'usr'].std(axis=1)
-        df['std_idl'] = df.iloc[:, df.columns.get_level_values(2) == 'idl'].std(axis=1)
-        df['std_wai'] = df.iloc[:, df.columns.get_level_values(2) == 'wai'].std(axis=1)
-        df['std_hiq'] = df.iloc[:, df.columns.get_level_values(2) == 'hiq'].std(axis=1)
-        df['std_siq'] = df.iloc[:, df.columns.get_level_values(2) == 'siq'].std(axis=1)
+        lo, hi = window.select(self.df['cpu'].index.values.astype('datetime64[ns]').view('i8'))
+        if lo == hi:
+            raise DStatAggregateNoValidExperiments('No sample inside the selected time range.')
+        self.df = dict((k, v.iloc[lo:hi]) for k, v in self.df.iteritems())
 
-        return df
-
-    def _compute_net(self, df):
+    def _online_cumulative(self):
         """
-        Computes main operations on cpu data
-        :param df: input dataframe
-        :return: new dataframe with result columns
+        Completes the streaming or summaries aggregation dict: sum_ columns are turned into cumulative ones for the compatible
+        metrics if the cumulative feature is enabled, dropped otherwise
         """
-        df['avg_send'] = df.iloc[:, df.columns.get_level_values(2) == 'send'].mean(axis=1)
-        df['avg_recv'] = df.iloc[:, df.columns.get_level_values(2) == 'recv'].mean(axis=1)
-
-        df['std_send'] = df.iloc[:, df.columns.get_level_values(2) == 'send'].std(axis=1)
-        df['std_recv'] = df.iloc[:, df.columns.get_level_values(2) == 'recv'].std(axis=1)
-
-        if self.cumulative_feat:
-            df['sum_send'] = df.iloc[:, df.columns.get_level_values(2) == 'send'].sum(axis=1)
-            df['sum_recv'] = df.iloc[:, df.columns.get_level_values(2) == 'recv'].sum(axis=1)
-
-            df['cumulative_send'] = df['sum_send'].cumsum()
-            df['cumulative_recv'] = df['sum_recv'].cumsum()
-
-        return df
-
-    def _compute_mem(self, df):
-        """
-        Computes main operations on cpu data
-        :param df: input dataframe
-        :return: new dataframe with result columns
-        """
-        df['avg_used'] = df.iloc[:, df.columns.get_level_values(2) == 'used'].mean(axis=1)
-        df['avg_buff'] = df.iloc[:, df.columns.get_level_values(2) == 'buff'].mean(axis=1)
-        df['avg_free'] = df.iloc[:, df.columns.get_level_values(2) == 'free'].mean(axis=1)
-        df['avg_cach'] = df.iloc[:, df.columns.get_level_values(2) == 'cach'].mean(axis=1)
-
-        df['std_used'] = df.iloc[:, df.columns.get_level_values(2) == 'used'].std(axis=1)
-        df['std_buff'] = df.iloc[:, df.columns.get_level_values(2) == 'buff'].std(axis=1)
-        df['std_free'] = df.iloc[:, df.columns.get_level_values(2) == 'free'].std(axis=1)
-        df['std_cach'] = df.iloc[:, df.columns.get_level_values(2) == 'cach'].std(axis=1)
-
-        if self.cumulative_feat:
-            df['sum_used'] = df.iloc[:, df.columns.get_level_values(2) == 'used'].sum(axis=1)
-
-            df['cumulative_used'] = df['sum_used'].cumsum()
-
-        return df
-
-    def _compute_dsk(self, df):
-        """
-        Computes main operations on cpu data
-        :param df: input dataframe
-        :return: new dataframe with result columns
-        """
-        df['avg_read'] = df.iloc[:, df.columns.get_level_values(2) == 'read'].mean(axis=1)
-        df['avg_writ'] = df.iloc[:, df.columns.get_level_values(2) == 'writ'].mean(axis=1)
-
-        df['std_read'] = df.iloc[:, df.columns.get_level_values(2) == 'read'].std(axis=1)
-        df['std_writ'] = df.iloc[:, df.columns.get_level_values(2) == 'writ'].std(axis=1)
-
-        if self.cumulative_feat:
-            df['sum_read'] = df.iloc[:, df.columns.get_level_values(2) == 'read'].sum(axis=1)
-            df['sum_writ'] = df.iloc[:, df.columns.get_level_values(2) == 'writ'].sum(axis=1)
-
-            df['cumulative_read'] = df['sum_read'].cumsum()
-            df['cumulative_writ'] = df['sum_writ'].cumsum()
-
-        return df
+        for device, df in self.df.iteritems():
+            metrics = self.CUMULATIVE.get(device, []) if self.cumulative_feat else []
+            df.drop([col for col in df.columns if col.startswith('sum_') and col[4:] not in metrics],
+                    axis=1, inplace=True)
+            for metric in metrics:
+                df['cumulative_' + metric] = df['sum_' + metric].cumsum()
 
     def _read_csv(self, filename=""):
         """
@@ -281,34 +327,171 @@ class DStatAggregate(object):
         return dfs
 
     @staticmethod
-    def _filter_dfs(dfs):
+    def _filter_dfs(dfs, min_overlap=0.0):
         """
-        For each DStat frame object, compute intersection with each other dataframe, push inside a set intersecting
-        dataframes,excluding not intersecting dataframes.
+        Selects the largest group of mutually overlapping DStat frame objects. Each frame is reduced to its
+        [first, last] epoch interval; a sweep over the sorted interval bounds finds the instant covered by most
+        intervals and the frames covering it make the group. Frames sharing less than min_overlap of their duration
+        with the group common window are then pruned (see _prune_overlap).
         :param dfs: list of base DStat frame objects concerning the whole experiments inside the current directory
+        :param min_overlap: minimum ratio (0-1) between the group common window and each frame duration
         :return: list of intersected DStat Frame Objects.
         """
-        ret = set()
-        for outer in dfs:
-            found = False
-            sout = set(outer.df['epoch', 'epoch'])
-            if not len(ret):
-                ret.add(outer)
-                continue
-            for inner in ret:
-                sin = set(inner.df['epoch', 'epoch'])
-                if len(sout.intersection(sin)):
-                    found = True
-                    break
-            if found:
-                ret.add(outer)
-
-        if not len(ret):
+        if not len(dfs):
             print "Aggregation is not possible; no files founded. Please check input directory."
             exit(1)
-        print str(len(ret)) + ' nodes found for the experiment %s' % (next(iter(ret)).df['epoch', 'epoch'][0]).strftime('%Y-%m-%d')
 
-        return list(ret)
+        bounds = [DStatAggregate._interval(df) if len(df.df.index) else None for df in dfs]
+        return DStatAggregate._select_overlapping(dfs, [df.name for df in dfs], bounds, min_overlap)
+
+    @staticmethod
+    def _filter_files(files, min_overlap=0.0, window=None, cache=True):
+        """
+        Streaming counterpart of _filter_dfs: the epoch interval of each file is collected reading the epoch column
+        only, in bounded chunks
+        :param files: list of dstat files abspaths
+        :param min_overlap: minimum ratio (0-1) between the group common window and each file duration
+        :param window: DStat window object the files are read through, None for the whole files
+        :param cache: Boolean, if False the files time index is not stored (see DStatStream)
+        :return: list of intersected files
+        """
+        if not len(files):
+            print "Aggregation is not possible; no files founded. Please check input directory."
+            exit(1)
+
+        bounds = []
+        for fn in files:
+            first, last = None, None
+            for epoch, values in DStatStream(fn, groups=[], window=window, cache=cache).chunks():
+                if len(epoch):
+                    first = epoch[0] if first is None else first
+                    last = epoch[-1]
+            bounds.append((first, last) if first is not None else None)
+
+        return DStatAggregate._select_overlapping(files, files, bounds, min_overlap)
+
+    @staticmethod
+    def _filter_summaries(summaries, min_overlap=0.0):
+        """
+        Summaries counterpart of _filter_dfs: intervals are the first and the last bucket of each summary
+        :param summaries: list of DStat summary objects
+        :param min_overlap: minimum ratio (0-1) between the group common window and each summary duration
+        :return: list of intersected DStat summary objects
+        """
+        if not len(summaries):
+            print "Aggregation is not possible; no summaries founded. Please check input directory."
+            exit(1)
+
+        bounds = [summary.bounds() if len(summary.buckets) else None for summary in summaries]
+        return DStatAggregate._select_overlapping(summaries, [s.name for s in summaries], bounds, min_overlap)
+
+    @staticmethod
+    def _select_overlapping(items, names, bounds, min_overlap):
+        """
+        Keeps the items of the largest mutually overlapping group (see _overlapping), reporting the discarded ones.
+        Nodes without samples, e.g. outside the observation window, are discarded first.
+        :param items: list of nodes objects
+        :param names: list of nodes names
+        :param bounds: list of (first, last) int64 nanoseconds epoch tuples of each node, None for a node without
+                       samples
+        :param min_overlap: minimum ratio (0-1) between the group common window and each node duration
+        :return: list of selected items
+        """
+        for idx in range(len(items)):
+            if bounds[idx] is None:
+                print names[idx] + ' discarded: no valid sample'
+        valid = [idx for idx in range(len(items)) if bounds[idx] is not None]
+        if not len(valid):
+            raise DStatAggregateNoValidExperiments('No node has a valid sample; no aggregation is possible.')
+        items, names, bounds = [items[idx] for idx in valid], [names[idx] for idx in valid], \
+            [bounds[idx] for idx in valid]
+
+        selected = DStatAggregate._overlapping(bounds, min_overlap)
+        for idx in range(len(items)):
+            if idx not in selected:
+                print names[idx] + ' discarded: not overlapping with the experiment'
+
+        ret = [items[idx] for idx in selected]
+        print str(len(ret)) + ' nodes found for the experiment %s' % \
+            pd.Timestamp(bounds[selected[0]][0]).strftime('%Y-%m-%d')
+
+        return ret
+
+    @staticmethod
+    def _overlapping(bounds, min_overlap=0.0):
+        """
+        A sweep over the sorted interval bounds finds the instant covered by most intervals, the intervals covering
+        it make the largest mutually overlapping group
+        :param bounds: list of (first, last) int64 nanoseconds epoch tuples
+        :param min_overlap: minimum ratio (0-1) between the group common window and each interval duration
+        :return: sorted list of the selected intervals indexes
+        """
+        bounds = np.array(bounds, dtype=np.int64)
+        starts, ends = bounds[:, 0], bounds[:, 1]
+
+        # intervals covering each start instant: the ones started at or before it, minus the ones already ended
+        sorted_starts, sorted_ends = np.sort(starts), np.sort(ends)
+        depth = np.searchsorted(sorted_starts, sorted_starts, side='right') - \
+            np.searchsorted(sorted_ends, sorted_starts, side='left')
+        instant = sorted_starts[np.argmax(depth)]
+        group = np.nonzero((starts <= instant) & (ends >= instant))[0]
+
+        return DStatAggregate._prune_overlap(starts, ends, group, min_overlap)
+
+    @staticmethod
+    def start(bounds, min_overlap=0.0):
+        """
+        First epoch of the nodes the aggregation keeps (see _overlapping): nodes discarded as not overlapping with
+        the experiment don't move it
+        :param bounds: list of (first, last) int64 nanoseconds epoch tuples of each node
+        :param min_overlap: minimum ratio (0-1) between the group common window and each node duration
+        :return: int64 nanoseconds epoch
+        """
+        return min(bounds[idx][0] for idx in DStatAggregate._overlapping(bounds, min_overlap))
+
+    @staticmethod
+    def _interval(df):
+        """
+        :param df: DStat frame object
+        :return: first and last epoch of the frame as int64 nanoseconds
+        """
+        epoch = df.df['epoch', 'epoch'].values.astype('datetime64[ns]').view('i8')
+        return epoch.min(), epoch.max()
+
+    @staticmethod
+    def _prune_overlap(starts, ends, group, min_overlap):
+        """
+        Removes the frames bounding the group common window - the latest started or the earliest ended, whichever
+        widens the window the most - until the window covers at least min_overlap of each remaining frame duration.
+        Checking the longest remaining frame is enough, since the window is shared.
+        :param starts: int64 array of the frames first epoch
+        :param ends: int64 array of the frames last epoch
+        :param group: indexes of mutually overlapping frames
+        :param min_overlap: minimum ratio (0-1) between the group common window and each frame duration
+        :return: sorted list of the selected frames indexes
+        """
+        by_start = sorted(group, key=lambda idx: -starts[idx])  # latest started first
+        by_end = sorted(group, key=lambda idx: ends[idx])  # earliest ended first
+        by_length = sorted(group, key=lambda idx: starts[idx] - ends[idx])  # longest first
+        removed = set()
+
+        def valid(order, pos):
+            while order[pos] in removed:
+                pos += 1
+            return pos
+
+        ps = pe = pl = 0
+        while len(removed) < len(group) - 1:
+            ps, pe, pl = valid(by_start, ps), valid(by_end, pe), valid(by_length, pl)
+            window = ends[by_end[pe]] - starts[by_start[ps]]
+            length = ends[by_length[pl]] - starts[by_length[pl]]
+            if window >= min_overlap * length:
+                break
+            widen_start = starts[by_start[ps]] - starts[by_start[valid(by_start, ps + 1)]]
+            widen_end = ends[by_end[valid(by_end, pe + 1)]] - ends[by_end[pe]]
+            removed.add(by_start[ps] if widen_start >= widen_end else by_end[pe])
+
+        return sorted(set(group) - removed)
 
     @staticmethod
     def _select_global(df):
@@ -317,112 +500,62 @@ class DStatAggregate(object):
         :param dfs: list of intersecting DStat frame objects.
         :return: filtered DStat frame objects.
         """
-        try:
-            new = df.df[['epoch', 'total cpu usage', 'net/total', 'memory usage', 'dsk/total']]  # original df
-        except KeyError as e:
-            raise DStatReadColumnsException(e.message)
+        new = df._read_dataframe(['epoch'] + DStatAggregate.GLOBAL_GROUPS)  # original df
         df.set_df(other=new)
 
     @staticmethod
-    def _add_multindex(df):
-        """
-        Adds outer column level for each experiment - which matches the name of the experiment
-        :param dfs: intersected and filtered DStat frame objects
-        :return: list of DStat frame objects
-        """
-        cols = []
-        tmp = df.df.columns.values
-        for idx in range(0, len(tmp)):
-            tmp[idx] = (df.name.split('/')[-1],) + tmp[idx]
-            cols.append(tmp[idx])
-        df.df.columns = pd.MultiIndex.from_tuples(cols)
-
-    @staticmethod
-    def _set_filename(dfs, input_dir):
+    def _set_filename(names, input_dir):
         """
         Function that build output base filename - e.g. cloud-x-cloud-y-cloud-z, where x,y,z are node numbers
-        :param dfs: list of pandas dataframes
+        :param names: list of nodes names
         :param input_dir: working directory
         :return: self.filename
         """
         print 'Setting new filenames. . .'
         ret = ""
-        for df in dfs:
-            ret += '-'.join(df.name.split('-')[-2:])
+        for name in names:
+            ret += '-'.join(name.split('-')[-2:])
             ret += '-'
         if len(ret) > 255:
             red = ""
-            red += '-'.join(df.name.split('-')[-1])
+            red += '-'.join(name.split('-')[-1])
             red += '-'
             ret = red
         return input_dir + '/' + ret[:-1]
 
-    @staticmethod
-    def _time_as_index_topandas(dfs):
-        """
-        Converts 'epoch' column in the dataframe index
-        :param dfs: DStat frames objects
-        :return: pandas dataframes
-        """
-        print 'Setting indexing. . .'
-        items = [df.df.set_index(df.df[df.name.split('/')[-1], 'epoch', 'epoch']) for df in dfs]
-        for item in items:
-            item.index.name = 'epoch'
-        return items
-
-    def _join_dfs(self, dfs):
-        """
-        Create a tmp dataframe with a new datetime objects index which covers the entire observation period
-        and left outer joins each dataframe with it
-        :param dfs: list of dataframes
-        :return: the aggregated dataframe
-        """
-        print 'Joining Dataframes'
-        left_df = self._create_left_df(dfs)
-        left_df = left_df.join(dfs, how='left', rsuffix='_r', lsuffix='_l')
-        return left_df
-
-    @staticmethod
-    def _create_left_df(dfs):
+    def _to_cube(self, dfs):
         """
-        Create a tmp dataframe with a new datetime objects index which covers the entire observation period
-        :param dfs: list of dataframes
-        :return: temporary full-indexed dataframe
+        Align each DStat frame onto a regular time grid which covers the entire observation period (see DStatAlign)
+        and stack the dense node blocks in the cluster cube. Frames epochs are already increasing (see
+        DStatFrame._drop_oversampled), as the alignment needs.
+        :param dfs: list of DStat frame objects holding the global columns
+        :return: DStat cube object
         """
-        time = set()
+        print 'Aligning Dataframes'
+        align = DStatAlign(self.freq, self.tolerance)
+        epochs, values, columns = [], [], []
         for df in dfs:
-            for value in np.ndenumerate(df.index.values):
-                time.add(value[1])
-        sorted = list(time)
-        sorted.sort()
-        index = pd.Index(data=sorted, name='epoch')
-        return pd.DataFrame(data=sorted, index=index, columns=['epoch'])
-
-    def _reshape(self, df):
-        """
-        Reshape column and index after the join
-        Call drop_duplicates function
-        :param df: joined dataframe
-        :return: cleaned joined dataframe
-        """
-        print 'Final reshaping'
-        tmp = df.columns.values
-        cols = []
-        for idx in range(0, len(tmp)):
-            cols.append(tmp[idx] if isinstance(tmp[idx], tuple) else (tmp[idx],))
-        df.columns = pd.MultiIndex.from_tuples(cols)
-        return self._drop_duplicates(df)
+            selected = df.df.columns.get_level_values(0) != 'epoch'
+            epochs.append(df.df['epoch', 'epoch'].values.astype('datetime64[ns]').view('i8'))
+            values.append(df.df.iloc[:, selected].values)
+            columns.append(list(df.df.columns.values[selected]))
 
-    @staticmethod
-    def _drop_duplicates(df):
+        grid = align.grid(epochs)
+        blocks = (align.align(epoch, block, grid) for epoch, block in zip(epochs, values))
+        nodes = [df.name.split('/')[-1] for df in dfs]
+        return DStatCube.from_blocks(grid.view('datetime64[ns]'), nodes, columns, blocks)
+
+    def _band_columns(self, df, metric):
         """
-        Drop duplicates due to left outer multiple join operation
-        :param df: joined and reshaped dataframe
-        :return: cleaned join dataframe
+        :param df: aggregated dataframe of the device
+        :param metric: metric name, e.g. 'usr'
+        :return: columns plotted for the metric with the current band style; the standard deviation band ones if the
+                 dataframe has no percentile columns (legacy csv files and stores)
         """
-        to_drop = df.filter(regex="epoch")
-        df.drop(to_drop.columns.values, axis=1, inplace=True)
-        return df
+        percentiles = [prefix + metric for _, prefix in self.PERCENTILES]
+        if self.band == 'percentile' and all(col in df for col in percentiles):
+            return percentiles
+        return ['avg_' + metric, 'std_' + metric]
 
     def plot_aggr(self, df, mod='', plot=False):
         """
@@ -437,16 +570,20 @@ class DStatAggregate(object):
         # df = self._to_runtimes(df)
         # print df['epoch']
 
+        if self.band == 'percentile' and not any((col[0] if isinstance(col, tuple) else col).startswith('p50_')
+                                                 for col in df.columns):
+            print "%s aggregated results hold no percentiles: standard deviation band drawn" % mod
+
         if mod == 'cpu':
-            self._plot_together(df[['avg_usr', 'std_usr']], 'CPU usage: user [%]', 'cpu', 'usr', plot)
-            self._plot_together(df[['avg_sys', 'std_sys']], 'CPU usage: system [%]', 'cpu', 'sys', plot)
-            self._plot_together(df[['avg_idl', 'std_idl']], 'CPU usage: idle [%]', 'cpu', 'idl', plot)
-            self._plot_together(df[['avg_wai', 'std_wai']], 'CPU usage: wait [%]', 'cpu', 'wai', plot)
-            self._plot_together(df[['avg_hiq', 'std_hiq']], 'CPU usage: hiq [%]', 'cpu', 'hiq', plot)
-            self._plot_together(df[['avg_siq', 'std_siq']], 'CPU usage: siq [%]', 'cpu', 'siq', plot)
+            self._plot_together(df[self._band_columns(df, 'usr')], 'CPU usage: user [%]', 'cpu', 'usr', plot)
+            self._plot_together(df[self._band_columns(df, 'sys')], 'CPU usage: system [%]', 'cpu', 'sys', plot)
+            self._plot_together(df[self._band_columns(df, 'idl')], 'CPU usage: idle [%]', 'cpu', 'idl', plot)
+            self._plot_together(df[self._band_columns(df, 'wai')], 'CPU usage: wait [%]', 'cpu', 'wai', plot)
+            self._plot_together(df[self._band_columns(df, 'hiq')], 'CPU usage: hiq [%]', 'cpu', 'hiq', plot)
+            self._plot_together(df[self._band_columns(df, 'siq')], 'CPU usage: siq [%]', 'cpu', 'siq', plot)
         elif mod == 'net':
-            self._plot_together(df[['avg_send', 'std_send']], 'Network Bandwidth: sent [MBps]', 'net', 'send', plot)
-            self._plot_together(df[['avg_recv', 'std_recv']], 'Network Bandwidth: received [MBps]', 'net', 'recv', plot)
+            self._plot_together(df[self._band_columns(df, 'send')], 'Network Bandwidth: sent [MBps]', 'net', 'send', plot)
+            self._plot_together(df[self._band_columns(df, 'recv')], 'Network Bandwidth: received [MBps]', 'net', 'recv', plot)
 
             if self.cumulative_feat:
                 self._plot_together(df[['sum_send', 'cumulative_send']], 'Network Bandwidth: sent [MBps] and Cumulative',
@@ -454,17 +591,17 @@ class DStatAggregate(object):
                 self._plot_together(df[['sum_recv', 'cumulative_recv']], 'Network Bandwidth: received [MBps] and Cumulative',
                                     'net', 'recv', plot)
         elif mod == 'mem':
-            self._plot_together(df[['avg_used', 'std_used']], 'Memory usage: used [GB]', 'mem', 'used', plot)
-            self._plot_together(df[['avg_free', 'std_free']], 'Memory usage: free [GB]', 'mem', 'free', plot)
-            self._plot_together(df[['avg_buff', 'std_buff']], 'Memory usage: buff [GB]', 'mem', 'buff', plot)
-            self._plot_together(df[['avg_cach', 'std_cach']], 'Memory usage: cach [GB]', 'mem', 'cach', plot)
+            self._plot_together(df[self._band_columns(df, 'used')], 'Memory usage: used [GB]', 'mem', 'used', plot)
+            self._plot_together(df[self._band_columns(df, 'free')], 'Memory usage: free [GB]', 'mem', 'free', plot)
+            self._plot_together(df[self._band_columns(df, 'buff')], 'Memory usage: buff [GB]', 'mem', 'buff', plot)
+            self._plot_together(df[self._band_columns(df, 'cach')], 'Memory usage: cach [GB]', 'mem', 'cach', plot)
 
             if self.cumulative_feat:
                 self._plot_together(df[['sum_used', 'cumulative_used']], 'Memory usage: used [GB] and Cumulative',
                                     'mem', 'used', plot)
         else:  # disk
-            self._plot_together(df[['avg_read', 'std_read']], 'Disk Volume: read [MB]', 'dsk', 'read', plot)
-            self._plot_together(df[['avg_writ', 'std_writ']], 'Disk volume: write [MB]', 'dsk', 'writ', plot)
+            self._plot_together(df[self._band_columns(df, 'read')], 'Disk Volume: read [MB]', 'dsk', 'read', plot)
+            self._plot_together(df[self._band_columns(df, 'writ')], 'Disk volume: write [MB]', 'dsk', 'writ', plot)
 
             if self.cumulative_feat:
                 self._plot_together(df[['sum_read', 'cumulative_read']], 'Disk Volume: read [MB] and Cumulative',
@@ -513,6 +650,55 @@ class DStatAggregate(object):
                 self._plot_together(df[['sum_writ', 'cumulative_writ']], 'Cumulative Disk volume: write [MB]',
                                     'dsk', ['sum_writ', 'cumulative_writ'], plot, clean=True)
 
+    @staticmethod
+    def node_heat(df, metric):
+        """
+        :param df: aggregated dataframe of a device
+        :param metric: metric name, e.g. 'usr'
+        :return: list of the nodes and float32 (node x runtime) array of their metric values, taken as a single block
+                 from the aligned per-node columns; an empty list and None if the dataframe has no per-node column
+        """
+        positions = [pos for pos, col in enumerate(df.columns)
+                     if isinstance(col, tuple) and len(col) == 3 and len(col[1]) and col[2] == metric]
+        if not len(positions):
+            return [], None
+        nodes = [df.columns[pos][0] for pos in positions]
+        return nodes, np.ascontiguousarray(df.iloc[:, positions].values.T, dtype=np.float32)
+
+    def plot_heatmap(self, df, mod='', plot=False):
+        """
+        Plotting a node x runtime heatmap of each global metric of the device, e.g. cpu usr, sys and wai: a row per
+        node, drawn with a single image call
+        :param df: input dataframe which contains results to plot
+        :param mod: current device, i.e. cpu, net, mem or dsk
+        :param plot: Boolean, if True results will be plotted
+        :return:
+        """
+        metrics, unit = self.HEATMAPS.get(mod, ([], ''))
+        for metric in metrics:
+            nodes, heat = self.node_heat(df, metric)
+            if heat is None:
+                print "%s heatmaps skipped: the aggregation holds no per-node values" % mod
+                return
+
+            runtime = df.index.values
+            fig = plt.figure(figsize=(12, max(3, 0.25 * len(nodes) + 1.5)))
+            ax = fig.gca()
+            img = ax.imshow(heat, aspect='auto', interpolation='nearest', cmap='YlOrRd', origin='upper',
+                            extent=[runtime[0], runtime[-1], len(nodes) - 0.5, -0.5], vmin=0,
+                            vmax=100 if mod == 'cpu' else None)
+            step = max(1, len(nodes) // 40)
+            ax.set_yticks(range(0, len(nodes), step))
+            ax.set_yticklabels(nodes[::step])
+            ax.set_xlabel("runtime [sec]")
+            ax.set_title('%s %s across nodes' % (mod, metric))
+            fig.colorbar(img, ax=ax).set_label(metric + ' ' + unit)
+
+            if plot:
+                plt.show()
+            else:
+                self.save(self.date.date().strftime('%Y-%m-%d') + '-' + mod + '-' + metric + '-nodes-heatmap', mod)
+                plt.close(fig)
 
     def _to_runtime(self):
         """
@@ -521,7 +707,7 @@ class DStatAggregate(object):
         """
         ret = dict()
         for device, df in self.df.iteritems():
-            df = df.set_index((df['epoch'].index.values - df['epoch'].index.values[0])
+            df = df.set_index((df.index.values - df.index.values[0])
                             .astype('timedelta64[s]')
                             .astype(int))
             ret[device] = df
@@ -578,18 +764,20 @@ class DStatAggregate(object):
 
             # rename columns in order to get easier plot labelling
             df.columns = metrics
+            fig = plt.figure(figsize=self.CLEAN_FIGSIZE)
+            ax = fig.gca()
+            df = decimate(df, point_budget(fig.get_figwidth()))
 
             if len(metrics) == 1:
                 ax = df.plot.area(
+                    ax=ax,
                     stacked=False,
                     alpha=1.0,
-                    figsize=(25.9, 3.7),
                     linewidth=4,
                     fontsize=30,
                     color=self.COLORS[1],
                     clip_on=True)
             else:
-                ax = plt.gca()
                 # met is the reversed list of metrics - print the Total in background then the rest on it
                 # i preserves the original metrics indexing - needed for style purposes
                 for i, met in reversed(list(enumerate(metrics))):
@@ -598,7 +786,6 @@ class DStatAggregate(object):
                         y=met,
                         ax=ax,
                         colors=self.COLORS[i],
-                        figsize=(25.9, 3.7),
                         fontsize=30,
                         alpha=1.0,
                         linewidth=3+i,
@@ -609,27 +796,31 @@ class DStatAggregate(object):
             self._set_layout(ax, plot_title, device, fontsize=30)
 
         else:
+            df = decimate(df, point_budget(), self._plotted_series(df, metrics))
             plt.figure()
             plt.title(plot_title)
 
-            try:
-                plt.plot(df.index, df['avg_' + metrics], 'k', label=metrics + ' avg')
-                plt.fill_between(
-                    df.index,
-                    df['avg_' + metrics] - 2*df['std_' + metrics],
-                    df['avg_' + metrics] + 2*df['std_' + metrics],
-                    color='b',
-                    alpha=0.2)
-            except (IndexError, ZeroDivisionError):
-                plt.plot(df.index, df['sum_' + metrics], 'k', label=metrics + ' sum')
-                save_title += '-sum'
-                # IndexError means we are plotting the cumulative chart for the current metric
-                plt.fill_between(
-                    df.index,
-                    df['sum_' + metrics],
-                    df['sum_' + metrics] + df['cumulative_' + metrics],
-                    color='b',
-                    alpha=0.2)
+            if self.band == 'percentile' and 'p50_' + metrics in df:
+                self._plot_percentiles(df, metrics)
+            else:
+                try:
+                    plt.plot(df.index, df['avg_' + metrics], 'k', label=metrics + ' avg')
+                    plt.fill_between(
+                        df.index,
+                        df['avg_' + metrics] - 2*df['std_' + metrics],
+                        df['avg_' + metrics] + 2*df['std_' + metrics],
+                        color='b',
+                        alpha=0.2)
+                except (IndexError, KeyError, ZeroDivisionError):
+                    plt.plot(df.index, df['sum_' + metrics], 'k', label=metrics + ' sum')
+                    save_title += '-sum'
+                    # IndexError or KeyError means we are plotting the cumulative chart for the current metric
+                    plt.fill_between(
+                        df.index,
+                        df['sum_' + metrics],
+                        df['sum_' + metrics] + df['cumulative_' + metrics],
+                        color='b',
+                        alpha=0.2)
 
             ax = plt.gca()
             self._set_layout(ax, plot_title, device)
@@ -642,6 +833,34 @@ class DStatAggregate(object):
             self.save(save_title, device)
             plt.close()
 
+    @staticmethod
+    def _plotted_series(df, metric):
+        """
+        :param df: aggregated dataframe of a metric (see _plot_together)
+        :param metric: metric name
+        :return: 2d array of the lines and band bounds drawn for the metric, one column each
+        """
+        if 'avg_' + metric in df and 'std_' + metric in df:
+            avg, std = df['avg_' + metric].values, df['std_' + metric].values
+            return np.column_stack([avg, avg - 2 * std, avg + 2 * std])
+        if 'sum_' + metric in df and 'cumulative_' + metric in df:
+            total = df['sum_' + metric].values
+            return np.column_stack([total, total + df['cumulative_' + metric].values])
+        return df.values
+
+    @staticmethod
+    def _plot_percentiles(df, metric):
+        """
+        Percentile band: median line, p95 and p99 lines over the min-max range across nodes
+        :param df: aggregated dataframe holding the metric percentile columns
+        :param metric: metric name
+        """
+        plt.fill_between(df.index, df['min_' + metric], df['max_' + metric], color='b', alpha=0.15,
+                         label=metric + ' min-max')
+        plt.plot(df.index, df['p99_' + metric], 'r:', label=metric + ' p99')
+        plt.plot(df.index, df['p95_' + metric], 'b--', label=metric + ' p95')
+        plt.plot(df.index, df['p50_' + metric], 'k', label=metric + ' p50')
+
     @staticmethod
     def _set_ticks_units(ax, device):
         if device == 'dsk':
@@ -695,41 +914,5 @@ class DStatAggregate(object):
 
         outname = outdir + '/' + save_title + '.png'
         plt.savefig(outname, bbox_inches='tight')
+        self.charts.setdefault(device, []).append(os.path.abspath(outname))
         print outname + ' created'
-
-    @staticmethod
-    def _numpyds64_to_datetime(nptime):
-        ts = (nptime - np.datetime64('1970-01-01T00:00:00Z')) / np.timedelta64(1, 's')
-        return datetime.datetime.utcfromtimestamp(ts)
-
-    def _partition_time(self, df):
-        start = self._numpyds64_to_datetime(df.index.values[0])
-        end = self._numpyds64_to_datetime(df.index.values[-1])
-        while True:
-            print "\n"
-            print "Start observation date time: %s" % str(start)
-            print "End observation date time: %s" % str(end)
-            print "Observation interval request (format: %H:%M:%S , e.g. 00:00:00)"
-            new_start = raw_input("    Select a new starting observation time >> ")
-            new_end = raw_input("    Select a new ending observation time >> ")
-            try:
-                final_start = datetime.datetime.strptime(new_start, '%H:%M:%S')
-                final_start = final_start.replace(year=start.date().year, month=start.date().month, day=start.date().day )
-                final_end = datetime.datetime.strptime(new_end, '%H:%M:%S')
-                final_end = final_end.replace(year=end.date().year, month=end.date().month, day=end.date().day )
-            except ValueError as e:
-                print e.message
-                continue
-            # evaluating correctness of time given
-            if (final_start < start):
-                print "Starting time is not a valid time. Try again."
-                continue
-            elif (final_end > end):
-                print "Ending time is not a valid time. Try again."
-                continue
-            elif (final_start > final_end):
-                print "Ending date is prior starting date. Try again."
-            else:
-                # here is possible to partition and return partitioned dataframe
-                ret = df[(df.index > final_start) & (df.index < final_end)]
-                return ret
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+class DStatAlign(object):
+    """
+    Time grid alignment engine: dstat samples every node at its own sub-second offset, so the nodes epochs hardly
+    ever match. Each node is snapped onto a shared regular grid taking, for each grid point, the nearest sample within
+    a tolerance; the result is one dense (grid x columns) array for each node, NaN only where a node has no sample
+    close enough to the grid point.
+    """
+
+    def __init__(self, freq=10**9, tolerance=None):
+        """
+        :param freq: grid step in nanoseconds
+        :param tolerance: maximum distance in nanoseconds between a grid point and the sample snapped on it,
+                          if None half of the grid step
+        """
+        self.freq = int(freq)
+        self.tolerance = tolerance if tolerance is not None else self.freq // 2
+
+    @staticmethod
+    def timeline(epochs, freq):
+        """
+        :param epochs: list of sorted int64 nanoseconds epoch arrays
+        :param freq: grid step in nanoseconds
+        :return: sorted int64 nanoseconds regular grid from the first to the last epoch, both rounded to the nearest
+                 multiple of freq
+        """
+        first = min(epoch[0] for epoch in epochs if len(epoch))
+        last = max(epoch[-1] for epoch in epochs if len(epoch))
+        first = (first + freq // 2) // freq * freq
+        last = (last + freq // 2) // freq * freq
+        return np.arange(first, last + 1, freq, dtype=np.int64)
+
+    def grid(self, epochs):
+        """
+        :param epochs: list of sorted int64 nanoseconds epoch arrays
+        :return: int64 nanoseconds grid covering every epoch
+        """
+        return self.timeline(epochs, self.freq)
+
+    def snap(self, epoch, grid):
+        """
+        Nearest sample of each grid point
+        :param epoch: sorted int64 nanoseconds epoch array of a node
+        :param grid: int64 nanoseconds grid
+        :return: sample position for each grid point, -1 where no sample is within tolerance
+        """
+        if not len(epoch):
+            return np.full(len(grid), -1, dtype=np.int64)
+        right = np.clip(np.searchsorted(epoch, grid), 0, len(epoch) - 1)
+        left = np.clip(right - 1, 0, len(epoch) - 1)
+        nearest = np.where(np.abs(epoch[left] - grid) <= np.abs(epoch[right] - grid), left, right)
+        nearest[np.abs(epoch[nearest] - grid) > self.tolerance] = -1
+        return nearest
+
+    def align(self, epoch, values, grid):
+        """
+        :param epoch: sorted int64 nanoseconds epoch array of a node
+        :param values: 2d array of the node samples (rows x columns)
+        :param grid: int64 nanoseconds grid
+        :return: dense float64 (grid x columns) array
+        """
+        nearest = self.snap(epoch, grid)
+        found = nearest >= 0
+        ret = np.full((len(grid), values.shape[1]), np.nan)
+        ret[found] = values[nearest[found]]
+        return ret
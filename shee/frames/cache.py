@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from shee.util import select_columns
+
+
+class DStatCache(object):
+    """
+    Sidecar binary cache of a parsed dstat csv file. It is stored next to the csv file as a hidden directory,
+    e.g. .dstat-hadoop-cloud-12.csv.shee/, containing:
+        - meta.json: csv file identity (path, size, mtime, md5), cached column groups, header, all-zero columns,
+        stored columns and dtype blocks layout
+        - index.npy: dataframe index
+        - epoch.npy: epoch column as int64 nanoseconds
+        - <dtype>.npy: one column-major block for each dtype of the remaining columns
+    Every .npy file can be memory mapped.
+    """
+
+    VERSION = 4
+
+    def __init__(self, filename):
+        self.filename = os.path.abspath(filename)
+        dirname, basename = os.path.split(self.filename)
+        self.dirname = os.path.join(dirname, '.' + basename + '.shee')
+        self.meta = None
+
+    def _path(self, name):
+        return os.path.join(self.dirname, name)
+
+    def _md5(self):
+        md5 = hashlib.md5()
+        with open(self.filename, 'rb') as f:
+            while True:
+                block = f.read(1 << 20)
+                if not len(block):
+                    break
+                md5.update(block)
+        return md5.hexdigest()
+
+    def identity(self):
+        """
+        Identity of the csv file the cache is keyed by
+        :return: dict with path, size, mtime and md5 of the csv file
+        """
+        st = os.stat(self.filename)
+        return {
+            'path': self.filename,
+            'size': st.st_size,
+            'mtime': st.st_mtime,
+            'md5': self._md5(),
+        }
+
+    def _read_meta(self):
+        try:
+            with open(self._path('meta.json'), 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def valid(self):
+        """
+        The cache is valid when it has been written by the current version and the csv file is unchanged. A file
+        with the recorded size and mtime is taken as unchanged; the content hash is only computed when the mtime
+        differs (e.g. a copied or touched file), and the new mtime is then recorded if the content matches
+        :return: Boolean
+        """
+        meta = self.meta = self._read_meta()
+        if meta is None or meta.get('version') != self.VERSION:
+            return False
+        key = meta['key']
+        st = os.stat(self.filename)
+        if key['path'] != self.filename or key['size'] != st.st_size:
+            return False
+        if key['mtime'] == st.st_mtime:
+            return True
+        if key['md5'] != self._md5():
+            return False
+        key['mtime'] = st.st_mtime
+        with open(self._path('meta.json'), 'w') as f:
+            json.dump(meta, f)
+        return True
+
+    def covers(self, groups=None):
+        """
+        Check whether the cached column groups cover the requested ones
+        :param groups: requested column groups, None means every column
+        :return: Boolean
+        """
+        cached = self.meta.get('groups')
+        if cached is None:
+            return True
+        return groups is not None and set(groups) <= set(cached)
+
+    def widen(self, groups=None):
+        """
+        :param groups: requested column groups, None means every column
+        :return: union of the cached and the requested column groups
+        """
+        cached = self.meta.get('groups')
+        if cached is None or groups is None:
+            return None
+        return sorted(set(cached) | set(groups))
+
+    def load(self, frame, groups=None, mmap=True, window=None):
+        """
+        Load the cached dataframe into the given frame; blocks are memory mapped, so only the projected columns and
+        the rows inside the window are read. Sets frame df, dropped, header and zeros attributes.
+        :param frame: DStat frame object
+        :param groups: column projection, if None every cached column is loaded
+        :param mmap: Boolean, if True the .npy blocks are memory mapped
+        :param window: DStat window object, if None every row is loaded
+        """
+        meta = self.meta if self.meta is not None else self._read_meta()
+        mode = 'r' if mmap else None
+        columns = [tuple(str(c) for c in col) for col in meta['columns']]
+        header = [tuple(str(c) for c in col) for col in meta['header']]
+        header = [header[pos] for pos in select_columns(header, groups)]
+        keep = set(header)
+        positions = [pos for pos, col in enumerate(columns) if col in keep]
+        selected = set(positions)
+
+        epoch = np.load(self._path('epoch.npy'), mmap_mode=mode)
+        rows = slice(*window.select(epoch)) if window is not None else slice(None)
+        data = {meta['epoch']: np.asarray(epoch[rows]).view('datetime64[ns]')}
+        for dtype, block_positions in meta['blocks'].iteritems():
+            if not selected.intersection(block_positions):
+                continue
+            block = np.load(self._path(dtype + '.npy'), mmap_mode=mode)
+            for idx, pos in enumerate(block_positions):
+                if pos in selected:
+                    data[pos] = block[rows, idx]
+
+        index = np.load(self._path('index.npy'), mmap_mode=mode)
+        df = pd.DataFrame(data, index=np.asarray(index[rows]), columns=positions)
+        df.columns = pd.MultiIndex.from_tuples([columns[pos] for pos in positions])
+
+        frame.df = df
+        frame.dropped = meta['dropped']
+        frame.header = header
+        frame.zeros = [tuple(str(c) for c in col) for col in meta['zeros'] if tuple(str(c) for c in col) in keep]
+
+    def save(self, frame, groups=None, key=None):
+        """
+        Store the parsed dataframe of the given frame; meta.json is written last and marks the cache as complete
+        :param frame: DStat frame object, holding the dataframe with the datetime epoch column
+        :param groups: column groups held by the frame, None means every column
+        :param key: identity of the csv file taken before it was parsed (see identity), the current one if None
+        """
+        if os.path.exists(self.dirname):
+            shutil.rmtree(self.dirname)
+        os.makedirs(self.dirname)
+
+        df = frame.df
+        epoch = None
+        blocks = {}
+        for pos, col in enumerate(df.columns.values):
+            if col == ('epoch', 'epoch'):
+                epoch = pos
+            else:
+                blocks.setdefault(str(df.dtypes.iloc[pos]), []).append(pos)
+
+        np.save(self._path('index.npy'), np.asarray(df.index.values))
+        np.save(self._path('epoch.npy'), df.iloc[:, epoch].values.astype('datetime64[ns]').view('i8'))
+        for dtype, positions in blocks.iteritems():
+            np.save(self._path(dtype + '.npy'), np.asfortranarray(df.iloc[:, positions].values))
+
+        meta = {
+            'version': self.VERSION,
+            'key': key if key is not None else self.identity(),
+            'groups': groups,
+            'header': [list(col) for col in frame.header],
+            'zeros': [list(col) for col in frame.zeros],
+            'columns': [list(col) for col in df.columns.values],
+            'epoch': epoch,
+            'blocks': blocks,
+            'dropped': frame.dropped,
+        }
+        with open(self._path('meta.json'), 'w') as f:
+            json.dump(meta, f)
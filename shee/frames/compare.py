@@ -9,18 +9,20 @@ import matplotlib.dates as mdates
 
 
 class DStatCompare(DStatFrame):
-    def __init__(self, filename, columns, frame=None, grain=False):
+    def __init__(self, filename, columns, frame=None, window=None):
         if frame is not None:
             self.df = frame.df
             self.device = frame.device
+            self.header = frame.header
+            self.zeros = frame.zeros
             self._set_name(columns)
         else:
-            super(DStatCompare, self).__init__(filename, columns)
+            super(DStatCompare, self).__init__(filename, columns, window=window)
         sname = get_result_dir_name(filename)  # complete path will ends with the name of the csv file
         # setting file name: directory: comparison, filename from columns names
         self.filename = sname + '/comparison/' + sname.split("/")[-1]
         self.device = 'comparison'
-        df = self._read_dataframe(['epoch'] + columns, grain=grain)
+        df = self._read_dataframe(['epoch'] + columns)
         df.columns = df.columns.droplevel()
         self.df = self._convert(df, ['epoch', 'usr', 'sys', 'idl', 'hiq', 'siq'], columns)
 
@@ -1,7 +1,12 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import numpy as np
+import pandas as pd
+
 from frame import DStatFrame
+from frame import DStatReadColumnsException
+from schema import DStatSchema
 from shee.util import get_result_dir_name
 
 import matplotlib.pyplot as plt
@@ -10,29 +15,92 @@ import matplotlib.dates as mdates
 
 class DStatCpu(DStatFrame):
 
-    def __init__(self, filename, frame=None, cpu=None, grain=False):
+    def __init__(self, filename, frame=None, cpu=None, window=None, cores=None):
+        """
+        :param cpu: core number, if given the frame holds that core usage, otherwise the total one
+        :param cores: list of core numbers, if given the usage of every core is kept in the heat array (metric x core
+                      x time) drawn by plot_heatmap, while the frame holds the epoch column only
+        """
+        self.cores, self.metrics, self.heat = None, None, None
         if frame is not None:
             self.df = frame.df
             self.device = frame.device
+            self.header = frame.header
+            self.zeros = frame.zeros
             self._set_name('cpu')
         else:
-            super(DStatCpu, self).__init__(filename, 'cpu')
+            super(DStatCpu, self).__init__(filename, 'cpu', window=window)
         sname = get_result_dir_name(filename)
-        if cpu is not None:
+        if cores is not None:
+            self.filename = sname + '/cpu/' + sname.split("/")[-1]
+            df = self._read_dataframe(['epoch'] + [DStatSchema.group('cpu', n) for n in cores])
+            self._set_heat(df, list(cores))
+            df = df.iloc[:, :1]
+        elif cpu is not None:
             self.filename = sname + '/cpu/cpu' + str(cpu) + '/' + sname.split("/")[-1]
-            df = self._read_dataframe(['epoch', 'cpu' + str(cpu) + ' usage'], grain=grain)
+            df = self._read_dataframe(['epoch', DStatSchema.group('cpu', cpu)])
             self.device = cpu
         else:
             self.filename = sname + '/cpu/' + sname.split("/")[-1]
-            df = self._read_dataframe(['epoch', 'total cpu usage'], grain=grain)
+            df = self._read_dataframe(['epoch', 'total cpu usage'])
         df.columns = df.columns.droplevel()
         self.df = df
 
     def plot_all(self):
         pass
 
+    def _set_heat(self, df, cores):
+        """
+        Turns the cores usage columns into one contiguous (metric x core x time) float32 array
+        :param df: dataframe holding the epoch column and the usage groups of the cores, in the cores order
+        :param cores: list of core numbers
+        """
+        groups = [DStatSchema.group('cpu', n) for n in cores]
+        self.metrics = [metric for group, metric in df.columns.values[1:] if group == groups[0]]
+        if list(df.columns.values[1:]) != [(group, metric) for group in groups for metric in self.metrics]:
+            raise DStatReadColumnsException('cores usage groups with different metrics')
+        values = df.iloc[:, 1:].values.astype(np.float32).reshape(len(df.index), len(cores), len(self.metrics))
+        self.heat = np.ascontiguousarray(values.transpose(2, 1, 0))
+        self.cores = cores
+
+    def plot_heatmap(self, plot=False):
+        """
+        One core x time heatmap for each metric, each drawn by a single imshow call
+        :param plot: if True charts are shown, otherwise saved
+        """
+        epoch = pd.to_datetime(self.df['epoch'])
+        start, end = mdates.date2num(epoch.iloc[0].to_pydatetime()), mdates.date2num(epoch.iloc[-1].to_pydatetime())
+        step = max(1, len(self.cores) // 16)  # at most 16 cores labelled
+
+        for pos, metric in enumerate(self.metrics):
+            fig, ax = plt.subplots(figsize=(12, min(max(3, 0.2 * len(self.cores)), 20)))
+            image = ax.imshow(self.heat[pos], aspect='auto', interpolation='nearest', cmap='YlOrRd', vmin=0,
+                              vmax=100, extent=[start, end, len(self.cores) - 0.5, -0.5])
+            ax.set_title('Cores Usage: ' + metric)
+            ax.set_yticks(range(0, len(self.cores), step))
+            ax.set_yticklabels(['cpu' + str(n) for n in self.cores[::step]])
+            ax.set_ylabel('core')
+            ax.set_xlabel('time')
+            ax.xaxis_date()
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+            fig.colorbar(image, ax=ax).set_label('percentage')
+
+            if plot:
+                plt.show()
+            else:
+                self.save('cores-' + metric + '-heatmap', fig=fig)
+                plt.close(fig)
+
     def subplot_all(self, plot=False):
-        plot_title, save_title = self._get_titles()
+        save_title = self._get_titles()[1]
+        self._render_template('subplots', self._subplots, save_title, plot=plot)
+
+    def _subplots(self):
+        """
+        Draws one subplot for each metric on a new figure
+        :return: figure
+        """
+        plot_title = self._get_titles()[0]
 
         # row and column sharing
         fig, ((ax1, ax2, ax3), (ax4, ax5, ax6)) = plt.subplots(2, 3, sharex=True, sharey=True)
@@ -62,11 +130,7 @@ class DStatCpu(DStatFrame):
         self._rotating_xticks_and_grid([ax1, ax2, ax3, ax4, ax5, ax6])
 
         plt.tight_layout(pad=1, w_pad=1, h_pad=1)
-        if plot:
-            plt.show()
-        else:
-            self.save(save_title + "subplots")
-            plt.close()
+        return fig
 
     @staticmethod
     def _rotating_xticks_and_grid(axs):
@@ -77,7 +141,8 @@ class DStatCpu(DStatFrame):
 
     def _set_subplots_title_and_plot(self, ax, xlab, ylab):
         ax.set_title(ylab)
-        ax.plot(self.df[xlab], self.df[ylab])
+        df = self._decimated([ylab])
+        ax.plot(df[xlab], df[ylab])
 
     @staticmethod
     def _set_subplots_time(ax, hours, mins):
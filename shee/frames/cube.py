@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+from frame import DStatException
+
+
+class DStatCubeColumnsException(DStatException):
+    """
+    Raised when the node blocks of a cube hold different columns
+    """
+    pass
+
+
+class DStatCube(object):
+    """
+    Dense cluster cube: one contiguous float64 array with named axes
+        - time: datetime64 grid
+        - node: nodes names
+        - metric: (group, metric) column tuples, grouped by column group
+    Cross-node statistics are single reductions along the node axis and group views are basic slices, so no copy is
+    made until a dataframe is built.
+    """
+
+    def __init__(self, data, time, nodes, metrics):
+        """
+        :param data: (time x node x metric) array
+        :param time: datetime64 array
+        :param nodes: list of nodes names
+        :param metrics: list of (group, metric) column tuples
+        """
+        self.data = data
+        self.time = time
+        self.nodes = list(nodes)
+        self.metrics = list(metrics)
+
+    @classmethod
+    def from_blocks(cls, time, nodes, columns, blocks):
+        """
+        :param time: datetime64 grid the blocks are aligned onto
+        :param nodes: list of nodes names
+        :param columns: list of (group, metric) column tuples of each block
+        :param blocks: list of dense (time x columns) arrays, one for each node
+        :return: DStat cube object, metrics ordered as the first node columns
+        """
+        metrics = list(columns[0]) if len(columns) else []
+        for name, cols in zip(nodes, columns):
+            if set(cols) != set(metrics) or len(cols) != len(metrics):
+                raise DStatCubeColumnsException('Columns of %s differ from %s: %s' % (
+                    name, nodes[0], str(sorted(set(cols) ^ set(metrics)) or 'repeated columns')))
+        data = np.empty((len(time), len(nodes), len(metrics)))
+        for node, (cols, block) in enumerate(zip(columns, blocks)):
+            data[:, node, :] = block[:, [list(cols).index(col) for col in metrics]]
+        return cls(data, time, nodes, metrics)
+
+    def group(self, group):
+        """
+        :param group: first level column name, e.g. 'net/total'
+        :return: slice of the group metrics along the metric axis
+        """
+        positions = [pos for pos, col in enumerate(self.metrics) if col[0] == group]
+        if not len(positions):
+            return slice(0, 0)
+        return slice(positions[0], positions[-1] + 1)
+
+    def view(self, group):
+        """
+        :param group: first level column name
+        :return: (time x node x group metric) view of the cube
+        """
+        return self.data[:, :, self.group(group)]
+
+    def window(self, start, end):
+        """
+        :param start: first datetime kept
+        :param end: last datetime kept
+        :return: DStat cube object sharing the data of the time range
+        """
+        first = np.searchsorted(self.time, np.datetime64(start), side='left')
+        last = np.searchsorted(self.time, np.datetime64(end), side='right')
+        return DStatCube(self.data[first:last], self.time[first:last], self.nodes, self.metrics)
+
+    def mean(self, group):
+        """ Cross-node average of the group metrics: (time x group metric) array """
+        return np.nanmean(self.view(group), axis=1)
+
+    def std(self, group):
+        """ Cross-node sample standard deviation (ddof 1, as pandas) of the group metrics """
+        return np.nanstd(self.view(group), axis=1, ddof=1)
+
+    def sum(self, group):
+        """ Cross-node sum of the group metrics """
+        return np.nansum(self.view(group), axis=1)
+
+    def percentiles(self, group, qs):
+        """
+        Cross-node percentiles of the group metrics, linearly interpolated as numpy.percentile and skipping NaN. The
+        node axis is sorted once (NaN last) and every percentile is gathered from the sorted cube, so no per-row
+        python is run whatever the number of nodes.
+        :param group: first level column name
+        :param qs: list of percentiles (0-100), 0 and 100 give min and max
+        :return: list of (time x group metric) arrays, one for each percentile
+        """
+        view = np.sort(self.view(group), axis=1)
+        count = np.sum(~np.isnan(view), axis=1)
+        times = np.arange(view.shape[0])[:, np.newaxis]
+        metrics = np.arange(view.shape[2])[np.newaxis, :]
+
+        ret = []
+        for q in qs:
+            rank = q / 100.0 * np.maximum(count - 1, 0)
+            low = np.floor(rank).astype(np.int64)
+            high = np.ceil(rank).astype(np.int64)
+            values = view[times, low, metrics]
+            values = values + (view[times, high, metrics] - values) * (rank - low)
+            values[count == 0] = np.nan
+            ret.append(values)
+        return ret
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 from frame import DStatFrame
+from schema import DStatSchema
 from shee.util import get_result_dir_name
 
 import matplotlib.pyplot as plt
@@ -11,28 +12,38 @@ import matplotlib.ticker as tick
 
 class DStatDisk(DStatFrame):
 
-    def __init__(self, filename, frame=None, disk=None, grain=False):
+    def __init__(self, filename, frame=None, disk=None, window=None):
         if frame is not None:
             self.df = frame.df
             self.device = frame.device
+            self.header = frame.header
+            self.zeros = frame.zeros
             self._set_name('disk')
         else:
-            super(DStatDisk, self).__init__(filename, 'disk')
+            super(DStatDisk, self).__init__(filename, 'disk', window=window)
         sname = get_result_dir_name(filename)
         if disk is not None:
-            self.filename = sname + '/disk/sd' + disk + '/' + sname.split("/")[-1]
-            df = self._read_dataframe(['epoch', 'dsk/sd' + disk], grain=grain)
+            self.filename = sname + '/disk/' + disk + '/' + sname.split("/")[-1]
+            df = self._read_dataframe(['epoch', DStatSchema.group('disk', disk)])
             self.device = disk
         else:
             self.filename = sname + '/disk/' + sname.split("/")[-1]
-            df = self._read_dataframe(['epoch', 'dsk/total'], grain=grain)
+            df = self._read_dataframe(['epoch', 'dsk/total'])
 
         df.columns = df.columns.droplevel()
         df.ix[:, df.columns != 'epoch'] = df.ix[:, df.columns != 'epoch'].divide(1024*1024)
         self.df = df
 
     def subplot_all(self, plot=False):
-        plot_title, save_title = self._get_titles()
+        save_title = self._get_titles()[1]
+        self._render_template('subplots', self._subplots, save_title, plot=plot)
+
+    def _subplots(self):
+        """
+        Draws one subplot for each metric on a new figure
+        :return: figure
+        """
+        plot_title = self._get_titles()[0]
 
         # row and column sharing
         fig, (ax1, ax2) = plt.subplots(2, 1, sharex=True)
@@ -56,15 +67,12 @@ class DStatDisk(DStatFrame):
         self._rotating_xticks_and_grid([ax1, ax2])
 
         plt.tight_layout(pad=1, w_pad=1, h_pad=1)
-        if plot:
-            plt.show()
-        else:
-            self.save(save_title + "subplots")
-            plt.close()
+        return fig
 
     def _set_subplots_title_and_plot(self, ax, xlab, ylab):
         ax.set_title(ylab)
-        ax.plot(self.df[xlab], self.df[ylab])
+        df = self._decimated([ylab])
+        ax.plot(df[xlab], df[ylab])
 
     @staticmethod
     def _rotating_xticks_and_grid(axs):
@@ -1,15 +1,24 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import io
 import re
 import csv
 
-import datetime
-
+import numpy as np
 import pandas as pd
 
 import matplotlib.pyplot as plt
 import matplotlib.ticker as tick
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from cache import DStatCache
+from index import DStatIndex
+from schema import DStatSchema
+from shee.util import select_columns
+from shee.util import point_budget
+from shee.util import decimate
+
 
 class DStatException(Exception):
 
@@ -50,12 +59,51 @@ class DStatReadColumnsException(DStatException):
 
 class DStatFrame(object):
 
-    def __init__(self, filename, name):
+    # subplots figures reused by the frames of the same chart type in this process (see _render_template)
+    TEMPLATES = {}
+    # rows reduction applied before plotting, 'minmax' or 'lttb' (see shee.util.decimate)
+    DECIMATION = 'minmax'
+    # groups of bounded percentages and ratios, parsed as float32 (see _dtype)
+    FLOAT32_GROUPS = re.compile(r'^(total cpu usage|cpu\d+ usage|load avg)$')
+
+    def __init__(self, filename, name, cache=True, groups=None, window=None):
+        """
+        :param filename: dstat csv file
+        :param name: frame name
+        :param cache: Boolean, if True the parsed dataframe is loaded from (or stored into) the sidecar cache
+        :param groups: column projection - list of first level column names to load (see select_columns),
+                       if None every column is loaded
+        :param window: DStat window object (see DStatWindow), only the rows inside it are kept: cached files are
+                       read from the memory mapped blocks, other files are sought through their time index (see
+                       DStatIndex) and only the byte range of the window is parsed
+        """
+        self.filename = ''
+        self.device = None
+        self._set_name(name)
+
+        parse_groups = groups
+        store = DStatCache(filename) if cache else None
+        if store is not None and store.valid():
+            if store.covers(groups):
+                store.load(self, groups=groups, window=window)
+                return
+            # the cached projection is too narrow, it will be widened with the requested groups
+            parse_groups = store.widen(groups)
+
+        index, span, build = None, None, None
+        if window is not None:
+            # a partial parse is never cached, the index is only kept in memory without the cache
+            index = DStatIndex(filename, persist=cache).update()
+            span = index.span(*window.bounds(index.first())) if index.first() is not None else None
+            store, parse_groups = None, groups
+        elif store is not None:
+            # later time window queries will seek through the index, built from the rows the parse reads
+            build = DStatIndex(filename)
+
+        # taken before parsing: rows appended meanwhile leave the cache keyed to an older file, so it is never reused
+        key = store.identity() if store is not None else None
         try:
-            self.df = self._open_csv(filename)
-            self.filename = ''
-            self.device = None
-            self._set_name(name)
+            self.df = self._open_csv(filename, groups=parse_groups, span=span, index=build)
         except Exception as e:
             raise DStatOpenCsvException(str(type(e)) + ': ' + e.message)
         try:
@@ -67,6 +115,77 @@ class DStatFrame(object):
             self._fix_columns()
         except Exception as e:
             raise DStatFixColumnsException(str(type(e)) + ': ' + e.message)
+        self._drop_zeros()
+
+        if store is not None:
+            try:
+                store.save(self, groups=parse_groups, key=key)
+            except (IOError, OSError) as e:
+                print "Unable to cache %s: %s" % (filename, str(e))
+
+        if parse_groups != groups:
+            self._project(groups)
+        if window is not None:
+            self._select_window(window, index.first())
+
+    @classmethod
+    def from_dataframe(cls, df, name):
+        """
+        Builds a frame from an already parsed dataframe (e.g. a downsampled stream), no csv file is read
+        :param df: dataframe with two levels columns, the first one being the datetime epoch column
+        :param name: frame name
+        :return: DStat frame object
+        """
+        frame = cls.__new__(cls)
+        frame.filename = ''
+        frame.device = None
+        frame._set_name(name)
+        frame.df = df
+        frame.dropped = 0
+        frame._drop_zeros()
+        return frame
+
+    def to_arrays(self, groups):
+        """
+        Compact representation of the given column groups, e.g. to transfer them between processes
+        :param groups: list of first level column names
+        :return: tuple (columns, int64 nanoseconds epoch, list of (positions, 2d values) blocks, one for each dtype)
+        """
+        df = self._read_dataframe(['epoch'] + list(groups))
+        columns = list(df.columns.values)
+        epoch = df.iloc[:, 0].values.astype('datetime64[ns]').view('i8')
+        blocks = {}
+        for pos in range(1, len(columns)):
+            blocks.setdefault(str(df.dtypes.iloc[pos]), []).append(pos)
+        return columns, epoch, [(positions, df.iloc[:, positions].values) for positions in blocks.values()]
+
+    @classmethod
+    def from_arrays(cls, arrays, name):
+        """
+        Builds a frame from its compact representation (see to_arrays)
+        :param arrays: tuple (columns, int64 nanoseconds epoch, list of (positions, 2d values) blocks)
+        :param name: frame name
+        :return: DStat frame object
+        """
+        columns, epoch, blocks = arrays
+        data = {0: epoch.view('datetime64[ns]')}
+        for positions, values in blocks:
+            for idx, pos in enumerate(positions):
+                data[pos] = values[:, idx]
+        df = pd.DataFrame(data, columns=range(len(columns)))
+        df.columns = pd.MultiIndex.from_tuples(columns)
+        return cls.from_dataframe(df, name)
+
+    @property
+    def schema(self):
+        """
+        Schema index of the loaded columns (see DStatSchema), built once for each header
+        :return: DStat schema object
+        """
+        schema = self.__dict__.get('_schema')
+        if schema is None or schema.header is not self.header:
+            schema = self._schema = DStatSchema(self.header)
+        return schema
 
     def _set_name(self, name):
         if isinstance(name, list):  # comparison object construction
@@ -84,71 +203,205 @@ class DStatFrame(object):
     def __eq__(self, other):
         return self.df.equals(other)
 
-    def _open_csv(self, filename):
-        header, to_skip = self._check_csv(filename)
-        df = pd.read_csv(
-            filepath_or_buffer=filename,
-            sep=",",
-            skiprows=to_skip,
-            header=header,
-            error_bad_lines=False,
-            warn_bad_lines=False,
-        )
-        # df.columns = pd.MultiIndex.from_tuples(self._compute_default_cols())
+    def _open_csv(self, filename, groups=None, span=None, index=None):
+        """
+        Single pass ingestion of a dstat csv file:
+            - the preamble is scanned until the two header rows (the ones starting with "epoch") are found
+            - the remaining rows are parsed at once by the pandas C parser; dstat quotes every non numeric field,
+            so repeated preambles and headers (appended experiments) are dropped as comment lines
+        Only the columns selected by groups are parsed and held in memory.
+        The number of data rows rejected by the parser or truncated is stored in self.dropped; the preamble, the
+        headers and the lines before the first header are not rows
+        :param filename: dstat csv file
+        :param groups: column projection, if None every column is parsed
+        :param span: byte range (begin, stop) of the rows to parse (see DStatIndex.span), if None every row is parsed
+        :param index: DStat index object built and stored from the rows counted after the parse, None for no index;
+                      only for a parse of every row
+        :return: dataframe with two levels columns
+        """
+        with open(filename, 'rb') as csvfile:
+            print filename
+            header = self._read_header(csvfile)
+            positions = select_columns(header, groups)
+            if index is not None:
+                index.begin()
+
+            stop = None
+            if span is not None:
+                begin, stop = span
+                csvfile.seek(begin)
+            start = csvfile.tell()
+
+            if (stop is not None and stop <= start) or not len(csvfile.read(1)):
+                # no row, e.g. a window outside the file: the parser would fail on an empty input
+                csvfile.seek(start)
+                df = pd.DataFrame(dict((pos, np.zeros(0, dtype=self._dtype(header[pos]))) for pos in positions),
+                                  columns=positions)
+            else:
+                csvfile.seek(start)
+                # the rows are streamed from the file to the parser, only a bounded window is held as a whole
+                df = pd.read_csv(
+                    io.BytesIO(csvfile.read(stop - start)) if stop is not None else csvfile,
+                    sep=',',
+                    header=None,
+                    names=range(len(header)),
+                    usecols=positions,
+                    dtype=dict((pos, self._dtype(header[pos])) for pos in positions),
+                    comment='"',
+                    quoting=csv.QUOTE_NONE,
+                    error_bad_lines=False,
+                    warn_bad_lines=False,
+                )
+            # lines are counted up to where the parser stopped, rows appended meanwhile are neither parsed nor counted
+            end = csvfile.tell()
+            csvfile.seek(start)
+            rows = self._count_rows(csvfile, end - start, index=index)
+            if index is not None:
+                index.end()
+        # truncated rows (e.g. a file still being written) are filled with NaN by the parser; the frame is only copied
+        # when there are rows to drop
+        truncated = np.zeros(len(df.index), dtype=bool)
+        for pos in range(len(df.columns)):
+            truncated |= np.isnan(df.iloc[:, pos].values)
+        if truncated.any():
+            df = df[~truncated]
+        df.columns = pd.MultiIndex.from_tuples([header[pos] for pos in positions])
+
+        self.dropped = rows - len(df.index)
+        if self.dropped:
+            print "%d lines dropped" % self.dropped
         return df
 
     def _drop_oversampled(self):
-        self.df = self.df.drop_duplicates(subset=('epoch','epoch'), keep='first')
+        """
+        Drops the rows whose epoch is not after every previous one: oversampled (repeated) epochs, adjacent or not,
+        and samples taken after the clock went back, so epochs are strictly increasing as DStatStream does
+        """
+        epoch = self.df.iloc[:, 0].values.astype('datetime64[ns]').view('i8')
+        keep = self._monotonic(epoch)
+        if not keep.all():
+            self.df = self.df[keep]
 
     @staticmethod
-    def _get_iter(iterr):
-        ret = None
-        for x in iterr:
-            try:
-                ret = x[0]
-            except IndexError:
-                ret = ''
-            break
-        if ret is None:
-            raise StopIteration
-        return ret if ret is not None else ''
-
-    def _check_csv(self, filename):
-        with open(filename, 'rb') as csvfile:
-            print filename
-            ok, skip = self._parse_raw(csvfile)
-            csvfile.close()
-        return ok, skip
+    def _monotonic(epoch, last=None):
+        """
+        :param epoch: int64 nanoseconds epoch array
+        :param last: latest epoch kept before this array, None if there is none
+        :return: boolean mask of the rows whose epoch is greater than any previous one
+        """
+        keep = np.ones(len(epoch), dtype=bool)
+        if not len(epoch):
+            return keep
+        previous = np.maximum.accumulate(epoch[:-1])
+        keep[1:] = epoch[1:] > previous
+        if last is not None:
+            keep &= epoch > last
+        return keep
 
-    def _parse_raw(self, csvfile):
+    @staticmethod
+    def _dtype(column):
         """
-        Two index identifiers are needed due to pandas.csv_read method
-        f_idx points to rows that set columns
-        idx points to line to be skipped
-        pandas.read_csv method get a two steps parsing, first skip lines and then analyze file
+        Dtype plan: cpu percentages and load averages (FLOAT32_GROUPS) are bounded and need no more than the 7
+        significant digits of float32, which halves the bulk of the frame - the per-core columns. The epoch
+        (milliseconds precision) and the counters (bytes, packets, pages, interrupts) are kept exact as float64:
+        float32 integers are exact up to 2^24 only, i.e. 16 MB.
+        :param column: (group, metric) column tuple
+        :return: numpy dtype
+        """
+        if DStatFrame.FLOAT32_GROUPS.match(column[0]) is not None:
+            return np.float32
+        return np.float64
+
+    def _drop_zeros(self):
+        """
+        Drops all-zero columns (e.g. most of the per-core hiq and siq columns); self.header keeps every loaded column
+        and self.zeros the dropped ones, which are restored on demand by _read_dataframe
+        """
+        self.header = list(self.df.columns.values)
+        keep = [0]
+        self.zeros = []
+        nonzero = [self.df.iloc[:, pos].values.any() for pos in range(1, len(self.header))]
+        for pos, col in enumerate(self.header[1:]):
+            if nonzero[pos]:
+                keep.append(pos + 1)
+            else:
+                self.zeros.append(col)
+        if len(self.zeros):
+            self.df = self.df.iloc[:, keep]
+
+    def _select_window(self, window, first=None):
+        """
+        Keeps the rows inside the window
+        :param window: DStat window object
+        :param first: epoch runtime offsets refer to, if None the first row epoch
+        """
+        lo, hi = window.select(self.df.iloc[:, 0].values.astype('datetime64[ns]').view('i8'), first=first)
+        self.df = self.df.iloc[lo:hi]
+
+    def _project(self, groups):
+        """
+        Restricts the frame to the given column groups
+        :param groups: column projection, if None every column is kept
+        """
+        self.header = [self.header[pos] for pos in select_columns(self.header, groups)]
+        keep = set(self.header)
+        self.zeros = [col for col in self.zeros if col in keep]
+        self.df = self.df.iloc[:, [pos for pos, col in enumerate(self.df.columns.values) if col in keep]]
+
+    @staticmethod
+    def _count_rows(csvfile, size, block=1 << 20, index=None):
+        """
+        Counts the data rows from the file cursor on - non empty lines not starting with a quote, i.e. neither a
+        preamble nor a header line - a last line without newline included, reading one block at a time
+        :param csvfile: opened dstat csv file, the cursor at the start of a line
+        :param size: number of bytes to scan
+        :param block: read size in bytes
+        :param index: DStat index object the complete rows are fed to (see DStatIndex.feed), None for no index
+        :return: int
+        """
+        rows, partial, offset = 0, '', csvfile.tell()
+        while size > 0:
+            data = csvfile.read(min(block, size))
+            if not len(data):
+                break
+            size -= len(data)
+            lines = (partial + data).split('\n')
+            partial = lines.pop()
+            if index is None:
+                rows += sum(1 for line in lines if len(line.strip()) and not line.startswith('"'))
+                continue
+            for line in lines:
+                if len(line.strip()) and not line.startswith('"'):
+                    rows += 1
+                    index.feed(offset, line)
+                offset += len(line) + 1
+        return rows + 1 if len(partial.strip()) and not partial.startswith('"') else rows
+
+    @staticmethod
+    def _read_header(csvfile):
+        """
+        Moves the file cursor right after the dstat header rows, e.g.
+            "epoch","total cpu usage",,,,,,"cpu1 usage",,,,,,...
+            "epoch","usr","sys","idl","wai","hiq","siq","usr",...
+        Empty first level values are filled with the previous group name.
+        :param csvfile: opened dstat csv file
+        :return: list of column tuples
         """
-        raw = csv.reader(csvfile, delimiter=',')
-        header = []
-        skip = []
-        idx = 0
-        f_idx = 0
         while True:
-            try:
-                value = self._get_iter(raw)  # the iterator compute next line
-                idx += 1
-                f_idx += 1
-                if value == 'epoch' and not len(header):
-                    # header is provided
-                    header = [f_idx - 1, f_idx]
-                    next(raw)
-                    idx += 1
-                    f_idx += 1
-                    continue
-                elif not len(value) or re.match('^[0-9\.]+$', value) is None:
-                    skip.append(idx-1)
-                    f_idx -= 1
-            except StopIteration:
-                return header, skip
+            line = csvfile.readline()
+            if not len(line):
+                raise ValueError('dstat header not found')
+            if line.startswith('"epoch"'):
+                break
+
+        groups, metrics = csv.reader([line, csvfile.readline()])
+        header = []
+        group = ''
+        for idx, metric in enumerate(metrics):
+            if idx < len(groups) and len(groups[idx]):
+                group = groups[idx]
+            header.append((group, metric))
+        return header
 
     @staticmethod
     def _compute_default_cols():
@@ -186,48 +439,24 @@ class DStatFrame(object):
     def set_df(self, other):
         self.df = other
 
-    def _read_dataframe(self, columns, grain):
-        try:
-            df = self.df[columns]
-        except KeyError as e:
-            raise DStatReadColumnsException(e.message)
-        if grain:
-            df = self._partition_time(df)
+    def _read_dataframe(self, columns):
+        """
+        Selects the given column groups, restoring the all-zero columns dropped at parse time
+        :param columns: list of first level column names
+        :return: dataframe
+        """
+        selected = []
+        for group in columns:
+            positions = self.schema.positions(group)
+            if not len(positions):
+                raise DStatReadColumnsException(group)
+            selected.extend(self.header[pos] for pos in positions)
+        if len(self.zeros):
+            df = self.df.reindex(columns=pd.MultiIndex.from_tuples(selected), fill_value=0)
+        else:
+            df = self.df[selected]
         return df
 
-    @staticmethod
-    def _partition_time(df):
-        start = df['epoch'].iloc[0][0]
-        end = df['epoch'].iloc[-1][0]
-        while True:
-            print "\n"
-            print "Start observation date time: %s" % str(start)
-            print "End observation date time: %s" % str(end)
-            print "Observation interval request (format: %H:%M:%S , e.g. 00:00:00)"
-            new_start = raw_input("    Select a new starting observation time >> ")
-            new_end = raw_input("    Select a new ending observation time >> ")
-            try:
-                final_start = datetime.datetime.strptime(new_start, '%H:%M:%S')
-                final_start = final_start.replace(year=start.date().year, month=start.date().month, day=start.date().day )
-                final_end = datetime.datetime.strptime(new_end, '%H:%M:%S')
-                final_end = final_end.replace(year=end.date().year, month=end.date().month, day=end.date().day )
-            except ValueError as e:
-                print e.message
-                continue
-            # evaluating correctness of time given
-            if (final_start < start):
-                print "Starting time is not a valid time. Try again."
-                continue
-            elif (final_end > end):
-                print "Ending time is not a valid time. Try again."
-                continue
-            elif (final_start > final_end):
-                print "Ending date is prior starting date. Try again."
-            else:
-                # here is possible to partition and return partitioned dataframe
-                ret = df[(df.epoch.epoch > final_start) & (df.epoch.epoch < final_end)]
-                return ret
-
     def _to_datetime(self):
         """
         Method converting unix timestamp Series column to datetime column UTC+1
@@ -258,11 +487,52 @@ class DStatFrame(object):
 
         self.df.rename(columns=new_cols, inplace=True)
 
-    def save(self, suffix):
+    def save(self, suffix, fig=None):
         outname = self.filename + '-' + suffix + '.png'
-        plt.savefig(outname, bbox_inches='tight')
+        (fig if fig is not None else plt).savefig(outname, bbox_inches='tight')
         print outname + ' created'
 
+    def _render_template(self, chart, build, save_title, plot=False):
+        """
+        Draws a chart on its template figure: the figure is built once for each chart type, axes, locators, labels
+        and layout included, afterwards only the lines data, the axes limits and the labels naming the device are
+        updated before saving. Each subplot is titled after the column its lines draw (see _set_subplots_title_and_plot)
+        :param chart: chart name, e.g. subplots
+        :param build: method drawing the chart of this frame on a new pyplot figure and returning the figure
+        :param save_title: chart file name prefix (see _get_titles)
+        :param plot: if True the chart is drawn on a new figure and shown
+        """
+        plot_title = self._get_titles()[0]
+        if plot:
+            build()
+            plt.show()
+            return
+
+        key = (type(self).__name__, chart)
+        template = self.TEMPLATES.get(key)
+        if template is None:
+            fig = build()
+            # detached from pyplot, so it outlives plt.close calls and any interactive backend
+            plt.close(fig)
+            FigureCanvasAgg(fig)
+            template = self.TEMPLATES[key] = {
+                'fig': fig,
+                'title': plot_title,
+                'axes': fig.get_axes(),
+                'lines': [(line, ax.get_title()) for ax in fig.get_axes() for line in ax.get_lines()],
+                'labels': [(ax.yaxis.label, ax.get_ylabel()) for ax in fig.get_axes() if len(ax.get_ylabel())],
+            }
+        else:
+            for line, column in template['lines']:
+                df = self._decimated([column])
+                line.set_data(df['epoch'], df[column])
+            for label, text in template['labels']:
+                label.set_text(text.replace(template['title'], plot_title))
+            for ax in template['axes']:
+                ax.relim()
+                ax.autoscale_view()
+        self.save(save_title + chart, fig=template['fig'])
+
     def plot_together(self, plot=False):
         """
         This method plots all value in the second level of the column in one graph, no stacked lines
@@ -270,7 +540,7 @@ class DStatFrame(object):
         """
         plot_title, save_title = self._get_titles()
 
-        ax = self.df.plot(kind='line', x='epoch', title=plot_title)
+        ax = self._decimated().plot(kind='line', x='epoch', title=plot_title)
 
         self._set_layout(ax)
         self._set_ticks_units(ax)
@@ -280,6 +550,15 @@ class DStatFrame(object):
             self.save(save_title + "line")
             plt.close()
 
+    def _decimated(self, columns=None, width=None):
+        """
+        :param columns: columns whose peaks the kept rows have to preserve, every column but the epoch if None
+        :param width: figure width in inches, the default one if None
+        :return: dataframe holding at most the rows a figure that wide can show (see shee.util.decimate)
+        """
+        columns = columns if columns is not None else [col for col in self.df.columns if col != 'epoch']
+        return decimate(self.df, point_budget(width), self.df[columns].values, self.DECIMATION)
+
     def _set_ticks_units(self, ax):
         if self.name == 'disk':
             y_formatter = tick.FormatStrFormatter('%1.2f MB')
@@ -294,7 +573,7 @@ class DStatFrame(object):
         """
         plot_title, save_title = self._get_titles()
 
-        ax = self.df.plot.area(stacked=False, x='epoch', y=columns, title=plot_title)
+        ax = self._decimated(columns).plot.area(stacked=False, x='epoch', y=columns, title=plot_title)
 
         self._set_layout(ax)
         self._set_ticks_units(ax)
@@ -332,12 +611,13 @@ class DStatFrame(object):
 
     def _get_titles(self):
         if self.device is not None:
-            device_name = 'eth' if self.name == 'network' else self.name
-            plot_title = device_name.upper() + str(self.device) + " Usage"
+            # network and disk devices are named after their interface or block device, e.g. eth0 or nvme0n1
+            device_name = str(self.device) if self.name in ['network', 'disk'] else self.name + str(self.device)
+            plot_title = device_name.upper() + " Usage"
             if self.device == 'comparison':
                 save_title = self.name + "-"
             else:
-                save_title = self.name + "-" + device_name + str(self.device) + "-"
+                save_title = self.name + "-" + device_name + "-"
         else:
             plot_title = "Total " + self.name.upper() + " Usage"
             save_title = "total-" + self.name + "-"
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import hashlib
+
+import numpy as np
+
+
+class DStatIndex(object):
+    """
+    Sparse time index of a dstat csv file, stored next to it (e.g. .dstat-hadoop-cloud-12.csv.idx.npz): every step
+    bytes, the epoch of the first complete data row and the byte offset the row starts at. Entries are found seeking
+    into the file, so the index is built without reading the whole file and it is extended when the file grows, e.g.
+    while dstat is still running. It is rebuilt when the header or the last indexed row change. A file read as a whole
+    anyway (e.g. by DStatFrame) is indexed from the rows met on the way instead (see begin, feed and end).
+    """
+
+    VERSION = 1
+
+    def __init__(self, filename, step=1 << 16, persist=True):
+        """
+        :param filename: dstat csv file
+        :param step: distance in bytes between two index entries
+        :param persist: Boolean, if False the index is neither loaded from nor stored next to the file
+        """
+        self.filename = os.path.abspath(filename)
+        dirname, basename = os.path.split(self.filename)
+        self.path = os.path.join(dirname, '.' + basename + '.idx.npz')
+        self.step = step
+        self.persist = persist
+        self.body = 0
+        self.header = ''
+        self.epochs = np.zeros(0, dtype=np.int64)
+        self.offsets = np.zeros(0, dtype=np.int64)
+
+    @staticmethod
+    def _epoch(line):
+        """
+        :param line: csv line
+        :return: int64 nanoseconds epoch of a data row, shifted to UTC+1 as in DStatFrame; None for other lines
+        """
+        if line.startswith(b'"'):
+            return None
+        try:
+            return int(round((float(line.split(b',', 1)[0]) + 3600) * 10**9))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _header(f):
+        """
+        :param f: csv file opened in binary mode
+        :return: offset of the first line after the two header rows, md5 of the bytes before it
+        """
+        f.seek(0)
+        md5 = hashlib.md5()
+        while True:
+            line = f.readline()
+            if not len(line):
+                raise ValueError('dstat header not found')
+            md5.update(line)
+            if line.startswith(b'"epoch"'):
+                md5.update(f.readline())
+                return f.tell(), md5.hexdigest()
+
+    @staticmethod
+    def _row(f, offset, body):
+        """
+        :param f: csv file opened in binary mode
+        :param offset: byte offset, inside a row or at its start
+        :param body: offset of the first data row
+        :return: offset and epoch of the first complete data row starting after offset (at offset, for the first data
+                 row), None when the end of file is reached
+        """
+        f.seek(offset)
+        if offset > body:
+            f.readline()
+        while True:
+            position = f.tell()
+            line = f.readline()
+            if not line.endswith(b'\n'):  # end of file, or a row still being written
+                return None
+            epoch = DStatIndex._epoch(line)
+            if epoch is not None:
+                return position, epoch
+
+    def _load(self):
+        if not self.persist:
+            return False
+        try:
+            with open(self.path, 'rb') as f:
+                data = np.load(f)
+                if int(data['version']) != self.VERSION or int(data['step']) != self.step:
+                    return False
+                self.body, self.header = int(data['body']), str(data['header'])
+                self.epochs, self.offsets = data['epochs'], data['offsets']
+                return True
+        except (IOError, OSError, ValueError, KeyError):
+            return False
+
+    def _save(self):
+        with open(self.path, 'wb') as f:
+            np.savez(f, version=np.array(self.VERSION), step=np.array(self.step), body=np.array(self.body),
+                     header=np.array(self.header), epochs=self.epochs, offsets=self.offsets)
+
+    def update(self):
+        """
+        Loads the stored index, checks it against the csv file and indexes the rows appended since it was stored
+        :return: self
+        """
+        with open(self.filename, 'rb') as f:
+            body, header = self._header(f)
+            valid = self._load() and self.header == header and self.body == body
+            if valid and len(self.offsets):
+                # the last indexed row has to be still there, at the same offset
+                last = self._row(f, int(self.offsets[-1]), int(self.offsets[-1]))
+                valid = last is not None and last[0] == self.offsets[-1] and last[1] == self.epochs[-1]
+            if not valid:
+                self.body, self.header = body, header
+                self.epochs, self.offsets = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+            size = os.fstat(f.fileno()).st_size
+            offset = int(self.offsets[-1]) + self.step if len(self.offsets) else body
+            epochs, offsets = [], []
+            while offset < size:
+                row = self._row(f, offset, body)
+                if row is None:
+                    break
+                if not len(offsets) or row[0] > offsets[-1]:
+                    offsets.append(row[0])
+                    epochs.append(row[1])
+                offset = max(offset + self.step, row[0] + 1)
+
+        if not valid or len(offsets):
+            self.epochs = np.append(self.epochs, np.array(epochs, dtype=np.int64))
+            self.offsets = np.append(self.offsets, np.array(offsets, dtype=np.int64))
+            self._store()
+        return self
+
+    def _store(self):
+        if not self.persist:
+            return
+        try:
+            self._save()
+        except (IOError, OSError) as e:
+            print "Unable to store the index of %s: %s" % (self.filename, str(e))
+
+    def begin(self):
+        """
+        Starts indexing the file, read sequentially from its first data row on by the caller; the index is replaced
+        """
+        with open(self.filename, 'rb') as f:
+            self.body, self.header = self._header(f)
+        # the next entry is the first row starting at _next or after, _offset being the threshold of update
+        self._offset, self._next, self._entries = self.body, self.body, []
+
+    def feed(self, offset, line):
+        """
+        Indexes a complete data row, as update would: the first row starting after each step bytes threshold
+        :param offset: byte offset the row starts at, rows being fed in file order
+        :param line: the row, without its newline
+        """
+        if offset < self._next:
+            return
+        epoch = self._epoch(line)
+        if epoch is not None:
+            self._entries.append((offset, epoch))
+            self._offset = max(self._offset + self.step, offset + 1)
+            self._next = self._offset + 1
+
+    def end(self):
+        """
+        Stores the index of the rows fed since begin
+        :return: self
+        """
+        self.offsets = np.array([offset for offset, _ in self._entries], dtype=np.int64)
+        self.epochs = np.array([epoch for _, epoch in self._entries], dtype=np.int64)
+        self._store()
+        return self
+
+    def first(self):
+        """ :return: epoch of the first data row, None for a file without rows """
+        return int(self.epochs[0]) if len(self.epochs) else None
+
+    def last(self):
+        """ :return: epoch of the last complete data row, read from the last index entry on; None without rows """
+        ret = None
+        if len(self.offsets):
+            with open(self.filename, 'rb') as f:
+                row = self._row(f, int(self.offsets[-1]), int(self.offsets[-1]))
+                while row is not None:
+                    ret = row[1]
+                    row = self._row(f, f.tell(), f.tell())
+        return ret
+
+    def span(self, start=None, end=None):
+        """
+        :param start: first epoch of a time window, None for an open start
+        :param end: last epoch of a time window, None for an open end
+        :return: byte range (begin, stop) holding every row of the window, stop None for the end of file
+        """
+        begin, stop = self.body, None
+        if start is not None and len(self.epochs):
+            begin = int(self.offsets[max(np.searchsorted(self.epochs, start, side='left') - 1, 0)])
+        if end is not None:
+            pos = np.searchsorted(self.epochs, end, side='right')
+            stop = int(self.offsets[pos]) if pos < len(self.offsets) else None
+        return begin, stop
@@ -10,22 +10,32 @@ import matplotlib.dates as mdates
 
 class DStatMemory(DStatFrame):
 
-    def __init__(self, filename, frame=None, grain=False):
+    def __init__(self, filename, frame=None, window=None):
         if frame is not None:
             self.df = frame.df
             self.device = frame.device
+            self.header = frame.header
+            self.zeros = frame.zeros
             self._set_name('memory')
         else:
-            super(DStatMemory, self).__init__(filename, 'memory')
+            super(DStatMemory, self).__init__(filename, 'memory', window=window)
         sname = get_result_dir_name(filename)
         self.filename = sname + '/memory/' + sname.split("/")[-1]
-        df = self._read_dataframe(['epoch', 'memory usage'], grain=grain)
+        df = self._read_dataframe(['epoch', 'memory usage'])
         df.columns = df.columns.droplevel()
         df.ix[:, df.columns != 'epoch'] = df.ix[:, df.columns != 'epoch'].divide(1024*1024*1024)
         self.df = df
 
     def subplot_all(self, plot=False):
-        plot_title, save_title = self._get_titles()
+        save_title = self._get_titles()[1]
+        self._render_template('subplots', self._subplots, save_title, plot=plot)
+
+    def _subplots(self):
+        """
+        Draws one subplot for each metric on a new figure
+        :return: figure
+        """
+        plot_title = self._get_titles()[0]
 
         # row and column sharing
         fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, sharex=True, sharey=True)
@@ -50,11 +60,7 @@ class DStatMemory(DStatFrame):
         self._rotating_xticks_and_grid([ax1, ax2, ax3, ax4])
 
         plt.tight_layout(pad=1, w_pad=1, h_pad=1)
-        if plot:
-            plt.show()
-        else:
-            self.save(save_title + "subplots")
-            plt.close()
+        return fig
 
     @staticmethod
     def _rotating_xticks_and_grid(axs):
@@ -65,7 +71,8 @@ class DStatMemory(DStatFrame):
 
     def _set_subplots_title_and_plot(self, ax, xlab, ylab):
         ax.set_title(ylab)
-        ax.plot(self.df[xlab], self.df[ylab])
+        df = self._decimated([ylab])
+        ax.plot(df[xlab], df[ylab])
 
     @staticmethod
     def _set_subplots_time(ax, hours, mins):
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 from frame import DStatFrame
+from schema import DStatSchema
 from shee.util import get_result_dir_name
 
 import matplotlib.pyplot as plt
@@ -10,28 +11,38 @@ import matplotlib.dates as mdates
 
 class DStatNetwork(DStatFrame):
 
-    def __init__(self, filename, frame=None, eth=None, grain=False):
+    def __init__(self, filename, frame=None, eth=None, window=None):
         if frame is not None:
             self.df = frame.df
             self.device = frame.device
+            self.header = frame.header
+            self.zeros = frame.zeros
             self._set_name('network')
         else:
-            super(DStatNetwork, self).__init__(filename, 'network')
+            super(DStatNetwork, self).__init__(filename, 'network', window=window)
         sname = get_result_dir_name(filename)
         if eth is not None:
-            self.filename = sname + '/network/eth' + str(eth) + '/' + sname.split("/")[-1]
-            df = self._read_dataframe(['epoch', 'net/eth' + str(eth)], grain=grain)
+            self.filename = sname + '/network/' + eth + '/' + sname.split("/")[-1]
+            df = self._read_dataframe(['epoch', DStatSchema.group('network', eth)])
             self.device = eth
         else:
             self.filename = sname + '/network/' + sname.split("/")[-1]
-            df = self._read_dataframe(['epoch', 'net/total'], grain=grain)
+            df = self._read_dataframe(['epoch', 'net/total'])
 
         df.columns = df.columns.droplevel()
         df.ix[:, df.columns != 'epoch'] = df.ix[:, df.columns != 'epoch'].divide(1024*1024/8)
         self.df = df
 
     def subplot_all(self, plot=False):
-        plot_title, save_title = self._get_titles()
+        save_title = self._get_titles()[1]
+        self._render_template('subplots', self._subplots, save_title, plot=plot)
+
+    def _subplots(self):
+        """
+        Draws one subplot for each metric on a new figure
+        :return: figure
+        """
+        plot_title = self._get_titles()[0]
 
         # row and column sharing
         fig, (ax1, ax2) = plt.subplots(2, 1, sharex=True)
@@ -50,11 +61,7 @@ class DStatNetwork(DStatFrame):
         self._rotating_xticks_and_grid([ax1, ax2])
 
         plt.tight_layout(pad=1, w_pad=1, h_pad=1)
-        if plot:
-            plt.show()
-        else:
-            self.save(save_title + "subplots")
-            plt.close()
+        return fig
 
     @staticmethod
     def _rotating_xticks_and_grid(axs):
@@ -65,7 +72,8 @@ class DStatNetwork(DStatFrame):
 
     def _set_subplots_title_and_plot(self, ax, xlab, ylab):
         ax.set_title(ylab)
-        ax.plot(self.df[xlab], self.df[ylab])
+        df = self._decimated([ylab])
+        ax.plot(df[xlab], df[ylab])
 
     @staticmethod
     def _set_subplots_time(ax, hours, mins):
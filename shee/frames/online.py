@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from frame import DStatReadColumnsException
+
+
+class DStatWelford(object):
+    """
+    Running count, mean and variance (Welford) of a vector of metrics
+    """
+
+    def __init__(self, width):
+        """
+        :param width: number of metrics
+        """
+        self.count = 0
+        self.mean = np.zeros(width)
+        self.m2 = np.zeros(width)
+
+    def update(self, values):
+        """
+        :param values: 1d array, one observation of each metric
+        """
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (values - self.mean)
+
+    def std(self):
+        """
+        :return: sample standard deviation (ddof 1, as pandas), NaN with a single observation
+        """
+        if self.count < 2:
+            return np.full(len(self.mean), np.nan)
+        return np.sqrt(self.m2 / (self.count - 1))
+
+
+class DStatOnlineAggregate(object):
+    """
+    Streaming cluster aggregator. Node streams are reduced to one mean sample per time bucket, then merged in time
+    order through a heap: every bucket updates running mean and variance across nodes and is written out once
+    closed. Every node stream is open during the merge (one file each) and holds one parsed chunk, so memory is
+    O(nodes x CHUNKSIZE x metrics) for the readers plus O(buckets x metrics) for the results.
+    """
+
+    # rows parsed at once by each node stream (see DStatStream), kept small as every node holds one chunk
+    CHUNKSIZE = 2048
+
+    # divisor of each column group, as in DStatAggregate.DEVICES
+    UNITS = {
+        'total cpu usage': 1,
+        'net/total': 1024 * 1024,
+        'memory usage': 1024 * 1024 * 1024,
+        'dsk/total': 1024 * 1024,
+    }
+
+    DEVICES = {
+        'total cpu usage': 'cpu',
+        'net/total': 'net',
+        'memory usage': 'mem',
+        'dsk/total': 'dsk',
+    }
+
+    def __init__(self, freq=10**9):
+        """
+        :param freq: bucket width in nanoseconds
+        """
+        self.freq = int(freq)
+        self.columns = None
+
+    def _buckets(self, stream, node):
+        """
+        Reduces a node stream to one mean sample per bucket; samples are assigned to the nearest bucket start.
+        Epochs are assumed to be increasing within the node, as DStatStream yields them: a bucket is closed as soon as
+        a sample falls into another one, so samples coming back to an earlier bucket would be yielded out of order
+        :param stream: DStat stream object
+        :param node: node position, used as heap tie breaker
+        :return: iterator of (bucket, node, values) tuples, in bucket order
+        """
+        order = None
+        last, sums, count = None, None, 0
+        for epoch, values in stream.chunks():
+            if order is None:
+                order = self._order(stream.columns)
+            if not len(epoch):
+                continue
+            values = values[:, order].astype(np.float64)
+            ids = (epoch + self.freq // 2) // self.freq
+            starts = np.concatenate(([0], np.nonzero(np.diff(ids))[0] + 1))
+            chunk_sums = np.add.reduceat(values, starts, axis=0)
+            chunk_counts = np.diff(np.append(starts, len(ids)))
+            for pos, bucket in enumerate(ids[starts]):
+                if bucket == last:
+                    sums, count = sums + chunk_sums[pos], count + chunk_counts[pos]
+                    continue
+                if last is not None:
+                    yield last, node, sums / count
+                last, sums, count = bucket, chunk_sums[pos], chunk_counts[pos]
+        if last is not None:
+            yield last, node, sums / count
+
+    def _order(self, columns):
+        """
+        :param columns: list of (group, metric) columns of a node stream
+        :return: positions of the aggregated columns inside the node columns
+        """
+        if self.columns is None:
+            self.columns = list(columns)
+        try:
+            return [columns.index(col) for col in self.columns]
+        except ValueError:
+            raise DStatReadColumnsException('Nodes columns differ: ' + str(sorted(set(self.columns) - set(columns))))
+
+    def aggregate(self, streams):
+        """
+        :param streams: list of DStat stream objects, one for each node, reading the DStatAggregate global columns
+                        in chunks of CHUNKSIZE rows
+        :return: dict keyed by device (cpu, net, mem, dsk) of bucket start indexed dataframes with avg_, std_ and
+                 sum_ columns for each metric
+        """
+        index, avgs, stds, sums = [], [], [], []
+        current, welford = None, None
+        merged = heapq.merge(*[self._buckets(stream, node) for node, stream in enumerate(streams)])
+        for bucket, node, values in merged:
+            if bucket != current:
+                if welford is not None:
+                    index.append(current)
+                    avgs.append(welford.mean)
+                    stds.append(welford.std())
+                    sums.append(welford.mean * welford.count)
+                current, welford = bucket, DStatWelford(len(values))
+            welford.update(values)
+        if welford is not None:
+            index.append(current)
+            avgs.append(welford.mean)
+            stds.append(welford.std())
+            sums.append(welford.mean * welford.count)
+
+        return self._to_dict(index, avgs, stds, sums)
+
+    def _to_dict(self, index, avgs, stds, sums):
+        columns = self.columns if self.columns is not None else []
+        width = len(columns)
+        index = pd.Index((np.array(index, dtype=np.int64) * self.freq).view('datetime64[ns]'), name='epoch')
+        avgs, stds, sums = [np.array(rows).reshape(len(rows), width) for rows in (avgs, stds, sums)]
+
+        ret = {}
+        for group, device in self.DEVICES.iteritems():
+            data, names = [], []
+            for prefix, rows in (('avg_', avgs), ('std_', stds), ('sum_', sums)):
+                for pos, col in enumerate(columns):
+                    if col[0] == group:
+                        data.append(rows[:, pos] / self.UNITS[group])
+                        names.append(prefix + col[1])
+            ret[device] = pd.DataFrame(np.array(data).T.reshape(len(index), len(names)), index=index, columns=names)
+        return ret
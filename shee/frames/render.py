@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+import multiprocessing
+from collections import deque
+from StringIO import StringIO
+
+import matplotlib.pyplot as plt
+
+
+def _init_worker():
+    """ Render workers are headless """
+    plt.switch_backend('Agg')
+
+
+def _render_job(args):
+    """
+    Process pool entry point: renders one chart capturing its output; errors are returned instead of raised
+    :param args: tuple (chart, method, kwargs)
+    :return: captured output, error message (None if rendering succeeded)
+    """
+    chart, method, kwargs = args
+    stdout = sys.stdout
+    sys.stdout = log = StringIO()
+    error = None
+    try:
+        getattr(chart, method)(plot=False, **kwargs)
+    except Exception as e:
+        error = "%s.%s: %s" % (type(chart).__name__, method, str(e))
+    finally:
+        plt.close('all')
+        sys.stdout = stdout
+    return log.getvalue(), error
+
+
+class DStatRenderScheduler(object):
+    """
+    Renders charts on a pool of headless (Agg) processes. Each chart is an independent job: the device frame it is
+    drawn from (already sliced to the device columns, so only that slice is sent to the workers) and the chart method
+    to call with its keyword arguments. Output paths only depend on the frame, as in a serial run. At most queue jobs
+    are pending: their results are collected in submission order and submit waits for the oldest one when the queue
+    is full, so the parent can't get ahead of the workers by more than that. A job without a result after timeout
+    seconds, e.g. a chart that could not be sent to the workers or whose worker died, is reported as failed.
+    """
+
+    def __init__(self, jobs, queue=None, timeout=600):
+        """
+        :param jobs: number of render processes
+        :param queue: maximum number of pending jobs, twice the processes if None
+        :param timeout: seconds a job may take from its submission before it is given up
+        """
+        self.pool = multiprocessing.Pool(jobs, initializer=_init_worker)
+        self.queue = queue if queue is not None else 2 * jobs
+        self.timeout = timeout
+        self.pending = deque()
+        self.errors = []
+        self.rendered = 0
+        self.lost = False
+
+    def submit(self, chart, method, **kwargs):
+        """
+        Queues a chart, waiting for the oldest pending one if the queue is full
+        :param chart: DStat frame object
+        :param method: name of the chart method, e.g. plot_stacked
+        :param kwargs: chart method keyword arguments
+        """
+        while len(self.pending) >= self.queue:
+            self._collect()
+        result = self.pool.apply_async(_render_job, [(chart, method, kwargs)])
+        self.pending.append(("%s.%s" % (type(chart).__name__, method), time.time() + self.timeout, result))
+        while len(self.pending) and self.pending[0][2].ready():
+            self._collect()
+
+    def _collect(self):
+        """ Waits for the oldest pending job, until its deadline, and reports its output """
+        name, deadline, result = self.pending.popleft()
+        result.wait(max(deadline - time.time(), 0))
+        if not result.ready():
+            self.lost = True
+            self.errors.append("%s: no result after %d seconds" % (name, self.timeout))
+            return
+        try:
+            log, error = result.get()
+        except Exception as e:
+            log, error = '', "%s: %s" % (name, str(e))
+        sys.stdout.write(log)
+        if error is not None:
+            self.errors.append(error)
+        else:
+            self.rendered += 1
+
+    def close(self):
+        """
+        Waits for the pending jobs and stops the workers
+        :return: list of the failed charts error messages
+        """
+        self.pool.close()
+        while len(self.pending):
+            self._collect()
+        if self.lost:
+            # a given up job would keep the pool from joining
+            self.pool.terminate()
+        self.pool.join()
+        for error in self.errors:
+            print "Chart rendering failed: " + error
+        return self.errors
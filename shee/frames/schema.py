@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+from collections import OrderedDict
+
+
+class DStatSchema(object):
+    """
+    Index of a parsed dstat header, built once per header:
+        - groups: column positions of each first level group, in header order
+        - devices: device names of each class, in header order, e.g.
+        {'cpu': ['1', '2'], 'network': ['eth0', 'ens3'], 'disk': ['sda', 'nvme0n1', 'dm-0']}
+    Totals are not devices.
+    """
+
+    # device class -> (first level group pattern, shorthand prefix accepted for the device names)
+    CLASSES = OrderedDict([
+        ('cpu', ('cpu%s usage', '')),
+        ('network', ('net/%s', 'eth')),
+        ('disk', ('dsk/%s', 'sd')),
+    ])
+
+    def __init__(self, header):
+        """
+        :param header: list of (group, metric) column tuples
+        """
+        self.header = header
+        self.groups = OrderedDict()
+        for pos, col in enumerate(header):
+            self.groups.setdefault(col[0], []).append(pos)
+
+        patterns = [(kind, re.compile('^' + '(.+)'.join(re.escape(part) for part in group.split('%s')) + '$'))
+                    for kind, (group, _) in self.CLASSES.iteritems()]
+        self.devices = dict((kind, []) for kind in self.CLASSES)
+        for group in self.groups:
+            for kind, pattern in patterns:
+                match = pattern.match(group)
+                if match is not None and match.group(1) != 'total':
+                    self.devices[kind].append(match.group(1))
+                    break
+
+    @classmethod
+    def group(cls, kind, device):
+        """
+        :param kind: device class, i.e. cpu, network or disk
+        :param device: device name
+        :return: first level column name of the device, e.g. dsk/nvme0n1
+        """
+        return cls.CLASSES[kind][0] % device
+
+    @classmethod
+    def names(cls, kind, device):
+        """
+        :param kind: device class
+        :param device: device name or its shorthand, e.g. 0 for eth0 or a for sda
+        :return: list of the device names it may stand for
+        """
+        device, prefix = str(device), cls.CLASSES[kind][1]
+        return [device, prefix + device] if len(prefix) and not device.startswith(prefix) else [device]
+
+    def positions(self, group):
+        """
+        :param group: first level column name
+        :return: list of the group column positions, empty if the group is missing
+        """
+        return self.groups.get(group, [])
+
+    def find(self, kind, device):
+        """
+        :param kind: device class
+        :param device: device name or its shorthand (see names)
+        :return: device name, None if the header has no such device
+        """
+        for name in self.names(kind, device):
+            if name in self.devices[kind]:
+                return name
+        return None
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+class DStatAggregateStore(object):
+    """
+    Binary store of the aggregated results of an experiment, e.g. <experiment dir>/aggregation.shee/, containing:
+        - meta.json: source files identity and aggregation options the results are keyed by, experiment date,
+        nodes list, output base filename, the columns of each device and the charts rendered from the results
+        - <device>.index.npy: runtime index in seconds of each device dataframe
+        - <device>.npy: row-major float64 values of each device dataframe
+    Every .npy file can be memory mapped, so reloading an aggregation costs no parsing.
+    """
+
+    VERSION = 1
+
+    def __init__(self, dirname):
+        self.dirname = os.path.abspath(dirname)
+        self.meta = None
+
+    def _path(self, name):
+        return os.path.join(self.dirname, name)
+
+    @staticmethod
+    def key(files, options):
+        """
+        :param files: list of the source files absolute paths
+        :param options: dict of the aggregation options changing the results
+        :return: dict with path, size and mtime of each source file and the options
+        """
+        identity = []
+        for fn in sorted(files):
+            st = os.stat(fn)
+            identity.append([fn, st.st_size, st.st_mtime])
+        return {'files': identity, 'options': options}
+
+    def _read_meta(self):
+        try:
+            with open(self._path('meta.json'), 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def exists(self):
+        """ :return: True if a complete store has been written by the current version """
+        meta = self.meta = self._read_meta()
+        return meta is not None and meta.get('version') == self.VERSION
+
+    def valid(self, key):
+        """
+        The store is valid when it has been written by the current version from the same files and options
+        :param key: see key
+        :return: Boolean
+        """
+        # a json round trip makes tuples and floats comparable with the stored key
+        return self.exists() and self.meta['key'] == json.loads(json.dumps(key))
+
+    def options(self):
+        """ :return: aggregation options of the stored results, None if the results are not bound to their sources """
+        meta = self.meta if self.meta is not None else self._read_meta()
+        return meta['key']['options'] if meta is not None and meta['key'] is not None else None
+
+    def charts(self):
+        """
+        :return: dict keyed by device of the charts rendered from the stored results: the render options they were
+                 drawn with (see DStatAggregate.render_key) and the chart files
+        """
+        meta = self.meta if self.meta is not None else self._read_meta()
+        return meta.get('charts', {}) if meta is not None else {}
+
+    def save_charts(self, charts):
+        """
+        Records the charts rendered from the stored results
+        :param charts: dict keyed by device of {'render': render options, 'files': list of chart files} dicts
+        """
+        meta = self.meta = self._read_meta()
+        meta['charts'] = charts
+        with open(self._path('meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    def load(self, mmap=True):
+        """
+        :param mmap: Boolean, if True the .npy files are memory mapped
+        :return: dict keyed by device of runtime indexed dataframes, nodes list, experiment date, base filename
+        """
+        meta = self.meta if self.meta is not None else self._read_meta()
+        mode = 'r' if mmap else None
+        ret = {}
+        for device, columns in meta['devices'].iteritems():
+            device = str(device)
+            columns = [tuple(str(c) for c in col) if isinstance(col, list) else str(col) for col in columns]
+            if len(columns) and isinstance(columns[0], tuple):
+                columns = pd.MultiIndex.from_tuples(columns)
+            index = np.load(self._path(device + '.index.npy'), mmap_mode=mode)
+            values = np.load(self._path(device + '.npy'), mmap_mode=mode)
+            ret[device] = pd.DataFrame(values, index=np.asarray(index), columns=columns, copy=False)
+        return ret, [str(node) for node in meta['nodes']], pd.Timestamp(meta['date']), str(meta['filename'])
+
+    def save(self, dfs, nodes, date, filename, key=None):
+        """
+        Store the aggregated results; meta.json is written last and marks the store as complete
+        :param dfs: dict keyed by device of runtime indexed dataframes
+        :param nodes: nodes list
+        :param date: experiment date
+        :param filename: aggregation output base filename
+        :param key: see key, None if the results are not bound to their sources
+        """
+        if os.path.exists(self.dirname):
+            shutil.rmtree(self.dirname)
+        os.makedirs(self.dirname)
+
+        devices = {}
+        for device, df in dfs.iteritems():
+            np.save(self._path(device + '.index.npy'), np.asarray(df.index.values))
+            np.save(self._path(device + '.npy'), np.ascontiguousarray(df.values, dtype=np.float64))
+            devices[device] = [list(col) if isinstance(col, tuple) else col for col in df.columns.values]
+
+        meta = {
+            'version': self.VERSION,
+            'key': key,
+            'nodes': list(nodes),
+            'date': pd.Timestamp(date).value,
+            'filename': filename,
+            'devices': devices,
+        }
+        with open(self._path('meta.json'), 'w') as f:
+            json.dump(meta, f)
+        self.meta = meta
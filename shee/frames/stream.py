@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import csv
+
+import numpy as np
+import pandas as pd
+
+from frame import DStatFrame
+from frame import DStatOpenCsvException
+from index import DStatIndex
+from shee.util import select_columns
+
+
+class DStatTotals(object):
+    """
+    Reducer computing count, sum, min and max of each column over the whole stream
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.sum = None
+        self.min = None
+        self.max = None
+
+    def feed(self, epoch, values):
+        """
+        :param epoch: int64 nanoseconds epoch array of the chunk
+        :param values: 2d float array of the chunk (rows x columns)
+        """
+        if not len(values):
+            return
+        if self.sum is None:
+            self.sum = np.zeros(values.shape[1])
+            self.min = np.full(values.shape[1], np.inf)
+            self.max = np.full(values.shape[1], -np.inf)
+        self.count += len(values)
+        self.sum += values.sum(axis=0)
+        self.min = np.minimum(self.min, values.min(axis=0))
+        self.max = np.maximum(self.max, values.max(axis=0))
+
+    def to_frame(self, columns):
+        """
+        :param columns: list of (group, metric) column tuples fed to the reducer
+        :return: dataframe indexed by column with count, mean, min and max columns
+        """
+        index = pd.MultiIndex.from_tuples(columns)
+        if self.sum is None:
+            return pd.DataFrame(index=index, columns=['count', 'mean', 'min', 'max'])
+        return pd.DataFrame({
+            'count': self.count,
+            'mean': self.sum / self.count,
+            'min': self.min,
+            'max': self.max,
+        }, index=index, columns=['count', 'mean', 'min', 'max'])
+
+
+class DStatDownsample(object):
+    """
+    Reducer computing a downsampled series: samples are averaged in time buckets and the bucket width doubles each
+    time the number of buckets exceeds the points budget, so memory is bounded whatever the stream length is
+    """
+
+    def __init__(self, points=2000, width=10**9):
+        """
+        :param points: maximum number of buckets
+        :param width: initial bucket width in nanoseconds
+        """
+        self.points = points
+        self.width = width
+        self.origin = None
+        self.ids = None
+        self.sums = None
+        self.counts = None
+
+    @staticmethod
+    def _reduce(ids, sums, counts):
+        """ Merges rows with equal bucket ids """
+        order = np.argsort(ids, kind='mergesort')
+        ids, sums, counts = ids[order], sums[order], counts[order]
+        starts = np.concatenate(([0], np.nonzero(np.diff(ids))[0] + 1))
+        return ids[starts], np.add.reduceat(sums, starts, axis=0), np.add.reduceat(counts, starts)
+
+    def feed(self, epoch, values):
+        """
+        :param epoch: int64 nanoseconds epoch array of the chunk
+        :param values: 2d float array of the chunk (rows x columns)
+        """
+        if not len(values):
+            return
+        if self.origin is None:
+            self.origin = epoch[0] - epoch[0] % self.width
+
+        ids = (epoch - self.origin) // self.width
+        counts = np.ones(len(ids), dtype=np.int64)
+        if self.ids is not None:
+            ids = np.concatenate((self.ids, ids))
+            values = np.concatenate((self.sums, values))
+            counts = np.concatenate((self.counts, counts))
+        self.ids, self.sums, self.counts = self._reduce(ids, values.astype(np.float64), counts)
+
+        while len(self.ids) > self.points:
+            self.width *= 2
+            self.ids, self.sums, self.counts = self._reduce(self.ids // 2, self.sums, self.counts)
+
+    def to_frame(self, columns):
+        """
+        :param columns: list of (group, metric) column tuples fed to the reducer
+        :return: dataframe with the bucket start epoch column followed by the bucket means
+        """
+        ids = self.ids if self.ids is not None else np.zeros(0, dtype=np.int64)
+        origin = self.origin if self.origin is not None else 0
+        data = {0: (origin + ids * self.width).astype('datetime64[ns]')}
+        for pos, col in enumerate(columns):
+            means = self.sums[:, pos] / self.counts if self.ids is not None else np.zeros(0)
+            data[pos + 1] = means.astype(DStatFrame._dtype(col))
+        df = pd.DataFrame(data, columns=range(len(columns) + 1))
+        df.columns = pd.MultiIndex.from_tuples([('epoch', 'epoch')] + list(columns))
+        return df
+
+
+class DStatStream(object):
+    """
+    Streaming reader of dstat csv files: rows are parsed in bounded chunks and fed incrementally to reducers:
+        - totals: count, mean, min and max of each column (per-core summaries included)
+        - series: downsampled series used for plotting
+    Memory stays flat no matter the log length.
+    """
+
+    def __init__(self, filename, groups=None, chunksize=50000, points=2000, window=None, cache=True):
+        """
+        :param filename: dstat csv file
+        :param groups: column projection, if None every column is read
+        :param chunksize: number of rows parsed at once
+        :param points: maximum number of points of the downsampled series
+        :param window: DStat window object (see DStatWindow): reading starts at the window through the file time
+                       index (see DStatIndex), rows outside it are skipped and reading stops at its end
+        :param cache: Boolean, if False the time index is only kept in memory, no sidecar file is written
+        """
+        self.filename = filename
+        self.groups = groups
+        self.window = window
+        self.cache = cache
+        self.chunksize = chunksize
+        self.columns = []
+        self.dropped = 0
+        self.totals = DStatTotals()
+        self.series = DStatDownsample(points=points)
+
+    def _chunks(self, csvfile, header):
+        positions = select_columns(header, self.groups)
+        self.columns = [header[pos] for pos in positions[1:]]
+        return pd.read_csv(
+            csvfile,
+            sep=',',
+            header=None,
+            names=range(len(header)),
+            usecols=positions,
+            dtype=dict((pos, DStatFrame._dtype(header[pos])) for pos in positions),
+            comment='"',
+            quoting=csv.QUOTE_NONE,
+            error_bad_lines=False,
+            warn_bad_lines=False,
+            chunksize=self.chunksize,
+        )
+
+    def chunks(self):
+        """
+        Generator of the parsed chunks; rows whose epoch is not after every previous one (oversampled, adjacent or not)
+        are dropped as in DStatFrame, across chunks too, so epochs are strictly increasing
+        :return: iterator of (int64 nanoseconds epoch array, 2d values array) tuples
+        """
+        try:
+            with open(self.filename, 'rb') as csvfile:
+                header, self.dropped = DStatFrame._read_header(csvfile), 0
+                last, first = None, None
+                if self.window is not None:
+                    index = DStatIndex(self.filename, persist=self.cache).update()
+                    first = index.first()
+                    if first is not None:
+                        csvfile.seek(index.span(*self.window.bounds(first))[0])
+                for chunk in self._chunks(csvfile, header):
+                    rows = len(chunk.index)
+                    chunk = chunk.dropna(how='any')
+                    self.dropped += rows - len(chunk.index)
+
+                    # UTC+1 epoch in nanoseconds
+                    epoch = np.round((chunk.iloc[:, 0].values + 3600) * 10**9).astype(np.int64)
+                    keep = DStatFrame._monotonic(epoch, last)
+                    if len(epoch):
+                        last = epoch.max() if last is None else max(last, epoch.max())
+                    epoch, values = epoch[keep], chunk.iloc[:, 1:].values[keep]
+
+                    if self.window is not None and len(epoch):
+                        first = epoch[0] if first is None else first
+                        lo, hi = self.window.select(epoch, first=first)
+                        yield epoch[lo:hi], values[lo:hi]
+                        if hi < len(epoch):
+                            break
+                        continue
+                    yield epoch, values
+        except Exception as e:
+            raise DStatOpenCsvException(str(type(e)) + ': ' + e.message)
+
+    def read(self):
+        """
+        Reads the whole file chunk by chunk feeding each reducer
+        :return: self
+        """
+        print self.filename
+        for epoch, values in self.chunks():
+            self.totals.feed(epoch, values)
+            self.series.feed(epoch, values)
+        if self.dropped:
+            print "%d lines dropped" % self.dropped
+        return self
+
+    def summary(self):
+        """
+        :return: dataframe indexed by column with count, mean, min and max columns
+        """
+        return self.totals.to_frame(self.columns)
+
+    def to_frame(self, name='base'):
+        """
+        :param name: frame name
+        :return: DStat frame object holding the downsampled series
+        """
+        return DStatFrame.from_dataframe(self.series.to_frame(self.columns), name)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+import pandas as pd
+
+import matplotlib.pyplot as plt
+
+
+class DStatSuite(object):
+    """
+    Multi-run aggregation of an experiment: the cluster averages of each run are aligned on runtime (seconds since
+    the run start) and reduced across runs to mean, standard deviation and 95% confidence interval of the mean, while
+    the per-run averages are kept next to them.
+    """
+
+    # two-sided 95% Student t quantiles by degrees of freedom (1-30), the normal one is used beyond
+    T95 = [np.nan, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145,
+           2.131, 2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045,
+           2.042]
+
+    def __init__(self, name, runs, output_dir):
+        """
+        :param name: experiment name
+        :param runs: list of (run name, dict keyed by device of runtime indexed dataframes), see averages
+        :param output_dir: directory the suite results are written to
+        """
+        self.name = name
+        self.runs = [run for run, _ in runs]
+        self.outdir = output_dir
+        self.df = self._to_dict(runs)
+
+    def get_dict(self):
+        """ getter method """
+        return self.df
+
+    @staticmethod
+    def averages(df):
+        """
+        :param df: runtime indexed aggregated dataframe of a device (see DStatAggregate.get_dict)
+        :return: runtime indexed dataframe of the cross-node averages, named after the metrics, one row per second
+        """
+        names = [col[0] if isinstance(col, tuple) else col for col in df.columns]
+        positions = [pos for pos, name in enumerate(names) if name.startswith('avg_')]
+        ret = pd.DataFrame(df.iloc[:, positions].values, index=df.index, columns=[names[pos][4:] for pos in positions])
+        return ret.groupby(level=0).mean()
+
+    @classmethod
+    def t95(cls, count):
+        """
+        :param count: array of number of observations
+        :return: array of two-sided 95% t quantiles with count - 1 degrees of freedom, NaN below two observations
+        """
+        dof = np.asarray(count) - 1
+        table = np.array(cls.T95)
+        return np.where(dof < len(table), table[np.clip(dof, 0, len(table) - 1)], 1.96)
+
+    def _to_dict(self, runs):
+        """
+        Structure a keyed by device dictionary of runtime indexed dataframes holding, for each metric, the mean
+        (mean_), standard deviation (std_) and 95% confidence interval half width (ci_) across runs, the number of
+        runs covering each second (runs) and the average of each run (<run>_<metric>)
+        :param runs: list of (run name, dict keyed by device of averages dataframes)
+        :return: dataframe as a dict object keyed by device
+        """
+        ret = {}
+        devices = sorted(set(device for _, dfs in runs for device in dfs))
+        for device in devices:
+            dfs = [(run, dfs[device]) for run, dfs in runs if device in dfs]
+            metrics = list(dfs[0][1].columns)
+            index = reduce(np.union1d, [df.index.values for _, df in dfs])
+
+            # (run x runtime x metric) cube, NaN where a run is shorter than the others
+            data = np.full((len(dfs), len(index), len(metrics)), np.nan)
+            for pos, (_, df) in enumerate(dfs):
+                data[pos, np.searchsorted(index, df.index.values)] = df[metrics].values
+
+            count = np.sum(~np.isnan(data), axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.nanmean(data, axis=0)
+                std = np.nanstd(data, axis=0, ddof=1)
+                ci = self.t95(count) * std / np.sqrt(count)
+            std[count < 2] = np.nan
+            ci[count < 2] = np.nan
+
+            values = [mean, std, ci, count.max(axis=1)[:, np.newaxis]] + [data[pos] for pos in range(len(dfs))]
+            columns = ['mean_' + m for m in metrics] + ['std_' + m for m in metrics] + ['ci_' + m for m in metrics]
+            columns += ['runs'] + [run + '_' + m for run, _ in dfs for m in metrics]
+            ret[device] = pd.DataFrame(np.hstack(values), index=pd.Index(index, name='runtime'), columns=columns)
+        return ret
+
+    def to_csv(self):
+        """ Export dict-like object dataframes in .csv sheets """
+        if not os.path.exists(self.outdir):
+            os.makedirs(self.outdir)
+        for k, v in self.df.iteritems():
+            v.to_csv(os.path.join(self.outdir, self.name + '_' + k + '.csv'))
+
+    def plot(self, plot=False):
+        """
+        One chart for each metric: the per-run averages and the mean across runs inside its 95% confidence interval
+        :param plot: if True charts are shown, otherwise saved
+        """
+        for device, df in sorted(self.df.iteritems()):
+            metrics = [col[5:] for col in df.columns if col.startswith('mean_')]
+            for metric in metrics:
+                plt.figure()
+                for run in self.runs:
+                    if run + '_' + metric in df:
+                        plt.plot(df.index, df[run + '_' + metric], color='0.6', linewidth=0.5)
+                plt.fill_between(df.index, df['mean_' + metric] - df['ci_' + metric],
+                                 df['mean_' + metric] + df['ci_' + metric], color='b', alpha=0.3,
+                                 label=metric + ' 95% ci')
+                plt.plot(df.index, df['mean_' + metric], 'b', label=metric + ' mean')
+                plt.title("%s %s - %s (%d runs)" % (self.name, device, metric, len(self.runs)))
+                plt.legend(loc='best', fontsize=10)
+
+                ax = plt.gca()
+                ax.set_xlabel("runtime [sec]", fontsize=12)
+                ax.xaxis.grid(True)
+                ax.yaxis.grid(True)
+
+                if plot:
+                    plt.show()
+                else:
+                    self.save(self.name + '-' + device + '-' + metric.replace('/', '_'), device)
+                    plt.close()
+
+    def save(self, save_title, device):
+        """ Save plot on disk
+        :param save_title: '<save_title>.png' file will be saved
+        :param device: current device
+        :return:
+        """
+        outdir = self.outdir + '/' + device
+        if not os.path.exists(outdir):
+            os.makedirs(outdir)
+
+        outname = outdir + '/' + save_title + '.png'
+        plt.savefig(outname, bbox_inches='tight')
+        print outname + ' created'
@@ -0,0 +1,405 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from frame import DStatException
+
+
+class DStatSummaryMergeException(DStatException):
+    """
+    Raised when summaries with different bucket width or columns are merged
+    """
+    pass
+
+
+class DStatSummary(object):
+    """
+    Mergeable per-time-bucket summary of one or more dstat logs. For each bucket and column it holds count, sum, sum
+    of squares, min, max and a quantile sketch - at most size weighted centroids, compressed into equal-weight bins.
+    Merging is associative, so node summaries can be merged into rack, cluster or multi-cluster ones in any order
+    without reading the csv files again. Stored as a compressed .npz file of a few kilobytes.
+    """
+
+    SUFFIX = '.summary.npz'
+
+    def __init__(self, name, freq, size, columns, buckets, nodes, count, sum, sumsq, min, max, centroids, weights):
+        """
+        :param name: summary name, e.g. the node name
+        :param freq: bucket width in nanoseconds
+        :param size: maximum number of sketch centroids
+        :param columns: list of (group, metric) column tuples
+        :param buckets: sorted int64 bucket ids - bucket start epoch divided by freq
+        :param nodes: number of merged summaries covering each bucket
+        :param count: (bucket x column) number of samples
+        :param sum: (bucket x column) sum of samples
+        :param sumsq: (bucket x column) sum of squared samples
+        :param min: (bucket x column) minimum sample
+        :param max: (bucket x column) maximum sample
+        :param centroids: (bucket x column x centroid) sketch centroids, NaN padded
+        :param weights: (bucket x column x centroid) sketch weights, 0 padded
+        """
+        self.name = name
+        self.freq = int(freq)
+        self.size = int(size)
+        self.columns = [tuple(col) for col in columns]
+        self.buckets = buckets
+        self.nodes = nodes
+        self.count = count
+        self.sum = sum
+        self.sumsq = sumsq
+        self.min = min
+        self.max = max
+        self.centroids = centroids
+        self.weights = weights
+
+    @classmethod
+    def from_arrays(cls, epoch, values, columns, freq=10**9, size=16, name=''):
+        """
+        :param epoch: int64 nanoseconds epoch array
+        :param values: 2d array of the samples (rows x columns)
+        :param columns: list of (group, metric) column tuples
+        :param freq: bucket width in nanoseconds, samples are assigned to the nearest bucket start
+        :param size: maximum number of sketch centroids
+        :param name: summary name
+        :return: DStat summary object
+        """
+        ids = (epoch + freq // 2) // freq
+        order = np.argsort(ids, kind='mergesort')
+        ids, values = ids[order], np.asarray(values, dtype=np.float64)[order]
+        starts = np.concatenate(([0], np.nonzero(np.diff(ids))[0] + 1)) if len(ids) else np.zeros(0, dtype=np.int64)
+        counts = np.diff(np.append(starts, len(ids)))
+        width = len(columns)
+
+        if not len(ids):
+            empty = np.zeros((0, width))
+            return cls(name, freq, size, columns, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                       empty.astype(np.int64), empty, empty, empty, empty, np.zeros((0, width, 0)),
+                       np.zeros((0, width, 0)))
+
+        # each sample is a centroid of weight one, at its position inside the bucket
+        rows = np.repeat(np.arange(len(starts)), counts)
+        positions = np.arange(len(ids)) - starts[rows]
+        centroids = np.full((len(starts), counts.max(), width), np.nan)
+        centroids[rows, positions] = values
+        centroids = np.ascontiguousarray(centroids.transpose(0, 2, 1))
+        weights = np.where(np.isnan(centroids), 0., 1.)
+        centroids, weights = cls._compress(centroids, weights, size)
+
+        return cls(name, freq, size, columns, ids[starts], np.ones(len(starts), dtype=np.int64),
+                   np.repeat(counts[:, np.newaxis], width, axis=1),
+                   np.add.reduceat(values, starts, axis=0),
+                   np.add.reduceat(values ** 2, starts, axis=0),
+                   np.minimum.reduceat(values, starts, axis=0),
+                   np.maximum.reduceat(values, starts, axis=0),
+                   centroids, weights)
+
+    @classmethod
+    def from_stream(cls, stream, freq=10**9, size=16, name=''):
+        """
+        Summarizes a dstat file chunk by chunk
+        :param stream: DStat stream object
+        :return: DStat summary object
+        """
+        ret = None
+        for epoch, values in stream.chunks():
+            summary = cls.from_arrays(epoch, values, stream.columns, freq=freq, size=size, name=name)
+            # a bucket may straddle two chunks of the same file
+            ret = summary if ret is None else ret.merge(summary, node=True)
+        if ret is None:
+            ret = cls.from_arrays(np.zeros(0, dtype=np.int64), np.zeros((0, len(stream.columns))), stream.columns,
+                                  freq=freq, size=size, name=name)
+        return ret
+
+    @staticmethod
+    def _compress(centroids, weights, size):
+        """
+        Sorts the centroids of each bucket and column and merges them into at most size equal-weight bins
+        :return: centroids and weights, sorted with empty centroids last
+        """
+        index = np.arange(centroids.shape[0])[:, np.newaxis, np.newaxis]
+        column = np.arange(centroids.shape[1])[np.newaxis, :, np.newaxis]
+        order = np.argsort(centroids, axis=2)
+        centroids, weights = centroids[index, column, order], weights[index, column, order]
+        if centroids.shape[2] <= size:
+            return centroids, weights
+
+        cum = np.cumsum(weights, axis=2)
+        total = np.maximum(cum[:, :, -1:], 1e-300)
+        bins = np.minimum(((cum - weights) / total * size).astype(np.int64), size - 1)
+        shape = centroids.shape[:2] + (size,)
+        merged, sums = np.zeros(shape), np.zeros(shape)
+        np.add.at(merged, (index, column, bins), weights)
+        np.add.at(sums, (index, column, bins), np.where(weights > 0, centroids * weights, 0.))
+        centroids = np.where(merged > 0, sums / np.where(merged > 0, merged, 1.), np.nan)
+
+        # empty bins are moved last again
+        order = np.argsort(centroids, axis=2)
+        return centroids[index, column, order], merged[index, column, order]
+
+    def merge(self, other, node=False):
+        """
+        :param other: DStat summary object with the same bucket width and columns
+        :param node: if True, other summarizes more samples of the same nodes (e.g. the next chunk of a file): their
+                     presence in each bucket is or-ed instead of counted
+        :return: new DStat summary object covering both
+        """
+        if self.freq != other.freq:
+            raise DStatSummaryMergeException('Bucket widths differ: %d, %d' % (self.freq, other.freq))
+        if self.columns != other.columns:
+            raise DStatSummaryMergeException('Columns differ: ' + str(sorted(set(self.columns) ^ set(other.columns))))
+
+        buckets = np.union1d(self.buckets, other.buckets)
+        width = len(self.columns)
+        size = max(self.size, other.size)
+        nodes = np.zeros(len(buckets), dtype=np.int64)
+        count = np.zeros((len(buckets), width), dtype=np.int64)
+        sums, sumsq = np.zeros((len(buckets), width)), np.zeros((len(buckets), width))
+        mins, maxs = np.full((len(buckets), width), np.inf), np.full((len(buckets), width), -np.inf)
+        depth = self.centroids.shape[2] + other.centroids.shape[2]
+        centroids = np.full((len(buckets), width, depth), np.nan)
+        weights = np.zeros((len(buckets), width, depth))
+
+        offset = 0
+        for summary in (self, other):
+            rows = np.searchsorted(buckets, summary.buckets)
+            nodes[rows] = np.maximum(nodes[rows], summary.nodes) if node else nodes[rows] + summary.nodes
+            count[rows] += summary.count
+            sums[rows] += summary.sum
+            sumsq[rows] += summary.sumsq
+            mins[rows] = np.fmin(mins[rows], summary.min)
+            maxs[rows] = np.fmax(maxs[rows], summary.max)
+            end = offset + summary.centroids.shape[2]
+            centroids[rows, :, offset:end] = summary.centroids
+            weights[rows, :, offset:end] = summary.weights
+            offset = end
+
+        centroids, weights = self._compress(centroids, weights, size)
+        name = self.name if self.name == other.name else self.name + '+' + other.name
+        return DStatSummary(name, self.freq, size, self.columns, buckets, nodes, count, sums, sumsq, mins, maxs,
+                            centroids, weights)
+
+    def digest(self):
+        """
+        :return: hex digest of the summary content, used to detect changed summaries
+        """
+        md5 = hashlib.md5(repr((self.freq, self.columns)).encode('utf-8'))
+        for values in (self.buckets, self.count, self.sum, self.sumsq):
+            md5.update(np.ascontiguousarray(values).tobytes())
+        return md5.hexdigest()
+
+    def mean(self):
+        """ :return: (bucket x column) average """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.sum / self.count
+
+    def std(self):
+        """ :return: (bucket x column) sample standard deviation (ddof 1, as pandas), NaN below two samples """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var = (self.sumsq - self.sum ** 2 / self.count) / (self.count - 1)
+            return np.where(self.count > 1, np.sqrt(np.maximum(var, 0)), np.nan)
+
+    def quantiles(self, qs):
+        """
+        Sketch quantiles, interpolated between centroids midpoints; 0 and 100 give the exact min and max
+        :param qs: list of percentiles (0-100)
+        :return: list of (bucket x column) arrays, one for each percentile
+        """
+        index = np.arange(self.centroids.shape[0])[:, np.newaxis]
+        column = np.arange(self.centroids.shape[1])[np.newaxis, :]
+        cum = np.cumsum(self.weights, axis=2)
+        total = cum[:, :, -1] if self.weights.shape[2] else np.zeros(self.count.shape)
+        middle = np.where(self.weights > 0, cum - self.weights / 2., np.inf)
+        last = np.maximum(np.sum(self.weights > 0, axis=2) - 1, 0)
+
+        ret = []
+        for q in qs:
+            if q <= 0 or q >= 100:
+                ret.append(np.where(self.count > 0, self.min if q <= 0 else self.max, np.nan))
+                continue
+            target = q / 100. * total
+            above = np.sum(middle <= target[:, :, np.newaxis], axis=2)
+            low, high = np.minimum(np.maximum(above - 1, 0), last), np.minimum(above, last)
+            low_value, high_value = self.centroids[index, column, low], self.centroids[index, column, high]
+            low_middle, high_middle = middle[index, column, low], middle[index, column, high]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ratio = np.where(high_middle > low_middle, (target - low_middle) / (high_middle - low_middle), 0.)
+            values = low_value + (high_value - low_value) * np.clip(ratio, 0., 1.)
+            ret.append(np.where(self.count > 0, np.clip(values, self.min, self.max), np.nan))
+        return ret
+
+    def to_dict(self, devices, percentiles):
+        """
+        :param devices: list of (device, column group, unit divisor) tuples
+        :param percentiles: list of (percentile, column prefix) tuples
+        :return: dict keyed by device of bucket start indexed dataframes with avg_, std_, percentiles and sum_ columns
+                 for each metric of the device group; sum_ is the average times the number of merged summaries
+        """
+        index = pd.Index((self.buckets * self.freq).view('datetime64[ns]'), name='epoch')
+        mean = self.mean()
+        stats = [('avg_', mean), ('std_', self.std())]
+        stats += zip([prefix for _, prefix in percentiles], self.quantiles([q for q, _ in percentiles]))
+        stats += [('sum_', mean * self.nodes[:, np.newaxis])]
+
+        ret = {}
+        for device, group, divisor in devices:
+            positions = [pos for pos, col in enumerate(self.columns) if col[0] == group]
+            data, names = [], []
+            for prefix, values in stats:
+                data.append(values[:, positions] / divisor)
+                names += [prefix + self.columns[pos][1] for pos in positions]
+            ret[device] = pd.DataFrame(np.hstack(data), index=index, columns=names)
+        return ret
+
+    def bounds(self):
+        """
+        :return: first and last bucket start as int64 nanoseconds
+        """
+        return self.buckets[0] * self.freq, self.buckets[-1] * self.freq
+
+    def save(self, filename):
+        """
+        :param filename: .npz output file
+        """
+        with open(filename, 'wb') as f:
+            np.savez_compressed(
+                f,
+                name=np.array(self.name),
+                freq=np.array(self.freq),
+                size=np.array(self.size),
+                columns=np.array([list(col) for col in self.columns], dtype=str).reshape(len(self.columns), 2),
+                buckets=self.buckets,
+                nodes=self.nodes,
+                count=self.count,
+                sum=self.sum,
+                sumsq=self.sumsq,
+                min=self.min,
+                max=self.max,
+                centroids=self.centroids.astype(np.float32),
+                weights=self.weights.astype(np.float32),
+            )
+
+    @classmethod
+    def load(cls, filename):
+        """
+        :param filename: .npz file written by save
+        :return: DStat summary object
+        """
+        with open(filename, 'rb') as f:
+            data = np.load(f)
+            return cls(str(data['name']), int(data['freq']), int(data['size']),
+                       [(str(group), str(metric)) for group, metric in data['columns']],
+                       data['buckets'], data['nodes'], data['count'], data['sum'], data['sumsq'], data['min'],
+                       data['max'], data['centroids'].astype(np.float64), data['weights'].astype(np.float64))
+
+
+class DStatSummaryTree(object):
+    """
+    Persistent merge tree of summaries, e.g. <experiment dir>/aggregation.tree/. Summaries are the leaves of a complete
+    binary tree whose inner nodes hold the merge of their children, so adding, removing or replacing one summary
+    merges again only the log2(n) inner nodes above it, whatever the number of nodes. Each tree node is stored as
+    <position>.summary.npz (heap positions, root is 1) and meta.json records the leaves names and digests.
+    """
+
+    VERSION = 1
+
+    def __init__(self, dirname):
+        self.dirname = os.path.abspath(dirname)
+        self.nodes = {}
+        self.meta = None
+
+    def _path(self, position):
+        return os.path.join(self.dirname, str(position) + DStatSummary.SUFFIX)
+
+    def _read_meta(self):
+        try:
+            with open(os.path.join(self.dirname, 'meta.json'), 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _get(self, position):
+        """ :return: summary of the tree node, loaded on first access; None for empty sub-trees """
+        if position not in self.nodes:
+            path = self._path(position)
+            self.nodes[position] = DStatSummary.load(path) if os.path.exists(path) else None
+        return self.nodes[position]
+
+    def _set(self, position, summary):
+        self.nodes[position] = summary
+        path = self._path(position)
+        if summary is not None:
+            summary.save(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def _reset(self, freq, size):
+        """ Drops every stored node; the tree can hold up to capacity leaves, the smallest power of two >= size """
+        capacity = 1
+        while capacity < size:
+            capacity *= 2
+        if os.path.exists(self.dirname):
+            for fn in os.listdir(self.dirname):
+                os.remove(os.path.join(self.dirname, fn))
+        else:
+            os.makedirs(self.dirname)
+        self.nodes = {}
+        self.meta = {'version': self.VERSION, 'freq': freq, 'capacity': capacity, 'slots': [None] * capacity,
+                     'digests': [None] * capacity}
+
+    def update(self, summaries):
+        """
+        Brings the tree leaves in line with the given summaries: leaves of missing names are emptied, new or changed
+        summaries (see DStatSummary.digest) are stored, then the inner nodes above the touched leaves are merged again
+        :param summaries: non-empty list of DStat summary objects with distinct names and the same bucket width
+        :return: DStat summary object, merge of every summary
+        """
+        freq = summaries[0].freq
+        meta = self.meta = self._read_meta()
+        if meta is None or meta.get('version') != self.VERSION or meta['freq'] != freq or \
+                meta['capacity'] < len(summaries):
+            self._reset(freq, len(summaries))
+            meta = self.meta
+        capacity, slots, digests = meta['capacity'], meta['slots'], meta['digests']
+
+        names = set(summary.name for summary in summaries)
+        touched = set()
+        for pos, name in enumerate(slots):
+            if name is not None and name not in names:
+                slots[pos] = digests[pos] = None
+                self._set(capacity + pos, None)
+                touched.add(capacity + pos)
+
+        current = dict((name, pos) for pos, name in enumerate(slots) if name is not None)
+        for summary in summaries:
+            digest = summary.digest()
+            pos = current.get(summary.name)
+            if pos is not None and digests[pos] == digest:
+                continue
+            if pos is None:
+                pos = slots.index(None)
+            slots[pos], digests[pos] = summary.name, digest
+            self._set(capacity + pos, summary)
+            touched.add(capacity + pos)
+
+        # inner nodes above the touched leaves, level by level up to the root
+        level = touched
+        while len(level) and level != set([1]):
+            level = set(position // 2 for position in level)
+            for position in sorted(level):
+                left, right = self._get(2 * position), self._get(2 * position + 1)
+                if left is None or right is None:
+                    self._set(position, left if right is None else right)
+                else:
+                    self._set(position, left.merge(right))
+
+        with open(os.path.join(self.dirname, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        print "%d of %d summaries merged again" % (len([pos for pos in touched if slots[pos - capacity]]),
+                                                   len(summaries))
+        return self._get(1)
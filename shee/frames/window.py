@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import datetime
+
+import numpy as np
+
+from frame import DStatException
+
+
+class DStatWindowException(DStatException):
+    """
+    Raised when a window bound can't be parsed
+    """
+    pass
+
+
+class DStatWindow(object):
+    """
+    Observation window, bounds being either:
+        - absolute times, in the dstat frames time zone: HH:MM:SS on the day of the first sample or a full
+        YYYY-MM-DD HH:MM:SS date time
+        - runtime offsets in seconds from the first sample, e.g. 120 or 90.5
+    A missing bound leaves that side open; both bounds are included. Epochs being sorted, a window is selected with
+    two binary searches.
+    """
+
+    FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S']
+
+    def __init__(self, start=None, end=None):
+        """
+        :param start: first observation time, None for the first sample
+        :param end: last observation time, None for the last sample
+        """
+        self.start = self._parse(start)
+        self.end = self._parse(end)
+
+    def __repr__(self):
+        return 'DStatWindow(%r, %r)' % (self.start, self.end)
+
+    def key(self):
+        """ :return: json serializable description of the window, e.g. to key stored results """
+        return [list(self.start) if self.start is not None else None, list(self.end) if self.end is not None else None]
+
+    def is_absolute(self):
+        """ :return: True if no bound is a runtime offset """
+        return all(bound is None or bound[0] != 'offset' for bound in (self.start, self.end))
+
+    def widen(self, margin):
+        """
+        :param margin: nanoseconds added on both sides
+        :return: DStat window object
+        """
+        ret = DStatWindow()
+        ret.start = (self.start[0], self.start[1] - margin) if self.start is not None else None
+        ret.end = (self.end[0], self.end[1] + margin) if self.end is not None else None
+        return ret
+
+    def absolute(self, first):
+        """
+        :param first: int64 nanoseconds epoch runtime offsets refer to
+        :return: DStat window object with date bounds
+        """
+        start, end = self.bounds(first)
+        ret = DStatWindow()
+        ret.start = ('date', start) if start is not None else None
+        ret.end = ('date', end) if end is not None else None
+        return ret
+
+    @classmethod
+    def _parse(cls, value):
+        """
+        :param value: bound string, see the class description
+        :return: None, ('offset', nanoseconds), ('clock', nanoseconds since midnight) or ('date', epoch nanoseconds)
+        """
+        if value is None:
+            return None
+        value = str(value).strip()
+        try:
+            return 'offset', int(round(float(value) * 10**9))
+        except ValueError:
+            pass
+        try:
+            clock = datetime.datetime.strptime(value, '%H:%M:%S')
+            return 'clock', ((clock.hour * 60 + clock.minute) * 60 + clock.second) * 10**9
+        except ValueError:
+            pass
+        for fmt in cls.FORMATS:
+            try:
+                date = datetime.datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+            return 'date', int(np.datetime64(date, 'ns').astype(np.int64))
+        raise DStatWindowException('Invalid observation time: %s (expected HH:MM:SS, YYYY-MM-DD HH:MM:SS or seconds)'
+                                   % value)
+
+    @staticmethod
+    def _resolve(bound, first):
+        """
+        :param bound: parsed bound
+        :param first: int64 nanoseconds epoch of the first sample
+        :return: int64 nanoseconds epoch of the bound
+        """
+        kind, value = bound
+        if kind == 'offset':
+            return first + value
+        if kind == 'clock':
+            day = 24 * 3600 * 10**9
+            return first - first % day + value
+        return value
+
+    def bounds(self, first):
+        """
+        :param first: int64 nanoseconds epoch of the first sample
+        :return: first and last epoch of the window, None for an open side
+        """
+        start = self._resolve(self.start, first) if self.start is not None else None
+        end = self._resolve(self.end, first) if self.end is not None else None
+        return start, end
+
+    def select(self, epoch, first=None):
+        """
+        :param epoch: sorted int64 nanoseconds epoch array
+        :param first: epoch runtime offsets refer to, if None the first element of epoch
+        :return: positions (lo, hi) such that epoch[lo:hi] is inside the window
+        """
+        if not len(epoch):
+            return 0, 0
+        start, end = self.bounds(epoch[0] if first is None else first)
+        lo = np.searchsorted(epoch, start, side='left') if start is not None else 0
+        hi = np.searchsorted(epoch, end, side='right') if end is not None else len(epoch)
+        return int(lo), int(max(lo, hi))
@@ -16,15 +16,28 @@ class SheeParser(object):
         'cpu': 'If specified, only total cpu column is evaluated',
         'disk': 'If specified, only total disk column is evaluated',
         'processor': 'Get processor number to parse',
-        'eth': 'Get network eth number to parse',
-        'sd': 'Get disk sd letter to parse (should be a string)',
+        'eth': 'Get network interface to parse, e.g. eth0 or ens3 (an eth number is accepted)',
+        'sd': 'Get disk to parse, e.g. sda or nvme0n1 (an sd letter is accepted)',
         'plot': 'If specified, charts will be plotted with matplotlib GUI (not saved)',
-        'time': 'If specified, a time interval will be requested',
+        'start': 'Start of the observation window: HH:MM:SS, "YYYY-MM-DD HH:MM:SS" or runtime offset in seconds',
+        'end': 'End of the observation window: HH:MM:SS, "YYYY-MM-DD HH:MM:SS" or runtime offset in seconds',
         'web': 'If specified, an html page will be rendered',
         'aggregate': 'If specified, aggregated results will be computed',
-        'save_agg': 'Stores new .csv files with global aggregated results (one per metric)',
-        'file_agg': 'Searches FILE_AGG file in the working directory and computes evaluation',
-        'cumulative': 'Compute cumulative - sum up at runtime - charts for compatible metrics (cluster-level only)'
+        'save_agg': 'With -R, stores the suite results as csv files. Deprecated otherwise: the aggregation.shee store '
+                    'is always written unless -X is given (-s still writes it with -X)',
+        'file_agg': 'Searches FILE_AGG aggregation store (or legacy .csv file) in the working directory and computes evaluation',
+        'cumulative': 'Compute cumulative - sum up at runtime - charts for compatible metrics (cluster-level only)',
+        'nocache': 'If specified, no sidecar file (parse cache, time index) is loaded or written',
+        'stream': 'If specified, files are read in bounded chunks and charts are drawn from downsampled series',
+        'jobs': 'Number of processes evaluating dstat files in parallel',
+        'overlap': 'Minimum ratio (0-1) of each node duration the aggregated window has to cover (default 0)',
+        'bucket': 'Step in seconds of the time grid nodes are aligned onto when aggregating (default 1)',
+        'band': 'Band drawn around aggregated metrics: std (avg +- 2 std, default) or percentile (p50/p95/p99/min/max)',
+        'summary': 'Aggregates per-node summaries (dstat-*.summary.npz), computing the missing ones from dstat files',
+        'suite': 'Input directory is a Peel suite: aggregates every <experiment>.runXX run and compares the runs',
+        'render_jobs': 'Number of processes rendering the node charts of the files evaluated one at a time',
+        'heatmap_cores': 'Number of cores above which cores are drawn as one heatmap for each metric (default 16, '
+                         '0 for always)'
     }
 
     def __init__(self):
@@ -48,13 +61,25 @@ class SheeParser(object):
         sd -> if not given returns None
 
         plot -> if not given returns False
-        time -> if not given returns False
+        start -> if not given returns None
+        end -> if not given returns None
         web -> if not given returns False
         cumulative -> if not given returns False
 
         aggregate -> if not given returns False
         save_agg -> if not given returns False
         file_agg -> if not given returns None
+
+        nocache -> if not given returns False
+        stream -> if not given returns False
+        jobs -> if not given returns None
+        overlap -> if not given returns None
+        bucket -> if not given returns None
+        band -> if not given returns None
+        summary -> if not given returns False
+        suite -> if not given returns False
+        render_jobs -> if not given returns None
+        heatmap_cores -> if not given returns None
         :return:
         """
         self.parser.add_argument("-c", "--comparison",  help=self.HELPS['comparison'],  action='append')
@@ -68,11 +93,12 @@ class SheeParser(object):
         self.parser.add_argument("-d", "--disk",        help=self.HELPS['disk'],        action="store_true")
 
         self.parser.add_argument("-p", "--processor",   help=self.HELPS['processor'],   type=int)
-        self.parser.add_argument("-e", "--eth",         help=self.HELPS['eth'],         type=int)
+        self.parser.add_argument("-e", "--eth",         help=self.HELPS['eth'],         type=str)
         self.parser.add_argument("-D", "--sd",          help=self.HELPS['sd'],          type=str)
 
         self.parser.add_argument("-P", "--plot",        help=self.HELPS['plot'],        action="store_true")
-        self.parser.add_argument("-T", "--time",        help=self.HELPS['time'],        action="store_true")
+        self.parser.add_argument("-t", "--start",       help=self.HELPS['start'],       type=str)
+        self.parser.add_argument("-E", "--end",         help=self.HELPS['end'],         type=str)
         self.parser.add_argument("-w", "--web",         help=self.HELPS['web'],         action="store_true")
         self.parser.add_argument("-C", "--cumulative",  help=self.HELPS['cumulative'],  action='store_true')
 
@@ -80,4 +106,15 @@ class SheeParser(object):
         self.parser.add_argument("-s", "--save_agg",    help=self.HELPS['save_agg'],    action="store_true")
         self.parser.add_argument("-F", "--file_agg",    help=self.HELPS['file_agg'],    type=str)
 
+        self.parser.add_argument("-X", "--nocache",     help=self.HELPS['nocache'],     action="store_true")
+        self.parser.add_argument("-S", "--stream",      help=self.HELPS['stream'],      action="store_true")
+        self.parser.add_argument("-j", "--jobs",        help=self.HELPS['jobs'],        type=int)
+        self.parser.add_argument("-o", "--overlap",     help=self.HELPS['overlap'],     type=float)
+        self.parser.add_argument("-b", "--bucket",      help=self.HELPS['bucket'],      type=float)
+        self.parser.add_argument("-B", "--band",        help=self.HELPS['band'],        choices=['std', 'percentile'])
+        self.parser.add_argument("-Z", "--summary",     help=self.HELPS['summary'],     action='store_true')
+        self.parser.add_argument("-R", "--suite",       help=self.HELPS['suite'],       action='store_true')
+        self.parser.add_argument("-r", "--render_jobs", help=self.HELPS['render_jobs'], type=int)
+        self.parser.add_argument("-k", "--heatmap_cores", help=self.HELPS['heatmap_cores'], type=int)
+
         return self.parser.parse_args()
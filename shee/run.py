@@ -2,222 +2,564 @@
 # -*- coding: utf-8 -*
 
 import os
+import sys
+import json
+import glob
 import time
+import multiprocessing
+
+from StringIO import StringIO
+
+import matplotlib.pyplot as plt
 
 from shee.web import WebObject
 from shee.util import get_result_dir_name
 
 from shee.frames import DStatAggregate
+from shee.frames import DStatAggregateStore
 from shee.frames import DStatCompare
 from shee.frames import DStatCpu
 from shee.frames import DStatDisk
 from shee.frames import DStatFrame
+from shee.frames import DStatIndex
 from shee.frames import DStatMemory
 from shee.frames import DStatNetwork
 from shee.frames import DStatReadColumnsException
+from shee.frames import DStatRenderScheduler
+from shee.frames import DStatSchema
+from shee.frames import DStatStream
+from shee.frames import DStatSuite
+from shee.frames import DStatSummary
+from shee.frames import DStatSummaryTree
 
 
 def evaluate_file(filename, fullname):
     return os.path.isfile(fullname) and filename.startswith('dstat') and filename.endswith('.csv')
 
 
-def total_cpu_evaluation(fullname, dirname, plot, grain=False, df=None):
-    ds = DStatCpu(fullname, frame=df, grain=grain)
+def render_chart(ds, method, plot=False, renderer=None, **kwargs):
+    """
+    Draws one chart of a device
+    :param ds: DStat frame object
+    :param method: name of the chart method, e.g. plot_stacked
+    :param plot: if True the chart is shown, otherwise saved
+    :param renderer: DStat render scheduler object the saved charts are queued on, if None they are drawn here
+    :param kwargs: chart method keyword arguments
+    """
+    if renderer is not None and not plot:
+        renderer.submit(ds, method, **kwargs)
+    else:
+        getattr(ds, method)(plot=plot, **kwargs)
+
+
+def render_device_charts(ds, columns, plot=False, renderer=None):
+    """
+    Draws the charts of a device: metrics together, one subplot for each metric and the given columns stacked
+    """
+    render_chart(ds, 'plot_together', plot, renderer)
+    render_chart(ds, 'subplot_all', plot, renderer)
+    render_chart(ds, 'plot_stacked', plot, renderer, columns=columns)
+
+
+def total_cpu_evaluation(fullname, dirname, plot, window=None, df=None, renderer=None):
+    ds = DStatCpu(fullname, frame=df, window=window)
 
     cpudir = dirname + "/cpu"
     if not os.path.exists(cpudir):
         os.makedirs(cpudir)
 
-    ds.plot_together(plot=plot)
-    ds.subplot_all(plot=plot)
-    ds.plot_stacked(columns=['usr', 'sys', 'idl'], plot=plot)
+    render_device_charts(ds, ['usr', 'sys', 'idl'], plot, renderer)
 
 
-def single_cpu_evaluation(fullname, dirname, plot, cpunum=None, grain=False, df=None):
-    n = cpunum if cpunum is not None else 1
-    if cpunum is not None:
-        try:
-            ds = DStatCpu(fullname, cpu=n, grain=grain, frame=df)
+def single_cpu_evaluation(fullname, dirname, plot, cpunum=None, window=None, df=None, renderer=None,
+                          heatmap_cores=None):
+    df = df if df is not None else DStatFrame(fullname, 'cpu', window=window)
+    # if cpu number is specified, evaluating only that cpu, elsewhere evaluating all cpus
+    cores = [df.schema.find('cpu', cpunum)] if cpunum is not None else df.schema.devices['cpu']
+    if None in cores:
+        print "Wrong cpu core number selected: %s" % str(cpunum)
+        return
 
-            ndir = dirname + "/cpu" + "/cpu" + str(n)
-            if not os.path.exists(ndir):
-                os.makedirs(ndir)
+    # beyond heatmap_cores cores, one heatmap for each metric replaces the charts of each core
+    if cpunum is None and heatmap_cores is not None and len(cores) > heatmap_cores:
+        ds = DStatCpu(fullname, frame=df, window=window, cores=cores)
 
-            ds.plot_together(plot=plot)
-            ds.subplot_all(plot=plot)
-            ds.plot_stacked(columns=['usr', 'sys', 'idl'], plot=plot)
-        except DStatReadColumnsException:
-            print "Wrong cpu core number selected: %s" % str(n)
-    else:
-        while True:
-            # if cpu number is specified, evaluating only that cpu, elsewhere evaluating all cpus
-            try:
-                ds = DStatCpu(fullname, cpu=n, grain=grain, frame=df)
+        cpudir = dirname + "/cpu"
+        if not os.path.exists(cpudir):
+            os.makedirs(cpudir)
 
-                ndir = dirname + "/cpu" + "/cpu" + str(n)
-                if not os.path.exists(ndir):
-                    os.makedirs(ndir)
+        render_chart(ds, 'plot_heatmap', plot, renderer)
+        return
 
-                ds.plot_together(plot=plot)
-                ds.subplot_all(plot=plot)
-                ds.plot_stacked(columns=['usr', 'sys', 'idl'], plot=plot)
-                n += 1
-            except DStatReadColumnsException:
-                break
+    for n in cores:
+        ds = DStatCpu(fullname, cpu=n, window=window, frame=df)
 
+        ndir = dirname + "/cpu" + "/cpu" + n
+        if not os.path.exists(ndir):
+            os.makedirs(ndir)
 
-def total_network_evaluation(fullname, dirname, plot, grain=False, df=None):
-    ds = DStatNetwork(fullname, grain=grain, frame=df)
+        render_device_charts(ds, ['usr', 'sys', 'idl'], plot, renderer)
+
+
+def total_network_evaluation(fullname, dirname, plot, window=None, df=None, renderer=None):
+    ds = DStatNetwork(fullname, window=window, frame=df)
 
     netdir = dirname + "/network"
     if not os.path.exists(netdir):
         os.makedirs(netdir)
 
-    ds.plot_together(plot=plot)
-    ds.subplot_all(plot=plot)
-    ds.plot_stacked(columns=['send', 'recv'], plot=plot)
+    render_device_charts(ds, ['send', 'recv'], plot, renderer)
 
 
-def single_network_evaluation(fullname, dirname, plot, ethnum=None, grain=False, df=None):
-    n = ethnum if ethnum is not None else 0
-    if ethnum is not None:
-        try:
-            ds = DStatNetwork(fullname, eth=n, grain=grain, frame=df)
+def single_network_evaluation(fullname, dirname, plot, ethnum=None, window=None, df=None, renderer=None):
+    df = df if df is not None else DStatFrame(fullname, 'network', window=window)
+    interfaces = [df.schema.find('network', ethnum)] if ethnum is not None else df.schema.devices['network']
+    if None in interfaces:
+        print "Wrong eth number selected: %s" % str(ethnum)
+        return
 
-            ndir = dirname + "/network" + "/eth" + str(n)
-            if not os.path.exists(ndir):
-                os.makedirs(ndir)
+    for n in interfaces:
+        ds = DStatNetwork(fullname, eth=n, window=window, frame=df)
 
-            ds.plot_together(plot=plot)
-            ds.subplot_all(plot=plot)
-            ds.plot_stacked(columns=['send', 'recv'], plot=plot)
-        except DStatReadColumnsException:
-            print "Wrong eth number selected: %s" % str(n)
-    else:
-        while True:
-            try:
-                ds = DStatNetwork(fullname, eth=n, grain=grain, frame=df)
+        ndir = dirname + "/network" + "/" + n
+        if not os.path.exists(ndir):
+            os.makedirs(ndir)
 
-                ndir = dirname + "/network" + "/eth" + str(n)
-                if not os.path.exists(ndir):
-                    os.makedirs(ndir)
+        render_device_charts(ds, ['send', 'recv'], plot, renderer)
 
-                ds.plot_together(plot=plot)
-                ds.subplot_all(plot=plot)
-                ds.plot_stacked(columns=['send', 'recv'], plot=plot)
-                n += 1
-            except DStatReadColumnsException:
-                break
 
-
-def total_memory_evaluation(fullname, dirname, plot, grain=False, df=None):
-    ds = DStatMemory(fullname, grain=grain, frame=df)
+def total_memory_evaluation(fullname, dirname, plot, window=None, df=None, renderer=None):
+    ds = DStatMemory(fullname, window=window, frame=df)
 
     memdir = dirname + "/memory"
     if not os.path.exists(memdir):
         os.makedirs(memdir)
 
-    ds.plot_together(plot=plot)
-    ds.subplot_all(plot=plot)
-    ds.plot_stacked(columns=['used', 'buff', 'cach', 'free'], plot=plot)
+    render_device_charts(ds, ['used', 'buff', 'cach', 'free'], plot, renderer)
     # no multiple memory device evaluation here
 
 
-def total_disk_evaluation(fullname, dirname, plot, grain=False, df=None):
-    ds = DStatDisk(fullname, grain=grain, frame=df)
+def total_disk_evaluation(fullname, dirname, plot, window=None, df=None, renderer=None):
+    ds = DStatDisk(fullname, window=window, frame=df)
 
     dskdir = dirname + "/disk"
     if not os.path.exists(dskdir):
         os.makedirs(dskdir)
 
-    ds.plot_together(plot=plot)
-    ds.subplot_all(plot=plot)
-    ds.plot_stacked(columns=['read', 'writ'], plot=plot)
+    render_device_charts(ds, ['read', 'writ'], plot, renderer)
 
 
-def single_disk_evaluation(fullname, dirname, plot, sdnum=None, grain=False, df=None):
-    n = sdnum if sdnum is not None else 'a'
-    if sdnum is not None:
-        try:
-            ds = DStatDisk(fullname, disk=n, grain=grain, frame=df)
+def single_disk_evaluation(fullname, dirname, plot, sdnum=None, window=None, df=None, renderer=None):
+    df = df if df is not None else DStatFrame(fullname, 'disk', window=window)
+    disks = [df.schema.find('disk', sdnum)] if sdnum is not None else df.schema.devices['disk']
+    if None in disks:
+        print "Wrong disk selected: %s" % str(sdnum)
+        return
 
-            ndir = dirname + "/disk" + "/sd" + n
-            if not os.path.exists(ndir):
-                os.makedirs(ndir)
+    for n in disks:
+        ds = DStatDisk(fullname, disk=n, window=window, frame=df)
 
-            ds.plot_together(plot=plot)
-            ds.subplot_all(plot=plot)
-            ds.plot_stacked(columns=['read', 'writ'], plot=plot)
-        except DStatReadColumnsException:
-            print "Wrong eth number selected: %s" % n
-    else:
-        while True:
-            try:
-                ds = DStatDisk(fullname, disk=n, grain=grain, frame=df)
+        ndir = dirname + "/disk" + "/" + n
+        if not os.path.exists(ndir):
+            os.makedirs(ndir)
 
-                ndir = dirname + "/disk" + "/sd" + n
-                if not os.path.exists(ndir):
-                    os.makedirs(ndir)
+        render_device_charts(ds, ['read', 'writ'], plot, renderer)
 
-                ds.plot_together(plot=plot)
-                ds.subplot_all(plot=plot)
-                ds.plot_stacked(columns=['read', 'writ'], plot=plot)
-                n = chr(ord(n) + 1)
-            except DStatReadColumnsException:
-                break
 
-
-def comparison_evaluation(fullname, dirname, columns, plot, grain=False, df=None):
+def comparison_evaluation(fullname, dirname, columns, plot, window=None, df=None, renderer=None):
     try:
-        ds = DStatCompare(fullname, columns, grain=grain, frame=df)
+        ds = DStatCompare(fullname, columns, window=window, frame=df)
 
         memdir = dirname + "/comparison"
         if not os.path.exists(memdir):
             os.makedirs(memdir)
 
-        ds.subplot_all(columns, plot=plot, grain=grain)
+        render_chart(ds, 'subplot_all', plot, renderer, cols=columns, grain=window is not None)
     except DStatReadColumnsException as e:
         print "Wrong columns specified. " + e.message
         exit(-1)
 
 
-def aggregating_evaluation(dir, save=False, filename="", plot=False, grain=False, cum=False):
+def node_evaluation(fullname, evaluations, groups=None, processor=None, eth=None, sd=None, comparison=None,
+                    plot=False, window=None, cache=True, stream=False, renderer=None, heatmap_cores=None):
+    """
+    Computes every requested evaluation of one dstat file
+    :param fullname: dstat file absolute path
+    :param evaluations: dict of Booleans keyed by evaluation (total_cpu, single_cpu, total_network, single_network,
+                        total_memory, total_disk, single_disk)
+    :param groups: column groups to load, None if every column is needed
+    :param renderer: DStat render scheduler object the charts are queued on, if None they are drawn in this process
+    :param heatmap_cores: number of cores above which they are drawn as heatmaps, None to always draw each core
+    :return:
+    """
+    # get result allows also dotted absolute paths
+    dn = get_result_dir_name(fullname)
+    if not os.path.exists(dn):
+        os.makedirs(dn)
+
+    if stream:
+        ds = DStatStream(fullname, groups=groups, window=window, cache=cache).read()
+        ds.summary().to_csv(dn + '/' + dn.split('/')[-1] + '-summary.csv')
+        frame = ds.to_frame('base')
+    else:
+        frame = DStatFrame(fullname, 'base', cache=cache, groups=groups, window=window)
+
+    if evaluations['total_cpu']:
+        total_cpu_evaluation(fullname, dn, plot, window, frame, renderer=renderer)
+    if evaluations['single_cpu']:
+        single_cpu_evaluation(fullname, dn, plot, processor, window, frame, renderer=renderer,
+                              heatmap_cores=heatmap_cores)
+
+    if evaluations['total_network']:
+        total_network_evaluation(fullname, dn, plot, window, frame, renderer=renderer)
+    if evaluations['single_network']:
+        single_network_evaluation(fullname, dn, plot, eth, window, frame, renderer=renderer)
+
+    if evaluations['total_memory']:
+        total_memory_evaluation(fullname, dn, plot, window, frame, renderer=renderer)
+
+    if evaluations['total_disk']:
+        total_disk_evaluation(fullname, dn, plot, window, frame, renderer=renderer)
+
+    if evaluations['single_disk']:
+        single_disk_evaluation(fullname, dn, plot, sd, window, frame, renderer=renderer)
+
+    if comparison is not None:
+        comparison_evaluation(fullname, dn, columns=comparison, plot=plot, window=window, df=frame, renderer=renderer)
+
+
+def _init_worker():
+    """ Pool workers are headless, the parent process keeps its backend """
+    plt.switch_backend('Agg')
+
+
+def _node_job(args):
+    """
+    Process pool entry point: evaluates one dstat file capturing its output; errors are returned instead of raised,
+    so one bad file doesn't stop the whole batch
+    :param args: tuple (fullname, node_evaluation keyword arguments)
+    :return: fullname, captured output, execution time, error message (None if the evaluation succeeded)
+    """
+    fullname, options = args
+
+    stdout = sys.stdout
+    sys.stdout = log = StringIO()
+    start_time = time.time()
+    error = None
+    try:
+        node_evaluation(fullname, **options)
+    except (Exception, SystemExit) as e:
+        error = str(type(e)) + ': ' + str(e)
+    finally:
+        sys.stdout = stdout
+    return fullname, log.getvalue(), time.time() - start_time, error
+
+
+def parallel_node_evaluation(fullnames, options, jobs):
+    """
+    Spreads dstat files across a process pool; outputs are printed in the files order
+    :param fullnames: list of dstat files absolute paths
+    :param options: node_evaluation keyword arguments
+    :param jobs: number of processes
+    :return: list of failed files
+    """
+    failed = []
+    pool = multiprocessing.Pool(jobs, initializer=_init_worker)
+    try:
+        for fullname, log, elapsed, error in pool.imap(_node_job, [(fn, options) for fn in fullnames]):
+            print "Evaluating : " + fullname
+            sys.stdout.write(log)
+            if error is not None:
+                print os.path.basename(fullname) + " analysis failed: " + error
+                failed.append(fullname)
+            else:
+                print os.path.basename(fullname) + " analysis completed.(Execution time: %s secs" % elapsed + ")"
+    finally:
+        pool.close()
+        pool.join()
+
+    if len(failed):
+        print "%d of %d files failed" % (len(failed), len(fullnames))
+    return failed
+
+
+def _frame_job(args):
+    """
+    Process pool entry point: loads the global columns of one dstat file in a compact form
+    :param args: tuple (fullname, cache, window)
+    :return: fullname, captured output, arrays (see DStatFrame.to_arrays) or None, error message (None if loading
+    succeeded)
+    """
+    fullname, cache, window = args
+    stdout = sys.stdout
+    sys.stdout = log = StringIO()
+    arrays = error = None
+    try:
+        df = DStatFrame(fullname, get_result_dir_name(fullname), cache=cache, groups=DStatAggregate.GLOBAL_GROUPS,
+                        window=window)
+        arrays = df.to_arrays(DStatAggregate.GLOBAL_GROUPS)
+    except DStatReadColumnsException as e:
+        error = e.message
+    finally:
+        sys.stdout = stdout
+    return fullname, log.getvalue(), arrays, error
+
 
+def parallel_frame_loading(fullnames, cache, jobs, window=None):
+    """
+    Loads dstat files across a process pool; only the columns needed by the aggregation are sent back
+    :param fullnames: list of dstat files absolute paths
+    :param cache: if True parsed files are loaded from (or stored into) the sidecar cache
+    :param jobs: number of processes
+    :param window: DStat window object, only the rows inside it are loaded
+    :return: list of DStat frame objects
+    """
+    dfs = []
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for fullname, log, arrays, error in pool.imap(_frame_job, [(fn, cache, window) for fn in fullnames]):
+            sys.stdout.write(log)
+            if error is not None:
+                print "Wrong columns specified. " + error
+                exit(-1)
+            dfs.append(DStatFrame.from_arrays(arrays, get_result_dir_name(fullname)))
+    finally:
+        pool.close()
+        pool.join()
+    return dfs
+
+
+def summarize(dir, fullnames, freq):
+    """
+    Collects the per-node summaries of an aggregation: each dstat file is summarized into <name>.summary.npz next to
+    it, unless an up to date summary already exists; summaries shipped without their csv file are loaded as well
+    :param dir: working directory
+    :param fullnames: list of dstat files absolute paths
+    :param freq: bucket width in nanoseconds
+    :return: list of DStat summary objects
+    """
+    summaries = []
+    known = set()
+    for fullname in fullnames:
+        path = get_result_dir_name(fullname) + DStatSummary.SUFFIX
+        known.add(path)
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(fullname):
+            summary = DStatSummary.load(path)
+            if summary.freq == freq:
+                summaries.append(summary)
+                continue
+        print "Summarizing : " + fullname
+        summary = DStatSummary.from_stream(DStatStream(fullname, groups=DStatAggregate.GLOBAL_GROUPS), freq=freq,
+                                           name=get_result_dir_name(fullname))
+        summary.save(path)
+        summaries.append(summary)
+
+    for fn in sorted(os.listdir(dir)):
+        path = os.path.join(dir, fn)
+        if fn.startswith('dstat') and fn.endswith(DStatSummary.SUFFIX) and path not in known:
+            summaries.append(DStatSummary.load(path))
+    return summaries
+
+
+def aggregating_evaluation(dir, save=False, filename="", plot=False, window=None, cum=False, cache=True, jobs=1,
+                           overlap=0.0, bucket=1.0, stream=False, band='std', summary=False):
+    """
+    Aggregates the dstat files of an experiment directory. Results are kept in the <dir>/aggregation.shee binary
+    store: while the dstat files and the options are unchanged they are reloaded instead of recomputed
+    :param filename: aggregation store directory or legacy aggregated .csv file to evaluate instead of the dstat files
+    :param window: DStat window object selecting the aggregated observation interval, None for the whole experiment
+    :return: DStat aggregate object
+    """
     file_list = os.listdir(dir) # catch the file list at the current dir
 
     aggr_dir = dir + '/aggregation'
     if not os.path.exists(aggr_dir):
         os.makedirs(aggr_dir)
 
-    if filename:  # a file name is given in input, initialize DStatAggregate object with given filename
-        dfs = None
+    # from here the path has to be absolute
+    fullnames = [os.path.join(dir, fn) for fn in sorted(file_list) if evaluate_file(fn, os.path.join(dir, fn))]
+    sources = list(fullnames)
+    if summary:  # summaries shipped without their csv file
+        sources += [os.path.join(dir, fn) for fn in sorted(file_list) if fn.startswith('dstat') and
+                    fn.endswith(DStatSummary.SUFFIX) and fn[:-len(DStatSummary.SUFFIX)] + '.csv' not in file_list]
+    store = DStatAggregateStore(os.path.join(dir, 'aggregation.shee'))
+    key = DStatAggregateStore.key(sources, {'cumulative': cum, 'overlap': overlap, 'bucket': bucket,
+                                            'stream': stream, 'summary': summary, 'band': band,
+                                            'window': window.key() if window is not None else None})
+
+    # runtime offsets refer to the first bucket of the experiment, found through the files time index; the nodes
+    # are then loaded only around the window
+    nodes_window = None
+    if window is not None and len(fullnames):
+        indexes = [DStatIndex(fn, persist=cache).update() for fn in fullnames]
+        bounds = [(index.first(), index.last()) for index in indexes if index.first() is not None]
+        if len(bounds):
+            freq = int(bucket * 10**9)
+            # offsets refer to the nodes kept by the aggregation, a stray node in the directory doesn't shift them
+            first = DStatAggregate.start(bounds, overlap)
+            first = (first + freq // 2) // freq * freq  # as the alignment grid, see DStatAlign.timeline
+            window = window.absolute(first) if not window.is_absolute() else window
+            nodes_window = window.widen(freq)
+
+    dfs, files, summaries, results, tree = None, None, None, None, None
+    if filename and os.path.isdir(os.path.join(dir, filename)):
+        results = DStatAggregateStore(os.path.join(dir, filename))
+        if not results.exists():
+            print "%s is not an aggregation store" % filename
+            exit(-1)
+        filename = ""
+    elif filename:
+        pass  # legacy .csv file, read by DStatAggregate
+    elif cache and store.valid(key):
+        results = store
+    elif summary:
+        summaries = summarize(dir, fullnames, int(bucket * 10**9))
+        tree = DStatSummaryTree(os.path.join(dir, 'aggregation.tree')) if cache else None
+    elif stream:
+        files = fullnames  # aggregated in streaming by DStatAggregate
+    elif jobs > 1:
+        dfs = parallel_frame_loading(fullnames, cache, jobs, nodes_window)
     else:
         dfs = []
-        for fn in file_list:
-            # from here the path has to be absolute
-            fullname = os.path.join(dir, fn)
-            if evaluate_file(fn, fullname):
-                try:
-                    df = DStatFrame(fullname, get_result_dir_name(fullname))
-                    dfs.append(df)
-                except DStatReadColumnsException as e:
-                    print "Wrong columns specified. " + e.message
-                    exit(-1)
-    dagg = DStatAggregate(dir, aggr_dir, dfs, filename=filename, grain=grain, cumulative=cum)
-
-    if save:
-        dagg.to_csv()
-
+        for fullname in fullnames:
+            try:
+                df = DStatFrame(fullname, get_result_dir_name(fullname), cache=cache,
+                                groups=DStatAggregate.GLOBAL_GROUPS, window=nodes_window)
+                dfs.append(df)
+            except DStatReadColumnsException as e:
+                print "Wrong columns specified. " + e.message
+                exit(-1)
+    dagg = DStatAggregate(dir, aggr_dir, dfs, filename=filename, window=window, cumulative=cum, min_overlap=overlap,
+                          freq=int(bucket * 10**9), files=files, band=band, summaries=summaries, store=results,
+                          tree=tree, cache=cache)
+
+    # results and charts of the previous aggregation: the charts of a device are not rendered again when its results
+    # are unchanged, they were drawn with the same render options and their files are still there. Results loaded
+    # with -F are always rendered.
+    previous, charts = {}, {}
+    if results is store:
+        previous, charts = dagg.get_dict(), store.charts()
+    elif results is None and not filename and store.exists() and store.options() == key['options']:
+        previous, charts = store.load(mmap=False)[0], store.charts()
+
+    stored = results is store
+    if (save or cache) and not filename and results is None:
+        dagg.to_store(store, key=key)
+        stored = True
+
+    # a json round trip makes the render options comparable with the recorded ones
+    render = json.loads(json.dumps(dagg.render_key()))
     for k, v in dagg.get_dict().iteritems():
+        done = charts.get(k)
+        if not plot and k in previous and previous[k].equals(v) and done is not None and done['render'] == render \
+                and len(done['files']) and all(os.path.isfile(fn) for fn in done['files']):
+            print "%s aggregated charts are up to date" % k
+            continue
         dagg.plot_aggr(v, mod=k, plot=plot)
         dagg.plot_clean(v, mod=k, plot=plot)
+        dagg.plot_heatmap(v, mod=k, plot=plot)
+        charts[k] = {'render': render, 'files': dagg.charts.get(k, [])}
+
+    if stored and not plot:
+        store.save_charts(dict((k, charts[k]) for k in dagg.get_dict() if k in charts))
+
+    return dagg
+
+
+def discover_runs(dir):
+    """
+    Finds the runs of a Peel suite, laid out as <experiment>.runXX/logs/dstat/dstat-<version>/
+    :param dir: suite directory
+    :return: dict keyed by experiment name of sorted lists of (run name, dstat directory)
+    """
+    ret = {}
+    for path in sorted(glob.glob(os.path.join(dir, '*.run*', 'logs', 'dstat', 'dstat-*'))):
+        if not os.path.isdir(path):
+            continue
+        experiment, run = os.path.relpath(path, dir).split(os.sep)[0].rsplit('.run', 1)
+        ret.setdefault(experiment, []).append(('run' + run, path))
+    return ret
+
+
+def _run_job(args):
+    """
+    Process pool entry point, also called serially with -j 1: aggregates one run of a suite capturing its output
+    :param args: tuple (run name, dstat directory, aggregating_evaluation keyword arguments)
+    :return: run name, captured output, dict keyed by device of the run averages (see DStatSuite.averages) or None,
+    error message (None if the aggregation succeeded)
+    """
+    run, dir, options = args
+
+    stdout = sys.stdout
+    sys.stdout = log = StringIO()
+    averages = error = None
+    try:
+        dagg = aggregating_evaluation(dir, **options)
+        averages = dict((k, DStatSuite.averages(v)) for k, v in dagg.get_dict().iteritems())
+    except (Exception, SystemExit) as e:
+        error = str(type(e)) + ': ' + str(e)
+    finally:
+        sys.stdout = stdout
+    return run, log.getvalue(), averages, error
 
-    return dagg.get_date(), dagg.get_nodes_list()
+
+def suite_evaluation(dir, save=False, plot=False, cum=False, cache=True, jobs=1, overlap=0.0, bucket=1.0, stream=False,
+                     band='std', summary=False, window=None):
+    """
+    Aggregates every run of every experiment found in a Peel suite directory, then compares the runs of each
+    experiment on runtime. Per-run results are written as usual inside each run dstat directory, suite results into
+    <dir>/<experiment>.suite/. Runs are spread across the process pool (files of a run are loaded serially) and
+    parsed files are taken from the sidecar cache, so a suite is parsed once whatever the number of invocations.
+    :param dir: suite directory
+    :return: dict keyed by experiment name of DStat suite objects
+    """
+    experiments = discover_runs(dir)
+    if not len(experiments):
+        print "No <experiment>.runXX/logs/dstat/dstat-* directory found in " + dir
+        exit(-1)
+
+    options = {
+        'save': save, 'plot': False, 'cum': cum, 'cache': cache, 'jobs': 1, 'overlap': overlap, 'bucket': bucket,
+        'stream': stream, 'band': band, 'summary': summary, 'window': window,
+    }
+    ret = {}
+    for experiment, runs in sorted(experiments.iteritems()):
+        print "Experiment %s: %d runs found" % (experiment, len(runs))
+        args = [(run, path, options) for run, path in runs]
+        if jobs > 1:
+            pool = multiprocessing.Pool(jobs, initializer=_init_worker)
+            try:
+                results = list(pool.imap(_run_job, args))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [_run_job(arg) for arg in args]
+
+        aggregated = []
+        for run, log, averages, error in results:
+            print "Aggregating : " + run
+            sys.stdout.write(log)
+            if error is not None:
+                print run + " aggregation failed: " + error
+            else:
+                aggregated.append((run, averages))
+        if not len(aggregated):
+            print "No run of %s could be aggregated" % experiment
+            continue
+
+        suite = DStatSuite(experiment, aggregated, os.path.join(dir, experiment + '.suite'))
+        if save:
+            suite.to_csv()
+        suite.plot(plot=plot)
+        ret[experiment] = suite
+    return ret
 
 
 def shee(input_dir, filename=None, processor=None, eth=None, sd=None, comparison=None, cpu=None, network=None,
-         memory=None, disk=None, plot=False, grain=False, web=False, noparse=False, aggregate=False, save_agg=False,
-         file_agg=None, cumulative=False):
+         memory=None, disk=None, plot=False, window=None, web=False, noparse=False, aggregate=False, save_agg=False,
+         file_agg=None, cumulative=False, cache=True, stream=False, jobs=1, overlap=0.0, bucket=1.0,
+         band='std', summary=False, suite=False, render_jobs=1, heatmap_cores=16):
     """
 
     :param input_dir: input file directory - if not specified the working directory will be parsed
@@ -231,13 +573,27 @@ def shee(input_dir, filename=None, processor=None, eth=None, sd=None, comparison
     :param memory:
     :param disk:
     :param plot:
-    :param grain:
+    :param window: DStat window object (see DStatWindow) selecting the observation interval, None for the whole logs
     :param web:
     :param noparse:
     :param aggregate:
-    :param save_agg:
+    :param save_agg: if True suite results are stored as csv files; deprecated for aggregations, whose store is
+                     written anyway unless the cache is disabled
     :param file_agg:
     :param cumulative:
+    :param cache: if True parsed files are loaded from (or stored into) the sidecar cache
+    :param stream: if True files are read in bounded chunks: charts are drawn from the downsampled series and the
+                   aggregation runs in streaming
+    :param jobs: number of processes evaluating dstat files in parallel
+    :param overlap: minimum ratio (0-1) of each node duration the aggregated observation window has to cover
+    :param bucket: step in seconds of the time grid nodes are aligned onto before the aggregation
+    :param band: band drawn around the aggregated metrics, 'std' or 'percentile'
+    :param summary: if True the aggregation merges per-node summaries, computed from the dstat files when missing
+    :param suite: if True input_dir is a Peel suite: every experiment.runXX run is aggregated and the runs of each
+                  experiment are compared on runtime
+    :param render_jobs: number of processes rendering the node charts when files are evaluated one at a time
+    :param heatmap_cores: number of cores above which the single cpu evaluation draws one core x time heatmap for
+                          each metric instead of the charts of each core
     :return:
     """
     def evaluate_total_cpu():
@@ -317,12 +673,45 @@ def shee(input_dir, filename=None, processor=None, eth=None, sd=None, comparison
         else:
             return False
 
+    def evaluate_groups():
+        """
+        Turns the evaluations to compute into the column groups to load
+        :return: list of column groups, None if every column is needed
+        """
+        if web:
+            return None
+        groups = []
+        if evaluate_total_cpu():
+            groups.append('total cpu usage')
+        if evaluate_single_cpu():
+            groups.append(DStatSchema.group('cpu', processor) if processor is not None else 'cpu*')
+        if evaluate_total_network():
+            groups.append('net/total')
+        if evaluate_single_network():
+            groups.extend([DStatSchema.group('network', n) for n in DStatSchema.names('network', eth)]
+                          if eth is not None else ['net/*'])
+        if evaluate_total_memory():
+            groups.append('memory usage')
+        if evaluate_total_disk():
+            groups.append('dsk/total')
+        if evaluate_single_disk():
+            groups.extend([DStatSchema.group('disk', n) for n in DStatSchema.names('disk', sd)]
+                          if sd is not None else ['dsk/*'])
+        if comparison is not None:
+            groups.extend(comparison)
+        return groups
+
     print "Opening the following dstat files ..."
 
     if not os.path.exists(input_dir):
         print "Specified input directory doesn't exists"
         exit(-1)
 
+    if suite:
+        suite_evaluation(input_dir, save=save_agg, plot=plot, cum=cumulative, cache=cache, jobs=jobs, overlap=overlap,
+                         bucket=bucket, stream=stream, band=band, summary=summary, window=window)
+        return
+
     if not noparse:
         # for each .csv file inside the directory computing the evaluation
         dir = input_dir
@@ -336,59 +725,64 @@ def shee(input_dir, filename=None, processor=None, eth=None, sd=None, comparison
             print "Specified file not exists"
             exit(-1)
 
-        for fn in file_list:
-            # from here the path has to be absolute
+        evaluations = {
+            'total_cpu': evaluate_total_cpu(),
+            'single_cpu': evaluate_single_cpu(),
+            'total_network': evaluate_total_network(),
+            'single_network': evaluate_single_network(),
+            'total_memory': evaluate_total_memory(),
+            'total_disk': evaluate_total_disk(),
+            'single_disk': evaluate_single_disk(),
+        }
+        options = {
+            'evaluations': evaluations,
+            'groups': evaluate_groups(),
+            'processor': processor,
+            'eth': eth,
+            'sd': sd,
+            'comparison': comparison,
+            'plot': plot,
+            'window': window,
+            'cache': cache,
+            'stream': stream,
+            'heatmap_cores': heatmap_cores,
+        }
+
+        # from here the path has to be absolute
+        fullnames = []
+        for fn in sorted(file_list):
             fullname = os.path.join(dir, fn)
             if evaluate_file(fn, fullname):
-
-                start_time = time.time()
-                print "Evaluating : " + fullname
-
-                # create results directory
-                # dn = fullname.split('.')[0]
-                # if not os.path.exists(dn):
-                #     os.makedirs(dn)
-
-                # get result allows also dotted absolute paths
-                dn = get_result_dir_name(fullname)
-                if not os.path.exists(dn):
-                    os.makedirs(dn)
-
-                frame = DStatFrame(fullname, 'base')
-
-                if evaluate_total_cpu():
-                    total_cpu_evaluation(fullname, dn, plot, grain, frame)
-                if evaluate_single_cpu():
-                    single_cpu_evaluation(fullname, dn, plot, processor, grain, frame)
-
-                if evaluate_total_network():
-                    total_network_evaluation(fullname, dn, plot, grain, frame)
-                if evaluate_single_network():
-                    single_network_evaluation(fullname, dn, plot, eth, grain, frame)
-
-                if evaluate_total_memory():
-                    total_memory_evaluation(fullname, dn, plot, grain, frame)
-
-                if evaluate_total_disk():
-                    total_disk_evaluation(fullname, dn, plot, grain, frame)
-
-                if evaluate_single_disk():
-                    single_disk_evaluation(fullname, dn, plot, sd, grain, frame)
-
-                if comparison is not None:
-                    comparison_evaluation(fullname, dn, columns=comparison, plot=plot, grain=grain, df=frame)
-
-                print fn + " analysis completed.(Execution time: %s secs" % (time.time() - start_time) + ")"
-
+                fullnames.append(fullname)
             else:
                 print "%s is a directory or a not parsable file" % fn
 
+        if jobs > 1:
+            parallel_node_evaluation(fullnames, options, jobs)
+        else:
+            # files are parsed here while the charts of the previous ones are rendered
+            renderer = DStatRenderScheduler(render_jobs) if render_jobs > 1 else None
+            try:
+                for fullname in fullnames:
+                    start_time = time.time()
+                    print "Evaluating : " + fullname
+                    node_evaluation(fullname, renderer=renderer, **options)
+                    print os.path.basename(fullname) + \
+                        " analysis completed.(Execution time: %s secs" % (time.time() - start_time) + ")"
+            finally:
+                if renderer is not None:
+                    renderer.close()
+
     date, nodes = None, None
     if aggregate or web:
         save = save_agg
+        if save:
+            print "-s is deprecated without -R: the aggregation store is written unless -X is given"
         filename = file_agg if file_agg is not None else ''
-        date, nodes = aggregating_evaluation(input_dir, save=save, filename=filename, plot=plot,
-                                             grain=grain, cum=cumulative)
+        dagg = aggregating_evaluation(input_dir, save=save, filename=filename, plot=plot, window=window,
+                                      cum=cumulative, cache=cache, jobs=jobs, overlap=overlap, bucket=bucket,
+                                      stream=stream, band=band, summary=summary)
+        date, nodes = dagg.get_date(), dagg.get_nodes_list()
 
     if web:
         web_obj = WebObject()
@@ -2,11 +2,35 @@
 # -*- coding: utf-8 -*-
 
 import os
+import shutil
+import tempfile
 import unittest
 
+import numpy as np
 import pandas as pd
 
 from shee.frames import DStatFrame
+from shee.frames import DStatStream
+from shee.frames import DStatAggregate
+from shee.frames import DStatAlign
+from shee.frames import DStatCube
+from shee.frames import DStatCubeColumnsException
+from shee.frames import DStatOnlineAggregate
+from shee.frames import DStatSummary
+from shee.frames import DStatSummaryTree
+from shee.frames import DStatSuite
+from shee.frames import DStatWindow
+from shee.frames import DStatIndex
+from shee.frames import DStatSchema
+from shee.frames import DStatMemory
+from shee.frames import DStatCpu
+from shee.frames import DStatRenderScheduler
+from shee.util import decimate
+from shee.util.decimate import minmax
+from shee.util.decimate import lttb
+from shee.frames.cache import DStatCache
+from shee.frames import DStatAggregateStore
+from shee.frames.aggregate import DStatAggregateNoValidExperiments
 
 
 class DStatFrameTest(unittest.TestCase):
@@ -27,3 +51,626 @@ class DStatFrameTest(unittest.TestCase):
             frame = DStatFrame(fullname, 'cpu')
 
             self.assertIsInstance(frame.df, pd.DataFrame)
+
+    def test_dstat_frame_single_pass_header(self):
+
+        fullname = os.path.abspath(os.path.join(self.testfilesdir, 'simpleIter10', 'dstat-hadoop-cloud-13.csv'))
+        frame = DStatFrame(fullname, 'cpu', cache=False)
+
+        self.assertEqual(frame.header[0], ('epoch', 'epoch'))
+        self.assertEqual(frame.header[7], ('cpu1 usage', 'usr'))
+        self.assertEqual(len(frame.header), 117)
+        # the lines before the header, the preamble and the headers are not rows: nothing is dropped
+        self.assertEqual(frame.dropped, 0)
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            malformed = os.path.join(tmpdir, 'dstat-hadoop-cloud-13.csv')
+            shutil.copy(fullname, malformed)
+            with open(malformed, 'a') as f:
+                f.write(','.join(['1463759999.0', ''] + ['1.0'] * 115) + '\n')  # missing value
+                f.write('1463760000.0,1.0,2.0\n')  # truncated
+            self.assertEqual(DStatFrame(malformed, 'cpu', cache=False).dropped, 2)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_dstat_frame_cache(self):
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            fullname = os.path.join(tmpdir, 'dstat-hadoop-cloud-13.csv')
+            shutil.copy(os.path.join(self.testfilesdir, 'simpleIter10', 'dstat-hadoop-cloud-13.csv'), fullname)
+
+            parsed = DStatFrame(fullname, 'cpu')
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, '.dstat-hadoop-cloud-13.csv.shee', 'meta.json')))
+
+            cached = DStatFrame(fullname, 'cpu')
+            self.assertTrue(cached.df.equals(parsed.df))
+            self.assertEqual(cached.dropped, parsed.dropped)
+
+            # the csv file is hashed only when its mtime changed, then the new mtime is recorded
+            class Hashing(DStatCache):
+                hashed = 0
+
+                def _md5(self):
+                    Hashing.hashed += 1
+                    return DStatCache._md5(self)
+
+            self.assertTrue(Hashing(fullname).valid())
+            self.assertEqual(Hashing.hashed, 0)
+            os.utime(fullname, (os.stat(fullname).st_atime, os.stat(fullname).st_mtime + 10))
+            self.assertTrue(Hashing(fullname).valid())
+            self.assertTrue(Hashing(fullname).valid())
+            self.assertEqual(Hashing.hashed, 1)
+            with open(fullname, 'r+b') as f:
+                f.seek(-2, os.SEEK_END)
+                last = f.read(1)
+                f.seek(-2, os.SEEK_END)
+                f.write(b'0' if last != b'0' else b'1')
+            os.utime(fullname, (os.stat(fullname).st_atime, os.stat(fullname).st_mtime + 10))
+            self.assertFalse(Hashing(fullname).valid())
+
+            # rows appended while the file is parsed are not covered by the cache
+            class Appended(DStatFrame):
+                def _open_csv(self, filename, **kwargs):
+                    df = DStatFrame._open_csv(self, filename, **kwargs)
+                    with open(filename, 'a') as f:
+                        f.write(open(filename).readlines()[-1])
+                    return df
+
+            shutil.rmtree(os.path.join(tmpdir, '.dstat-hadoop-cloud-13.csv.shee'))
+            Appended(fullname, 'cpu')
+            self.assertFalse(DStatCache(fullname).valid())
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_dstat_frame_projection(self):
+
+        fullname = os.path.abspath(os.path.join(self.testfilesdir, 'simpleIter10', 'dstat-hadoop-cloud-13.csv'))
+        frame = DStatFrame(fullname, 'memory', cache=False, groups=['memory usage', 'cpu*'])
+
+        groups = set(frame.df.columns.get_level_values(0))
+        self.assertIn('memory usage', groups)
+        self.assertIn('cpu15 usage', groups)
+        self.assertNotIn('total cpu usage', groups)
+        self.assertNotIn('net/total', groups)
+        self.assertEqual(frame.df.columns[0], ('epoch', 'epoch'))
+
+    def test_dstat_frame_dtype_plan(self):
+
+        fullname = os.path.abspath(os.path.join(self.testfilesdir, 'simpleIter10', 'dstat-hadoop-cloud-13.csv'))
+        frame = DStatFrame(fullname, 'cpu', cache=False)
+
+        self.assertEqual(frame.df['total cpu usage', 'usr'].dtype, np.float32)
+        self.assertEqual(frame.df['cpu1 usage', 'usr'].dtype, np.float32)
+        # byte counters stay exact above 2^24, where float32 rounds them
+        self.assertEqual(frame.df['memory usage', 'used'].dtype, np.float64)
+        send = frame.df['net/total', 'send'].values
+        self.assertEqual(send.max(), 75438775.)
+        self.assertNotEqual(np.float32(send.max()), send.max())
+        self.assertEqual(frame.df['epoch', 'epoch'].dtype, np.dtype('datetime64[ns]'))
+        self.assertIn(('cpu1 usage', 'hiq'), frame.zeros)
+        self.assertNotIn(('cpu1 usage', 'hiq'), list(frame.df.columns.values))
+
+        # all-zero columns are restored when a group is read
+        df = frame._read_dataframe(['epoch', 'cpu1 usage'])
+        self.assertEqual(list(df.columns.get_level_values(1)), ['epoch', 'usr', 'sys', 'idl', 'wai', 'hiq', 'siq'])
+        self.assertFalse(df['cpu1 usage', 'hiq'].any())
+
+    def test_dstat_stream(self):
+
+        fullname = os.path.abspath(os.path.join(self.testfilesdir, 'simpleIter10', 'dstat-hadoop-cloud-13.csv'))
+        frame = DStatFrame(fullname, 'cpu', cache=False)
+        stream = DStatStream(fullname, chunksize=100, points=50).read()
+
+        summary = stream.summary()
+        self.assertEqual(summary.loc[('memory usage', 'used'), 'count'], len(frame.df.index))
+        self.assertTrue(np.isclose(summary.loc[('memory usage', 'used'), 'mean'],
+                                   frame.df['memory usage', 'used'].mean()))
+
+        # the downsampled series never exceeds the points budget
+        self.assertLessEqual(len(stream.to_frame().df.index), 50)
+
+        # repeated epochs, adjacent or not and across chunks, are dropped by both readers
+        tmpdir = tempfile.mkdtemp()
+        try:
+            lines = open(fullname).readlines()
+            start = max(pos for pos, line in enumerate(lines) if line.startswith('"epoch"')) + 1
+            body = [pos for pos in range(start, len(lines)) if not lines[pos].startswith('"')]
+            repeated = os.path.join(tmpdir, 'dstat-hadoop-cloud-13.csv')
+            with open(repeated, 'w') as f:
+                f.writelines(lines[:body[150]] + [lines[body[10]], lines[body[148]]] + lines[body[150]:])
+            rows = len(frame.df.index)
+            frame = DStatFrame(repeated, 'cpu', cache=False)
+            stream = DStatStream(repeated, chunksize=100).read()
+            self.assertEqual(len(frame.df.index), rows)
+            self.assertEqual(stream.summary().loc[('memory usage', 'used'), 'count'], rows)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_dstat_aggregate_overlap(self):
+
+        def frame(name, start, end):
+            epoch = pd.date_range('2016-01-01 00:00:00', periods=end + 1, freq='s')[start:]
+            df = pd.DataFrame({0: epoch, 1: np.ones(len(epoch))}, columns=[0, 1])
+            df.columns = pd.MultiIndex.from_tuples([('epoch', 'epoch'), ('total cpu usage', 'usr')])
+            return DStatFrame.from_dataframe(df, name)
+
+        dfs = [frame('a', 0, 100), frame('b', 10, 110), frame('c', 200, 300), frame('d', 50, 60)]
+
+        names = [df.name for df in DStatAggregate._filter_dfs(dfs)]
+        self.assertEqual(names, ['a', 'b', 'd'])
+
+        # d covers a tenth of a and b only, so it is pruned as the window bound
+        names = [df.name for df in DStatAggregate._filter_dfs(dfs, min_overlap=0.5)]
+        self.assertEqual(names, ['a', 'b'])
+
+        # runtime offsets origin: a stray earlier node, discarded by the aggregation, doesn't move it
+        self.assertEqual(DStatAggregate.start([(-1000, -900), (0, 100), (10, 110), (50, 60)]), 0)
+        self.assertEqual(DStatAggregate.start([(0, 100), (10, 110), (50, 60)], min_overlap=0.5), 0)
+
+    def test_dstat_aggregate_stray_node(self):
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            fullnames = []
+            for name in ['dstat-hadoop-cloud-12.csv', 'dstat-hadoop-cloud-13.csv']:
+                fullnames.append(os.path.join(tmpdir, name))
+                shutil.copy(os.path.join(self.testfilesdir, 'simpleIter10', name), fullnames[-1])
+            # a node logged a day later, outside the observation window
+            stray = os.path.join(tmpdir, 'dstat-hadoop-cloud-14.csv')
+            with open(os.path.join(self.testfilesdir, 'simpleIter10', 'dstat-hadoop-cloud-14.csv'), 'r') as f:
+                lines = f.readlines()
+            with open(stray, 'w') as f:
+                for line in lines:
+                    if line[:1].isdigit():
+                        epoch, rest = line.split(',', 1)
+                        line = '%.3f,%s' % (float(epoch) + 86400, rest)
+                    f.write(line)
+
+            window = DStatWindow('10', '60').absolute(DStatIndex(fullnames[0]).update().first())
+            dfs = [DStatFrame(fn, 'base', cache=False, groups=DStatAggregate.GLOBAL_GROUPS, window=window)
+                   for fn in fullnames + [stray]]
+            self.assertEqual(len(dfs[-1].df.index), 0)
+            self.assertEqual(len(DStatAggregate._filter_dfs(dfs)), 2)
+            self.assertEqual(DStatAggregate._filter_files(fullnames + [stray], window=window), fullnames)
+
+            with self.assertRaises(DStatAggregateNoValidExperiments):
+                DStatAggregate._filter_dfs(dfs[-1:])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_dstat_align(self):
+
+        second = 10**9
+        align = DStatAlign(freq=second)
+        epoch = np.array([0.2, 1.1, 1.3, 3.9]) * second
+        values = np.array([[1.], [2.], [3.], [4.]])
+
+        grid = align.grid([epoch.astype(np.int64)])
+        self.assertEqual(list(grid), [0, second, 2 * second, 3 * second, 4 * second])
+
+        # nearest sample within half a step, nothing around the third and the fourth grid points
+        aligned = align.align(epoch.astype(np.int64), values, grid)
+        self.assertEqual(list(aligned[[0, 1, 4], 0]), [1., 2., 4.])
+        self.assertTrue(np.isnan(aligned[2:4, 0]).all())
+
+    def test_dstat_online_aggregate(self):
+
+        class Stream(object):
+            columns = [('total cpu usage', 'usr'), ('memory usage', 'used')]
+
+            def __init__(self, epoch, values):
+                self.epoch, self.values = epoch, values
+
+            def chunks(self):
+                for start in range(0, len(self.epoch), 2):
+                    yield self.epoch[start:start + 2], self.values[start:start + 2]
+
+        second = 10**9
+        rnd = np.random.RandomState(0)
+        values = [rnd.rand(5, 2) for _ in range(3)]
+        streams = [Stream(np.arange(node, node + 5) * second + 10**8, values[node]) for node in range(3)]
+
+        ret = DStatOnlineAggregate(second).aggregate(streams)
+        self.assertEqual(len(ret['cpu'].index), 7)
+
+        # third second is sampled by every node
+        usr = np.array([values[node][2 - node, 0] for node in range(3)])
+        self.assertAlmostEqual(ret['cpu']['avg_usr'].iloc[2], usr.mean())
+        self.assertAlmostEqual(ret['cpu']['std_usr'].iloc[2], usr.std(ddof=1))
+        self.assertAlmostEqual(ret['mem']['avg_used'].iloc[0], values[0][0, 1] / 1024 ** 3)
+        self.assertTrue(np.isnan(ret['mem']['std_used'].iloc[0]))
+
+    def test_dstat_cube(self):
+
+        time = np.arange(4).astype('datetime64[s]').astype('datetime64[ns]')
+        metrics = [('net/total', 'recv'), ('net/total', 'send'), ('memory usage', 'used')]
+        data = np.arange(24, dtype=np.float64).reshape(4, 2, 3)
+        data[1, 0, 1] = np.nan
+        cube = DStatCube(data, time, ['cloud-1', 'cloud-2'], metrics)
+
+        # group views share the cube data
+        self.assertTrue(np.shares_memory(cube.view('net/total'), cube.data))
+        self.assertEqual(cube.view('net/total').shape, (4, 2, 2))
+
+        self.assertEqual(list(cube.mean('memory usage')[:, 0]), [3.5, 9.5, 15.5, 21.5])
+        self.assertEqual(cube.mean('net/total')[1, 1], 10.)
+        self.assertEqual(cube.sum('net/total')[0, 0], 3.)
+
+        window = cube.window(time[1], time[2])
+        self.assertEqual(list(window.time), list(time[1:3]))
+        self.assertTrue(np.shares_memory(window.data, cube.data))
+
+        # dataframes are scaled on output, the cube is left untouched and can be turned into dataframes again
+        metrics = [('total cpu usage', 'usr'), ('net/total', 'send'), ('memory usage', 'used'), ('dsk/total', 'read')]
+        cube = DStatCube(np.arange(16, dtype=np.float64).reshape(2, 2, 4), time[:2], ['cloud-1', 'cloud-2'], metrics)
+        dagg = DStatAggregate.__new__(DStatAggregate)
+        dagg.cumulative_feat = False
+        first = dagg._to_dict(cube)
+        self.assertEqual(first['mem']['cloud-2', 'memory usage', 'used'].iloc[0], 6. / 1024 ** 3)
+        self.assertEqual(first['net']['avg_send'].iloc[0], 3. / 1024 ** 2)
+        self.assertTrue(dagg._to_dict(cube)['mem'].equals(first['mem']))
+        self.assertEqual(cube.data[0, 1, 2], 6.)
+
+        # node blocks may list the same columns in another order, not different ones
+        blocks = [np.array([[1., 2.]]), np.array([[4., 3.]])]
+        cube = DStatCube.from_blocks(time[:1], ['cloud-1', 'cloud-2'], [metrics[:2], metrics[1::-1]], blocks)
+        self.assertEqual(list(cube.data[0, 1]), [3., 4.])
+        with self.assertRaises(DStatCubeColumnsException) as ctx:
+            DStatCube.from_blocks(time[:1], ['cloud-1', 'cloud-2'], [metrics[:2], metrics[1:3]], blocks)
+        self.assertIn('cloud-2', str(ctx.exception))
+        self.assertIn('memory usage', str(ctx.exception))
+        self.assertIn('total cpu usage', str(ctx.exception))
+
+    def test_dstat_cube_percentiles(self):
+
+        rnd = np.random.RandomState(0)
+        data = rnd.rand(20, 30, 2)
+        data[rnd.rand(20, 30, 2) < 0.3] = np.nan
+        data[5, :, 1] = np.nan
+        cube = DStatCube(data, np.arange(20), range(30), [('dsk/total', 'read'), ('dsk/total', 'writ')])
+
+        p50, p95, lowest = cube.percentiles('dsk/total', [50, 95, 0])
+        self.assertTrue(np.allclose(p50, np.nanmedian(data, axis=1), equal_nan=True))
+        self.assertTrue(np.allclose(lowest, np.nanmin(data, axis=1), equal_nan=True))
+        self.assertAlmostEqual(p95[0, 0], np.percentile(data[0, :, 0][~np.isnan(data[0, :, 0])], 95))
+        self.assertTrue(np.isnan(p95[5, 1]))
+
+        # results without percentiles (legacy csv files and stores) fall back to the standard deviation band
+        dagg = DStatAggregate.__new__(DStatAggregate)
+        dagg.band = 'percentile'
+        legacy = pd.DataFrame({'avg_read': [1.], 'std_read': [0.]})
+        self.assertEqual(dagg._band_columns(legacy, 'read'), ['avg_read', 'std_read'])
+        legacy['p50_read'] = legacy['p95_read'] = legacy['p99_read'] = legacy['min_read'] = legacy['max_read'] = 1.
+        self.assertEqual(dagg._band_columns(legacy, 'read'), ['p50_read', 'p95_read', 'p99_read', 'min_read',
+                                                               'max_read'])
+
+    def test_dstat_summary(self):
+
+        second = 10**9
+        columns = [('total cpu usage', 'usr'), ('memory usage', 'used')]
+        rnd = np.random.RandomState(0)
+        epoch = np.arange(0, 40 * second, second // 4)
+        values = rnd.rand(len(epoch), 2)
+
+        whole = DStatSummary.from_arrays(epoch, values, columns, freq=second, size=8)
+        parts = [DStatSummary.from_arrays(epoch[start::3], values[start::3], columns, freq=second, size=8)
+                 for start in range(3)]
+        merged = parts[0].merge(parts[1]).merge(parts[2])
+        regrouped = parts[0].merge(parts[1].merge(parts[2]))
+
+        self.assertEqual(list(merged.buckets), list(whole.buckets))
+        self.assertTrue(np.allclose(merged.mean(), whole.mean()))
+        self.assertTrue(np.allclose(merged.std(), regrouped.std()))
+        self.assertTrue(np.allclose(merged.quantiles([100])[0], whole.max))
+
+        # chunks of one file split buckets, which still count the node once
+        fullname = os.path.join(self.testfilesdir, 'simpleIter10', 'dstat-hadoop-cloud-13.csv')
+        groups = ['total cpu usage', 'memory usage']
+        single = DStatSummary.from_stream(DStatStream(fullname, groups=groups), freq=5 * second)
+        chunked = DStatSummary.from_stream(DStatStream(fullname, groups=groups, chunksize=7), freq=5 * second)
+        self.assertEqual(list(chunked.nodes), [1] * len(single.buckets))
+        self.assertTrue(np.array_equal(chunked.count, single.count))
+        self.assertTrue(np.allclose(chunked.sum, single.sum))
+        self.assertTrue(np.allclose(chunked.min, single.min) and np.allclose(chunked.max, single.max))
+        devices = [('cpu', 'total cpu usage', 1.)]
+        self.assertTrue(np.allclose(chunked.to_dict(devices, [])['cpu'].values,
+                                    single.to_dict(devices, [])['cpu'].values, equal_nan=True))
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'dstat-test' + DStatSummary.SUFFIX)
+            merged.save(path)
+            loaded = DStatSummary.load(path)
+            self.assertEqual(loaded.columns, columns)
+            self.assertTrue(np.allclose(loaded.sum, merged.sum))
+            self.assertTrue(np.allclose(loaded.quantiles([50])[0], merged.quantiles([50])[0], atol=1e-6))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_dstat_suite(self):
+
+        columns = pd.MultiIndex.from_tuples([('cl1', 'total cpu usage', 'usr'), ('avg_usr', '', ''),
+                                             ('std_usr', '', '')])
+        runs = []
+        for run, values in [('run01', [1., 2., 3.]), ('run02', [3., 4., 5., 6.]), ('run03', [2., 3., 4.])]:
+            data = np.array([values, values, [0.] * len(values)]).T
+            df = pd.DataFrame(data, index=np.arange(len(values)), columns=columns)
+            runs.append((run, {'cpu': DStatSuite.averages(df)}))
+
+        suite = DStatSuite('wordcount', runs, tempfile.gettempdir())
+        df = suite.get_dict()['cpu']
+        self.assertEqual(list(df.index), [0, 1, 2, 3])
+        self.assertEqual(list(df['runs']), [3, 3, 3, 1])
+        self.assertEqual(list(df['mean_usr']), [2., 3., 4., 6.])
+        self.assertAlmostEqual(df['ci_usr'][0], 4.303 / np.sqrt(3))
+        self.assertTrue(np.isnan(df['ci_usr'][3]))
+        self.assertEqual(list(df['run02_usr']), [3., 4., 5., 6.])
+
+    def test_dstat_aggregate_store(self):
+
+        columns = pd.MultiIndex.from_tuples([('cl1', 'total cpu usage', 'usr'), ('avg_usr', '', '')])
+        dfs = {
+            'cpu': pd.DataFrame(np.arange(6.).reshape(3, 2), index=np.arange(3), columns=columns),
+            'net': pd.DataFrame({'avg_recv': [1., 2.], 'sum_recv': [3., 4.]}, index=np.arange(2)),
+        }
+        date = pd.Timestamp('2016-05-20 15:38:06')
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            source = os.path.join(tmpdir, 'dstat-cl1.csv')
+            open(source, 'w').close()
+            key = DStatAggregateStore.key([source], {'bucket': 1.0})
+            store = DStatAggregateStore(os.path.join(tmpdir, 'aggregation.shee'))
+            self.assertFalse(store.valid(key))
+            store.save(dfs, ['1'], date, os.path.join(tmpdir, 'cloud-1'), key=key)
+            self.assertTrue(store.valid(key))
+            self.assertFalse(store.valid(DStatAggregateStore.key([source], {'bucket': 2.0})))
+
+            loaded, nodes, loaded_date, _ = DStatAggregateStore(store.dirname).load()
+            self.assertEqual(nodes, ['1'])
+            self.assertEqual(loaded_date, date)
+            self.assertTrue(loaded['cpu'].equals(dfs['cpu']))
+            self.assertEqual(list(loaded['net'].columns), ['avg_recv', 'sum_recv'])
+            self.assertEqual(list(loaded['net']['sum_recv']), [3., 4.])
+
+            # rendered charts are recorded without invalidating the results
+            self.assertEqual(store.charts(), {})
+            charts = {'cpu': {'render': {'band': 'std'}, 'files': [os.path.join(tmpdir, 'cpu.png')]}}
+            store.save_charts(charts)
+            self.assertTrue(store.valid(key))
+            self.assertEqual(DStatAggregateStore(store.dirname).charts(), charts)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_dstat_summary_tree(self):
+
+        second = 10**9
+        columns = [('total cpu usage', 'usr')]
+        rnd = np.random.RandomState(0)
+        epoch = np.arange(0, 20 * second, second // 2)
+        summaries = [DStatSummary.from_arrays(epoch + node * second, rnd.rand(len(epoch), 1), columns, freq=second,
+                                              name='dstat-cl' + str(node)) for node in range(5)]
+        replaced = DStatSummary.from_arrays(epoch, rnd.rand(len(epoch), 1), columns, freq=second, name='dstat-cl2')
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'aggregation.tree')
+            merged = DStatSummaryTree(path).update(summaries)
+            self.assertTrue(np.allclose(merged.sum, reduce(DStatSummary.merge, summaries).sum))
+
+            # a new tree object reloads the stored nodes and only merges the path above the replaced leaf
+            current = summaries[:2] + [replaced] + summaries[3:4]
+            tree = DStatSummaryTree(path)
+            merged = tree.update(current)
+            self.assertEqual(sorted(tree.nodes), [1, 2, 3, 4, 5, 6, 7, 10, 11, 12, 13])
+            expected = reduce(DStatSummary.merge, current)
+            self.assertEqual(list(merged.buckets), list(expected.buckets))
+            self.assertTrue(np.allclose(merged.sum, expected.sum))
+            self.assertTrue(np.allclose(merged.max, expected.max))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_dstat_window(self):
+
+        second = 10**9
+        epoch = np.datetime64('2016-05-20T15:38:06', 'ns').astype(np.int64) + np.arange(10) * second
+        self.assertEqual(DStatWindow('2', '4.5').select(epoch), (2, 5))
+        self.assertEqual(DStatWindow('15:38:09').select(epoch), (3, 10))
+        self.assertEqual(DStatWindow(end='2016-05-20 15:38:07').select(epoch), (0, 2))
+        self.assertEqual(DStatWindow('20', '30').select(epoch), (10, 10))
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            fullname = os.path.join(tmpdir, 'dstat-hadoop-cloud-13.csv')
+            shutil.copy(os.path.join(self.testfilesdir, 'simpleIter10', 'dstat-hadoop-cloud-13.csv'), fullname)
+            full = DStatFrame(fullname, 'base', cache=False)
+            window = DStatWindow('10', '20')
+            parsed = DStatFrame(fullname, 'base', cache=True, window=window)
+            cached = DStatFrame(fullname, 'base', cache=True, window=window)
+
+            epoch = full.df['epoch', 'epoch']
+            expected = full.df[(epoch >= epoch.iloc[0] + pd.Timedelta(seconds=10)) &
+                               (epoch <= epoch.iloc[0] + pd.Timedelta(seconds=20))]
+            self.assertTrue(len(expected.index))
+            self.assertEqual(list(parsed.df.index), list(expected.index))
+            self.assertTrue(np.array_equal(cached.df.values, parsed.df.values))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_dstat_index(self):
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            fullname = os.path.join(tmpdir, 'dstat-hadoop-cloud-13.csv')
+            source = os.path.join(self.testfilesdir, 'simpleIter10', 'dstat-hadoop-cloud-13.csv')
+            with open(source, 'rb') as f:
+                lines = f.readlines()
+            with open(fullname, 'wb') as f:
+                f.writelines(lines[:-10])
+
+            index = DStatIndex(fullname, step=512).update()
+            self.assertTrue(len(index.offsets) > 1)
+            self.assertTrue(np.all(np.diff(index.epochs) > 0))
+            indexed = len(index.offsets)
+
+            # rows appended by a running dstat extend the stored index
+            with open(fullname, 'ab') as f:
+                f.writelines(lines[-10:])
+            index = DStatIndex(fullname, step=512).update()
+            self.assertTrue(len(index.offsets) >= indexed)
+            os.remove(index.path)
+            self.assertTrue(np.array_equal(index.offsets, DStatIndex(fullname, step=512).update().offsets))
+
+            # the parse indexes the rows it reads as the seeking update does
+            os.remove(index.path)
+            DStatFrame(fullname, 'base', cache=True)
+            built, sought = np.load(index.path), DStatIndex(fullname, persist=False).update()
+            self.assertTrue(np.array_equal(built['offsets'], sought.offsets))
+            self.assertTrue(np.array_equal(built['epochs'], sought.epochs))
+            shutil.rmtree(os.path.join(tmpdir, '.dstat-hadoop-cloud-13.csv.shee'))
+
+            # without cache the index is not stored
+            os.remove(index.path)
+            window = DStatWindow('10', '20')
+            full = DStatFrame(fullname, 'base', cache=False)
+            sliced = DStatFrame(fullname, 'base', cache=False, window=window)
+            self.assertFalse(os.path.exists(index.path))
+            epoch = full.df['epoch', 'epoch']
+            expected = full.df[(epoch >= epoch.iloc[0] + pd.Timedelta(seconds=10)) &
+                               (epoch <= epoch.iloc[0] + pd.Timedelta(seconds=20))]
+            self.assertTrue(np.array_equal(sliced.df.values, expected.values))
+
+            epochs = epoch.values.astype('datetime64[ns]').view('i8')
+            self.assertTrue(np.allclose([index.first(), index.last()], epochs[[0, -1]], rtol=0, atol=1000))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_dstat_schema(self):
+
+        header = [('epoch', 'epoch'), ('total cpu usage', 'usr'), ('cpu0 usage', 'usr'), ('cpu1 usage', 'usr'),
+                  ('net/total', 'recv'), ('net/ens3', 'recv'), ('net/ens3', 'send'), ('dsk/total', 'read'),
+                  ('dsk/nvme0n1', 'read'), ('dsk/dm-0', 'read'), ('dsk/sda', 'read')]
+        schema = DStatSchema(header)
+        self.assertEqual(schema.devices, {'cpu': ['0', '1'], 'network': ['ens3'], 'disk': ['nvme0n1', 'dm-0', 'sda']})
+        self.assertEqual(schema.positions('net/ens3'), [5, 6])
+        self.assertEqual(schema.find('disk', 'a'), 'sda')
+        self.assertEqual(schema.find('disk', 'nvme0n1'), 'nvme0n1')
+        self.assertEqual(schema.find('network', 0), None)
+
+        fullname = os.path.join(self.testfilesdir, 'simpleIter10', 'dstat-hadoop-cloud-13.csv')
+        df = DStatFrame(fullname, 'base', cache=False)
+        self.assertEqual(df.schema.devices['cpu'], [str(n) for n in range(1, 16)])
+        self.assertEqual(df.schema.devices['network'], ['eth0'])
+        self.assertEqual(df.schema.devices['disk'], ['sda', 'sdb', 'sdc', 'sdd', 'sde'])
+
+    def test_dstat_render_scheduler(self):
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            fullname = os.path.join(tmpdir, 'dstat-hadoop-cloud-13.csv')
+            shutil.copy(os.path.join(self.testfilesdir, 'simpleIter10', 'dstat-hadoop-cloud-13.csv'), fullname)
+            ds = DStatMemory(fullname, frame=DStatFrame(fullname, 'base', cache=False))
+            os.makedirs(os.path.join(tmpdir, 'dstat-hadoop-cloud-13', 'memory'))
+
+            renderer = DStatRenderScheduler(2, queue=1)
+            renderer.submit(ds, 'plot_together')
+            renderer.submit(ds, 'plot_stacked', columns=['used', 'free'])
+            renderer.submit(ds, 'plot_stacked', columns=['missing'])
+            # fails before reaching a worker: reported, without holding its queue slot
+            renderer.submit(ds, 'plot_together', columns=lambda: None)
+            renderer.submit(ds, 'plot_together')
+            errors = renderer.close()
+
+            self.assertEqual(len(errors), 2)
+            self.assertEqual(renderer.rendered, 3)
+            charts = os.listdir(os.path.join(tmpdir, 'dstat-hadoop-cloud-13', 'memory'))
+            self.assertEqual(sorted(charts), ['dstat-hadoop-cloud-13-total-memory-line.png',
+                                              'dstat-hadoop-cloud-13-total-memory-used-free-stacked.png'])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_dstat_render_template(self):
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            charts = []
+            for node in ['12', '13']:
+                basename = 'dstat-hadoop-cloud-%s.csv' % node
+                fullname = os.path.join(tmpdir, basename)
+                shutil.copy(os.path.join(self.testfilesdir, 'simpleIter10', basename), fullname)
+                os.makedirs(os.path.join(tmpdir, 'dstat-hadoop-cloud-%s' % node, 'memory'))
+                charts.append(DStatMemory(fullname, frame=DStatFrame(fullname, 'base', cache=False)))
+
+            DStatFrame.TEMPLATES.pop(('DStatMemory', 'subplots'), None)
+            charts[0].subplot_all()
+            template = DStatFrame.TEMPLATES[('DStatMemory', 'subplots')]
+            charts[1].subplot_all()
+            self.assertTrue(DStatFrame.TEMPLATES[('DStatMemory', 'subplots')] is template)
+
+            # the lines of the reused figure draw the last frame
+            for line, column in template['lines']:
+                self.assertTrue(np.allclose(line.get_ydata(), charts[1]._decimated([column])[column].values))
+            for node in ['12', '13']:
+                self.assertTrue(os.path.exists(os.path.join(tmpdir, 'dstat-hadoop-cloud-%s' % node, 'memory',
+                                                            'dstat-hadoop-cloud-%s-total-memory-subplots.png' % node)))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_decimate(self):
+
+        values = np.sin(np.arange(100000) / 50.0)
+        values[12345], values[777] = 50.0, -40.0
+        values[5000:5100] = np.nan
+
+        positions = minmax(values, 500)
+        self.assertTrue(len(positions) <= 1002)
+        self.assertTrue(np.all(np.diff(positions) > 0))
+        self.assertTrue(set([0, 777, 12345, 99999]) <= set(positions))
+
+        positions = lttb(np.arange(len(values)), values, 1000)
+        self.assertEqual(len(positions), 1000)
+        self.assertTrue(set([0, 777, 12345, 99999]) <= set(positions))
+
+        df = pd.DataFrame({'a': values, 'b': -values})
+        self.assertTrue(decimate(df.iloc[:500], 1000) is not None and len(decimate(df.iloc[:500], 1000)) == 500)
+        reduced = decimate(df, 1000)
+        self.assertEqual(reduced['a'].max(), 50.0)
+        self.assertEqual(reduced['b'].max(), 40.0)
+
+    def test_dstat_cpu_heatmap(self):
+
+        fullname = os.path.join(self.testfilesdir, 'simpleIter10', 'dstat-hadoop-cloud-13.csv')
+        frame = DStatFrame(fullname, 'base', cache=False)
+        cores = frame.schema.devices['cpu']
+        ds = DStatCpu(fullname, frame=frame, cores=cores)
+
+        self.assertEqual(ds.heat.shape, (6, len(cores), len(frame.df.index)))
+        self.assertTrue(ds.heat.flags['C_CONTIGUOUS'])
+        self.assertEqual(ds.metrics, ['usr', 'sys', 'idl', 'wai', 'hiq', 'siq'])
+        core = DStatCpu(fullname, frame=frame, cpu=cores[2])
+        self.assertTrue(np.allclose(ds.heat[ds.metrics.index('idl'), 2], core.df['idl'].values))
+
+    def test_dstat_aggregate_heatmap(self):
+
+        dir = os.path.abspath(os.path.join(self.testfilesdir, 'simpleIter10'))
+        dfs = [DStatFrame(os.path.join(dir, 'dstat-hadoop-cloud-%d.csv' % node), str(node), cache=False)
+               for node in [12, 13]]
+        tmpdir = tempfile.mkdtemp()
+        try:
+            dagg = DStatAggregate(dir, tmpdir, dfs)
+            df = dagg.get_dict()['cpu']
+            nodes, heat = DStatAggregate.node_heat(df, 'usr')
+
+            self.assertEqual(heat.shape, (2, len(df.index)))
+            self.assertEqual(heat.dtype, np.float32)
+            for row, node in enumerate(nodes):
+                self.assertTrue(np.allclose(heat[row], df[(node, 'total cpu usage', 'usr')].values, equal_nan=True))
+            self.assertEqual(DStatAggregate.node_heat(df[['avg_usr']], 'usr'), ([], None))
+
+            dagg.plot_heatmap(df, mod='cpu')
+            self.assertEqual(len([fn for fn in os.listdir(os.path.join(tmpdir, 'cpu'))
+                                  if fn.endswith('-nodes-heatmap.png')]), 3)
+        finally:
+            shutil.rmtree(tmpdir)
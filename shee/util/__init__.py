@@ -2,3 +2,6 @@
 # -*- coding: utf-8 -*-
 
 from utils import get_result_dir_name
+from utils import select_columns
+from decimate import point_budget
+from decimate import decimate
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import matplotlib as mpl
+
+
+def point_budget(width=None, dpi=None):
+    """
+    Number of points a line can be reduced to with no visible loss: a minimum and a maximum for each pixel column
+    :param width: figure width in inches, the default figure width if None
+    :param dpi: figure resolution, the default saving resolution if None
+    :return: int
+    """
+    width = width if width is not None else mpl.rcParams['figure.figsize'][0]
+    if dpi is None:
+        dpi = mpl.rcParams['savefig.dpi']
+        dpi = mpl.rcParams['figure.dpi'] if dpi == 'figure' else dpi
+    return 2 * int(width * dpi)
+
+
+def minmax(values, buckets):
+    """
+    Min/max per bucket decimation: rows are split into buckets of consecutive samples and, in each one, the rows
+    holding the minimum and the maximum of every column are kept, along with the first and the last row
+    :param values: 1d or 2d (rows x series) float array
+    :param buckets: number of buckets
+    :return: sorted positions of the kept rows
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+    rows = len(values)
+    if rows <= 2 * buckets:
+        return np.arange(rows)
+
+    size = -(-rows // buckets)
+    padded = np.full((buckets * size, values.shape[1]), np.nan)
+    padded[:rows] = values
+    padded = padded.reshape(buckets, size, values.shape[1])
+    # NaN samples (and the padding) are never picked, unless the whole bucket is NaN
+    lowest = np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    highest = np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    starts = (np.arange(buckets) * size)[:, np.newaxis]
+    positions = np.concatenate([(starts + lowest).ravel(), (starts + highest).ravel(), [0, rows - 1]])
+    return np.unique(np.clip(positions, 0, rows - 1))
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets decimation of a line: in each bucket the point kept is the one forming the largest
+    triangle with the point kept in the previous bucket and the average of the next one
+    :param x: 1d array of the points abscissas
+    :param y: 1d array of the points ordinates
+    :param threshold: number of points to keep
+    :return: sorted positions of the kept points
+    """
+    rows = len(y)
+    if threshold >= rows or threshold < 3:
+        return np.arange(rows)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # first and last points are always kept, the others are split into threshold - 2 buckets
+    edges = np.linspace(1, rows - 1, threshold - 1).astype(np.int64)
+    ret = np.empty(threshold, dtype=np.int64)
+    ret[0], ret[-1] = 0, rows - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else rows
+        avgx, avgy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avgx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avgy - y[a]))
+        a = lo + int(np.argmax(np.where(np.isnan(area), -1, area)))
+        ret[i + 1] = a
+    return ret
+
+
+def decimate(df, budget, values=None, method='minmax'):
+    """
+    Reduces a dataframe to the rows needed to draw its series at the given point budget
+    :param df: dataframe, rows sorted by time
+    :param budget: number of points of each series (see point_budget)
+    :param values: 2d array of the series the kept rows have to preserve, aligned with the dataframe rows; the
+                   dataframe values if None
+    :param method: 'minmax' (see minmax) or 'lttb' (the union of the points kept on each series, samples being
+                   taken as evenly spaced, see lttb)
+    :return: the dataframe itself if it is within the budget, otherwise the subset of its rows
+    """
+    if len(df.index) <= budget:
+        return df
+    values = np.asarray(df.values if values is None else values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+
+    if method == 'lttb':
+        x = np.arange(len(values))
+        positions = reduce(np.union1d, [lttb(x, values[:, k], budget) for k in range(values.shape[1])])
+    else:
+        positions = minmax(values, budget // 2)
+    return df.iloc[positions]
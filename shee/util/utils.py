@@ -9,4 +9,23 @@ def get_result_dir_name(fullpathname):
     """
     for i, c in enumerate(reversed(fullpathname)):
         if c == '.':
-            return fullpathname[:(-i - 1)]
\ No newline at end of file
+            return fullpathname[:(-i - 1)]
+
+def select_columns(columns, groups=None):
+    """
+    Computes the positions of the columns belonging to the given groups; the epoch column is always selected
+    :param columns: list of (group, metric) column tuples
+    :param groups: list of first level column names - a name ending with '*' is matched as a prefix, e.g. 'cpu*';
+                   if None every column is selected
+    :return: list of column positions
+    """
+    if groups is None:
+        return range(len(columns))
+    groups = ['epoch'] + list(groups)
+    ret = []
+    for pos, col in enumerate(columns):
+        for group in groups:
+            if col[0] == group or (group.endswith('*') and col[0].startswith(group[:-1])):
+                ret.append(pos)
+                break
+    return ret
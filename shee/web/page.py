@@ -366,12 +366,13 @@ class WebObject(object):
                     if device['type'] == 'directory':
                         devicedir = os.path.join(expdir, device['name'])
                         for image in device['children']:  # for each image inside the device dir
-                            if image['type'] == 'directory' and image['name'].startswith('cpu'):
+                            if (image['type'] == 'directory' and image['name'].startswith('cpu')) or \
+                                    (device['name'] == 'cpu' and image['name'].endswith('heatmap.png')):
                                 self._create_cpu_page(devicedir, item['name'].split("-")[-1])
                             elif image['type'] == 'directory' and image['name'].startswith('eth'):
                                 # self._create_eth_page(devicedir, item['name'].split("-")[-1])
                                 pass
-                            elif image['type'] == 'directory' and image['name'].startswith('sd'):
+                            elif image['type'] == 'directory' and device['name'] == 'disk':
                                 self._create_disk_page(devicedir, item['name'].split("-")[-1])
                             if image['type'] == 'file' and image['name'].endswith('stacked.png'):
                                 message += '<div id="quotes' + str(idx) + '">'
@@ -420,7 +421,16 @@ class WebObject(object):
                 quote_counter = 0
                 message += '</div>'
                 message += '<div id="quotescontainer">'
-            if item['type'] == 'directory' and item['name'].startswith('cpu'):
+            if item['type'] == 'file' and item['name'].endswith('heatmap.png'):
+                message += '<div id="quotes' + str(quote_counter) + '">'
+                message += "<h3>cores</h3>"
+                quote_counter += 1
+                message += "<h5>" + item['name'] + "</h5>"
+                src = 'file://' + os.path.join(basedir, item['name'])
+                message += '<img id="myImg' + str(img_counter) + '" src="' + src + '">'
+                message += '</div>'
+                img_counter += 1
+            elif item['type'] == 'directory' and item['name'].startswith('cpu'):
 
                 for subdevice in item['children']:  # for each file in cpux
 
@@ -464,7 +474,7 @@ class WebObject(object):
                 quote_counter = 0
                 message += '</div>'
                 message += '<div id="quotescontainer">'
-            if item['type'] == 'directory' and item['name'].startswith('sd'):
+            if item['type'] == 'directory':  # one directory for each disk, e.g. sda or nvme0n1
 
                 for subdevice in item['children']:  # for each file in cpux
 